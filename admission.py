@@ -0,0 +1,120 @@
+# admission.py
+# 上傳流量控管：限制同時進行的上傳數 (全域 / 每位使用者) 與暫存中的總 bytes，
+# 超過上限時短暫排隊，仍等不到就回 429 讓客戶端稍後重試
+import asyncio
+import math
+from collections import Counter, defaultdict
+from typing import Optional
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, status_code: int, detail: str, retry_after: Optional[int] = None):
+        super().__init__(detail)
+        self.reason = reason
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class UploadAdmission:
+    """
+    每個 uvicorn worker 各自一份計數 (不跨行程)。
+    - max_inflight / max_per_user：同時進行中的上傳請求數
+    - max_spooled_bytes：進行中請求的 Content-Length 總和 (上傳檔會先 spool 到暫存空間)；
+      只限制「同時」排進來的總量，單一請求超過上限時等其他上傳都結束後單獨放行，不會直接拒絕
+    - max_queue / queue_timeout：額滿時最多幾個請求排隊、每個最多等幾秒
+    """
+
+    def __init__(
+        self,
+        max_inflight: int = 16,
+        max_per_user: int = 4,
+        max_spooled_bytes: int = 2 * 1024 ** 3,
+        max_queue: int = 32,
+        queue_timeout: float = 5.0,
+    ):
+        self.max_inflight = max_inflight
+        self.max_per_user = max_per_user
+        self.max_spooled_bytes = max_spooled_bytes
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self.inflight = 0
+        self.spooled_bytes = 0
+        self.per_user = defaultdict(int)
+        self.waiting = 0
+        self.admitted_total = 0
+        self.rejected = Counter()
+        self._cond = None
+
+    def _condition(self) -> asyncio.Condition:
+        # 第一次使用時才建立，確保綁定在 uvicorn 的 event loop 上
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def _blocked_by(self, user_key: str, size: int) -> Optional[str]:
+        if self.inflight >= self.max_inflight:
+            return "global"
+        # 用 get：defaultdict 取值會留下 0 的項目，active_users 會越算越多
+        if self.per_user.get(user_key, 0) >= self.max_per_user:
+            return "per_user"
+        # 沒有其他上傳進行中時一律放行：單一超大請求不會因為總量上限永遠進不來
+        if self.inflight and self.spooled_bytes + size > self.max_spooled_bytes:
+            return "spooled_bytes"
+        return None
+
+    def _reject(self, reason: str, detail: str, status_code: int = 429):
+        self.rejected[reason] += 1
+        retry_after = max(1, math.ceil(self.queue_timeout)) if status_code == 429 else None
+        raise AdmissionRejected(reason, status_code, detail, retry_after)
+
+    async def acquire(self, user_key: str, size: int):
+        cond = self._condition()
+        async with cond:
+            reason = self._blocked_by(user_key, size)
+            if reason:
+                if self.waiting >= self.max_queue:
+                    self._reject("queue_full", "上傳排隊已滿，請稍後再試")
+                self.waiting += 1
+                try:
+                    await asyncio.wait_for(
+                        cond.wait_for(lambda: self._blocked_by(user_key, size) is None),
+                        self.queue_timeout,
+                    )
+                except asyncio.TimeoutError:
+                    self._reject(reason, "同時上傳數量已達上限，請稍後再試")
+                finally:
+                    self.waiting -= 1
+
+            self.inflight += 1
+            self.per_user[user_key] += 1
+            self.spooled_bytes += size
+            self.admitted_total += 1
+
+    async def release(self, user_key: str, size: int):
+        cond = self._condition()
+        async with cond:
+            self.inflight -= 1
+            self.spooled_bytes -= size
+            self.per_user[user_key] -= 1
+            if self.per_user[user_key] <= 0:
+                del self.per_user[user_key]
+            cond.notify_all()
+
+    def snapshot(self) -> dict:
+        return {
+            "inflight": self.inflight,
+            "spooled_bytes": self.spooled_bytes,
+            "queue_depth": self.waiting,
+            "active_users": len(self.per_user),
+            "admitted_total": self.admitted_total,
+            "rejected": dict(self.rejected),
+            "limits": {
+                "max_inflight": self.max_inflight,
+                "max_per_user": self.max_per_user,
+                "max_spooled_bytes": self.max_spooled_bytes,
+                "max_queue": self.max_queue,
+                "queue_timeout": self.queue_timeout,
+            },
+        }
@@ -0,0 +1,40 @@
+"""add version.sha256 and stored_object for content deduplication
+
+Revision ID: 4e8b0c6a2f15
+Revises: c3a1f27d9b40
+Create Date: 2026-10-18 10:03:47.218904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e8b0c6a2f15'
+down_revision: Union[str, Sequence[str], None] = 'c3a1f27d9b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('version', sa.Column('sha256', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_version_sha256'), 'version', ['sha256'], unique=False)
+    op.create_table(
+        'stored_object',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('storage_path', sa.String(length=1024), nullable=False),
+        sa.Column('filesize', sa.BigInteger(), nullable=True),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('sha256'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('stored_object')
+    op.drop_index(op.f('ix_version_sha256'), table_name='version')
+    op.drop_column('version', 'sha256')
@@ -0,0 +1,37 @@
+"""add ffprobe video metadata columns, metadata.duration as seconds
+
+Revision ID: 5c8f3a1e7d24
+Revises: e2b94f6d1a07
+Create Date: 2026-10-18 14:10:27.903114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c8f3a1e7d24'
+down_revision: Union[str, Sequence[str], None] = 'e2b94f6d1a07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # duration 之前從未寫入過，直接改成數值 (秒) 才能排序 / 篩選
+    op.alter_column('metadata', 'duration', existing_type=sa.String(length=50), type_=sa.Float(), existing_nullable=True)
+    op.add_column('metadata', sa.Column('video_codec', sa.String(length=50), nullable=True))
+    op.add_column('metadata', sa.Column('bitrate', sa.BigInteger(), nullable=True))
+    op.add_column('metadata', sa.Column('frame_rate', sa.Float(), nullable=True))
+    op.create_index('ix_metadata_duration', 'metadata', ['duration'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_metadata_duration', table_name='metadata')
+    op.drop_column('metadata', 'frame_rate')
+    op.drop_column('metadata', 'bitrate')
+    op.drop_column('metadata', 'video_codec')
+    op.alter_column('metadata', 'duration', existing_type=sa.Float(), type_=sa.String(length=50), existing_nullable=True)
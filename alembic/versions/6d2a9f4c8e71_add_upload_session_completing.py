@@ -0,0 +1,30 @@
+"""add upload_session.completing_at and status/expires index for completion locking and cleanup
+
+Revision ID: 6d2a9f4c8e71
+Revises: f1c7e9a3b524
+Create Date: 2026-10-18 22:14:09.615382
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d2a9f4c8e71'
+down_revision: Union[str, Sequence[str], None] = 'f1c7e9a3b524'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('upload_session', sa.Column('completing_at', sa.TIMESTAMP(), nullable=True))
+    op.create_index('ix_upload_session_status_expires', 'upload_session', ['status', 'expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_upload_session_status_expires', table_name='upload_session')
+    op.drop_column('upload_session', 'completing_at')
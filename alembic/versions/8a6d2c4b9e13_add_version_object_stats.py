@@ -0,0 +1,35 @@
+"""add object stats (filesize, etag, content_type, has_thumbnail) to version
+
+Revision ID: 8a6d2c4b9e13
+Revises: 5c8f3a1e7d24
+Create Date: 2026-10-18 15:21:48.330152
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a6d2c4b9e13'
+down_revision: Union[str, Sequence[str], None] = '5c8f3a1e7d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('version', sa.Column('filesize', sa.BigInteger(), nullable=True))
+    op.add_column('version', sa.Column('etag', sa.String(length=100), nullable=True))
+    op.add_column('version', sa.Column('content_type', sa.String(length=100), nullable=True))
+    op.add_column('version', sa.Column('has_thumbnail', sa.Boolean(), server_default='0', nullable=False))
+    # 既有資料請執行 python reconcile_versions.py 回填
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('version', 'has_thumbnail')
+    op.drop_column('version', 'content_type')
+    op.drop_column('version', 'etag')
+    op.drop_column('version', 'filesize')
@@ -0,0 +1,50 @@
+"""add derivative_job queue and asset.derivative_status
+
+Revision ID: a7d52e91c3b8
+Revises: 4e8b0c6a2f15
+Create Date: 2026-10-18 11:20:05.774310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d52e91c3b8'
+down_revision: Union[str, Sequence[str], None] = '4e8b0c6a2f15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('asset', sa.Column('derivative_status', sa.String(length=20), nullable=True))
+    op.create_table(
+        'derivative_job',
+        sa.Column('job_id', sa.BigInteger(), nullable=False),
+        sa.Column('asset_id', sa.BigInteger(), nullable=False),
+        sa.Column('version_id', sa.BigInteger(), nullable=False),
+        sa.Column('storage_path', sa.String(length=1024), nullable=False),
+        sa.Column('content_type', sa.String(length=100), nullable=True),
+        sa.Column('status', sa.String(length=50), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('next_run_at', sa.TIMESTAMP(), nullable=False),
+        sa.Column('claimed_at', sa.TIMESTAMP(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['asset_id'], ['asset.asset_id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['version_id'], ['version.version_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('job_id'),
+    )
+    op.create_index(op.f('ix_derivative_job_job_id'), 'derivative_job', ['job_id'], unique=False)
+    op.create_index('ix_derivative_job_status_next_run', 'derivative_job', ['status', 'next_run_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_derivative_job_status_next_run', table_name='derivative_job')
+    op.drop_index(op.f('ix_derivative_job_job_id'), table_name='derivative_job')
+    op.drop_table('derivative_job')
+    op.drop_column('asset', 'derivative_status')
@@ -0,0 +1,36 @@
+"""add hls packaging (derivative_job.kind, version.has_hls)
+
+Revision ID: b91e4d7f2a60
+Revises: 8a6d2c4b9e13
+Create Date: 2026-10-18 17:42:09.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b91e4d7f2a60'
+down_revision: Union[str, Sequence[str], None] = '8a6d2c4b9e13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('derivative_job', sa.Column('kind', sa.String(length=20), server_default='thumbnail', nullable=False))
+    # 縮圖與 HLS 轉檔由各自的 dispatcher 取工作，索引加上 kind
+    op.drop_index('ix_derivative_job_status_next_run', table_name='derivative_job')
+    op.create_index('ix_derivative_job_status_next_run', 'derivative_job', ['kind', 'status', 'next_run_at'], unique=False)
+    op.add_column('version', sa.Column('has_hls', sa.Boolean(), server_default='0', nullable=False))
+    # 既有影片請執行 python backfill_hls.py 排入轉檔
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('version', 'has_hls')
+    op.drop_index('ix_derivative_job_status_next_run', table_name='derivative_job')
+    op.create_index('ix_derivative_job_status_next_run', 'derivative_job', ['status', 'next_run_at'], unique=False)
+    op.drop_column('derivative_job', 'kind')
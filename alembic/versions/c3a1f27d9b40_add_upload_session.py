@@ -0,0 +1,48 @@
+"""add upload_session for resumable chunked uploads
+
+Revision ID: c3a1f27d9b40
+Revises: 98ecdbe85cd7
+Create Date: 2026-10-18 09:12:31.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a1f27d9b40'
+down_revision: Union[str, Sequence[str], None] = '98ecdbe85cd7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'upload_session',
+        sa.Column('session_id', sa.String(length=64), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('asset_id', sa.BigInteger(), nullable=True),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('content_type', sa.String(length=100), nullable=True),
+        sa.Column('total_size', sa.BigInteger(), nullable=False),
+        sa.Column('chunk_size', sa.Integer(), nullable=False),
+        sa.Column('total_chunks', sa.Integer(), nullable=False),
+        sa.Column('object_name', sa.String(length=1024), nullable=False),
+        sa.Column('upload_id', sa.String(length=255), nullable=False),
+        sa.Column('status', sa.String(length=50), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+        sa.Column('expires_at', sa.TIMESTAMP(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.user_id']),
+        sa.ForeignKeyConstraint(['asset_id'], ['asset.asset_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('session_id'),
+    )
+    op.create_index(op.f('ix_upload_session_session_id'), 'upload_session', ['session_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_upload_session_session_id'), table_name='upload_session')
+    op.drop_table('upload_session')
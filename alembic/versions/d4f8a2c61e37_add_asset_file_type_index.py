@@ -0,0 +1,28 @@
+"""add asset.file_type index for paginated listing
+
+Revision ID: d4f8a2c61e37
+Revises: b91e4d7f2a60
+Create Date: 2026-10-18 19:05:31.274410
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f8a2c61e37'
+down_revision: Union[str, Sequence[str], None] = 'b91e4d7f2a60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # InnoDB 的次要索引尾端會帶主鍵，(file_type) 索引即可依 asset_id 做 keyset 分頁
+    op.create_index(op.f('ix_asset_file_type'), 'asset', ['file_type'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_asset_file_type'), table_name='asset')
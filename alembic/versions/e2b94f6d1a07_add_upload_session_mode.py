@@ -0,0 +1,31 @@
+"""add upload_session.mode for presigned direct uploads
+
+Revision ID: e2b94f6d1a07
+Revises: a7d52e91c3b8
+Create Date: 2026-10-18 13:02:41.518206
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b94f6d1a07'
+down_revision: Union[str, Sequence[str], None] = 'a7d52e91c3b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('upload_session', sa.Column('mode', sa.String(length=20), server_default='multipart', nullable=False))
+    op.alter_column('upload_session', 'upload_id', existing_type=sa.String(length=255), nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM upload_session WHERE upload_id IS NULL")
+    op.alter_column('upload_session', 'upload_id', existing_type=sa.String(length=255), nullable=False)
+    op.drop_column('upload_session', 'mode')
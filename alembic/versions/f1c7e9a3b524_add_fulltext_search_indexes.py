@@ -0,0 +1,36 @@
+"""add fulltext (ngram) search indexes on asset.filename, tag.tag_name, category.category_name
+
+Revision ID: f1c7e9a3b524
+Revises: d4f8a2c61e37
+Create Date: 2026-10-18 20:26:47.903158
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c7e9a3b524'
+down_revision: Union[str, Sequence[str], None] = 'd4f8a2c61e37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 關閉 InnoDB 預設停用字 (a / about / in / to ...)：ngram parser 會略過「包含」停用字的 token，
+    # 不關的話 "in"、"to" 查不到，連 "ca"、"ai" 這類含 a / i 的 2 字元片段也不會進索引。
+    # 設定只在建立索引時讀取一次 (session 層級)，之後重建索引 (ALTER TABLE ... FORCE / OPTIMIZE) 前也要先設
+    op.execute("SET SESSION innodb_ft_enable_stopword = OFF")
+    # ngram parser：中文檔名 / 標籤不需斷詞；大資料表建立 FULLTEXT 索引需要一段時間
+    op.create_index('ft_asset_filename', 'asset', ['filename'], unique=False, mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+    op.create_index('ft_tag_name', 'tag', ['tag_name'], unique=False, mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+    op.create_index('ft_category_name', 'category', ['category_name'], unique=False, mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ft_category_name', table_name='category')
+    op.drop_index('ft_tag_name', table_name='tag')
+    op.drop_index('ft_asset_filename', table_name='asset')
@@ -77,6 +77,46 @@ export const apiService = {
         return response.json();
     },
 
+    /**
+     * 上傳資產 (直傳 MinIO，檔案不經過 API 伺服器)
+     * 流程：向後端要 presigned PUT URL -> 直接 PUT 到 MinIO -> 呼叫 finalize 建立資產
+     * @param {File} fileObject - HTML input 拿到的檔案物件
+     */
+    async uploadAssetDirect(fileObject) {
+        const contentType = fileObject.type || 'application/octet-stream';
+        const sessionRes = await fetch(`${API_BASE_URL}/uploads/direct`, {
+            method: 'POST',
+            headers: getHeaders(),
+            body: JSON.stringify({
+                filename: fileObject.name,
+                total_size: fileObject.size,
+                content_type: contentType
+            })
+        });
+        if (sessionRes.status === 403) {
+            throw new Error('權限不足：請確認您的帳號是否有上傳權限');
+        }
+        if (!sessionRes.ok) {
+            throw new Error('無法建立上傳工作');
+        }
+        const session = await sessionRes.json();
+
+        const putRes = await fetch(session.upload_url, {
+            method: session.method,
+            headers: session.headers,
+            body: fileObject
+        });
+        if (!putRes.ok) {
+            throw new Error('檔案上傳到儲存系統失敗');
+        }
+
+        const response = await fetch(`${API_BASE_URL}/uploads/direct/${session.session_id}/finalize`, {
+            method: 'POST',
+            headers: getHeaders()
+        });
+        return response.json();
+    },
+
     /**
      * 取得資產列表 (支援搜尋)
      */
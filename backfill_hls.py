@@ -0,0 +1,52 @@
+# backfill_hls.py
+# 為既有影片排入 HLS 轉檔工作 (實際轉檔由 API 服務的 HLS worker 在背景執行)
+# 用法:
+#   python backfill_hls.py               # 最新版還沒有 HLS、也沒有排隊中工作的影片
+#   python backfill_hls.py --limit 50
+import argparse
+
+from database import SessionLocal
+import derivatives
+import models
+
+
+def backfill(limit: int = None):
+    db = SessionLocal()
+    try:
+        queued = db.query(models.DerivativeJob.storage_path).filter(
+            models.DerivativeJob.kind == "hls",
+            models.DerivativeJob.status.in_(("pending", "processing"))
+        )
+        query = db.query(models.Version).join(
+            models.Asset, models.Asset.latest_version_id == models.Version.version_id
+        ).filter(
+            models.Asset.file_type.like("video/%"),
+            models.Version.has_hls.is_(False),
+            models.Version.storage_path.notin_(queued)
+        ).order_by(models.Version.version_id)
+        if limit:
+            query = query.limit(limit)
+        versions = query.all()
+        print(f"🔄 共 {len(versions)} 支影片需要轉檔")
+
+        seen = set()
+        for version in versions:
+            # 去重後多個版本可能指向同一個物件，只排一次
+            if version.storage_path in seen:
+                continue
+            seen.add(version.storage_path)
+            derivatives.enqueue_hls(db, version, version.content_type or version.asset.file_type)
+        db.commit()
+        print(f"🎉 已排入 {len(seen)} 筆 HLS 轉檔工作")
+    except Exception as e:
+        print(f"❌ 排入失敗: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="為既有影片排入 HLS 轉檔工作")
+    parser.add_argument("--limit", type=int, default=None, help="最多處理幾筆")
+    args = parser.parse_args()
+    backfill(limit=args.limit)
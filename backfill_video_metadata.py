@@ -0,0 +1,62 @@
+# backfill_video_metadata.py
+# 補齊既有影片的 Metadata (時長 / 真實解析度 / 編碼 / 位元率 / 影格率)
+# 用法:
+#   python backfill_video_metadata.py            # 只處理還沒有 duration 的影片
+#   python backfill_video_metadata.py --all      # 全部影片重新 probe
+#   python backfill_video_metadata.py --limit 100
+import argparse
+
+from database import SessionLocal
+import derivatives
+import models
+
+
+def backfill(reprobe_all: bool = False, limit: int = None):
+    db = SessionLocal()
+    fixed = failed = 0
+    try:
+        query = db.query(models.Asset, models.Version.storage_path).join(
+            models.Version, models.Asset.latest_version_id == models.Version.version_id
+        ).filter(models.Asset.file_type.like("video/%")).order_by(models.Asset.asset_id)
+        if not reprobe_all:
+            query = query.outerjoin(models.Metadata, models.Metadata.asset_id == models.Asset.asset_id).filter(
+                models.Metadata.duration.is_(None)
+            )
+        if limit:
+            query = query.limit(limit)
+        rows = query.all()
+        print(f"🔄 共 {len(rows)} 支影片需要補資料")
+
+        for asset, storage_path in rows:
+            try:
+                result = derivatives.probe_stored_video(storage_path)
+            except Exception as e:
+                result = None
+                print(f"   ⚠️ asset {asset.asset_id} probe 失敗: {e}")
+            if not result:
+                failed += 1
+                print(f"   ❌ asset {asset.asset_id} ({asset.filename}) 讀不到影片資訊")
+                continue
+
+            if not asset.metadata_info:
+                asset.metadata_info = models.Metadata(asset_id=asset.asset_id)
+            derivatives.apply_metadata(asset.metadata_info, result)
+            # 一筆一 commit，中途中斷時已處理的不會白做
+            db.commit()
+            fixed += 1
+            print(f"   ✅ asset {asset.asset_id}: {result.get('resolution')} {result.get('duration')}s {result.get('video_codec')}")
+
+        print(f"🎉 完成：成功 {fixed} 筆，失敗 {failed} 筆")
+    except Exception as e:
+        print(f"❌ 回填失敗: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="用 ffprobe 補齊既有影片的 Metadata")
+    parser.add_argument("--all", action="store_true", help="已有資料的影片也重新 probe")
+    parser.add_argument("--limit", type=int, default=None, help="最多處理幾筆")
+    args = parser.parse_args()
+    backfill(reprobe_all=args.all, limit=args.limit)
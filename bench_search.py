@@ -0,0 +1,127 @@
+# bench_search.py
+# 檔名搜尋的效能比較：LIKE '%關鍵字%' (全表掃描) vs FULLTEXT ngram (search.py 的做法)
+# 在獨立的 bench_asset 資料表產生假資料，不會動到正式的 asset 資料表
+# 用法:
+#   python bench_search.py                      # 產生 100 萬筆並比較 (預設)
+#   python bench_search.py --rows 200000        # 指定筆數
+#   python bench_search.py --reuse              # 沿用上次產生的資料，只跑查詢
+#   python bench_search.py --drop               # 跑完刪除 bench_asset
+import argparse
+import random
+import statistics
+import time
+
+from sqlalchemy import text
+
+from database import engine
+import search
+
+TABLE = "bench_asset"
+
+# 假檔名的組成字彙 (中英混合，接近實際資產命名)
+WORDS = [
+    "產品", "形象", "活動", "海報", "會議", "記錄", "年度", "報告", "季度", "簡報", "貓咪", "風景",
+    "台北", "高雄", "新品", "發表", "門市", "陳列", "廣告", "橫幅", "社群", "素材", "訪談", "影片",
+    "logo", "banner", "promo", "draft", "final", "review", "campaign", "event", "photo", "shoot",
+]
+EXTENSIONS = [".jpg", ".png", ".mp4", ".pdf", ".webp", ".mov"]
+
+# (說明, 關鍵字)
+QUERIES = [
+    ("常見中文詞", "海報"),
+    ("少見組合", "貓咪 台北"),
+    ("英文片段", "camp"),
+    ("預設停用字", "in"),
+    ("找不到", "不存在的字"),
+]
+
+
+def _filename(rng: random.Random) -> str:
+    parts = rng.sample(WORDS, rng.randint(2, 4))
+    return f"{'_'.join(parts)}_{rng.randint(1, 99999):05d}{rng.choice(EXTENSIONS)}"
+
+
+def create_table(rows: int, batch: int = 5000):
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        conn.execute(text(
+            f"CREATE TABLE {TABLE} ("
+            " asset_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,"
+            " filename VARCHAR(255) NOT NULL"
+            ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+        ))
+
+    print(f"🔄 產生 {rows} 筆假資料...")
+    rng = random.Random(42)
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for offset in range(0, rows, batch):
+            conn.execute(
+                text(f"INSERT INTO {TABLE} (filename) VALUES (:filename)"),
+                [{"filename": _filename(rng)} for _ in range(min(batch, rows - offset))],
+            )
+    print(f"   ✅ 寫入完成 ({time.perf_counter() - started:.1f}s)")
+
+    # 先寫資料再建索引比逐筆維護快很多
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        # 與 migration 相同：不套用 InnoDB 預設停用字
+        conn.execute(text("SET SESSION innodb_ft_enable_stopword = OFF"))
+        conn.execute(text(f"CREATE FULLTEXT INDEX ft_{TABLE}_filename ON {TABLE} (filename) WITH PARSER ngram"))
+    print(f"   ✅ 索引建立完成 ({time.perf_counter() - started:.1f}s)")
+
+
+def _time(conn, sql: str, params: dict, repeat: int):
+    durations = []
+    count = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = len(conn.execute(text(sql), params).all())
+        durations.append((time.perf_counter() - started) * 1000)
+    return statistics.median(durations), count
+
+
+def run_queries(repeat: int, limit: int):
+    match_sql = (
+        f"SELECT asset_id, MATCH(filename) AGAINST(:against IN BOOLEAN MODE) AS score FROM {TABLE}"
+        f" WHERE MATCH(filename) AGAINST(:against IN BOOLEAN MODE) ORDER BY score DESC, asset_id DESC LIMIT {limit}"
+    )
+
+    with engine.connect() as conn:
+        total = conn.execute(text(f"SELECT COUNT(*) FROM {TABLE}")).scalar()
+        print(f"🔍 資料筆數 {total}，每個查詢跑 {repeat} 次取中位數 (LIMIT {limit})")
+        for label, q in QUERIES:
+            words = search.terms(q)
+            # 原本的做法：每個關鍵字一個 LIKE '%...%'
+            like_where = " AND ".join(f"filename LIKE :p{i}" for i in range(len(words)))
+            like_sql = f"SELECT asset_id FROM {TABLE} WHERE {like_where} ORDER BY asset_id DESC LIMIT {limit}"
+            like_params = {f"p{i}": f"%{w}%" for i, w in enumerate(words)}
+            like_ms, like_rows = _time(conn, like_sql, like_params, repeat)
+            match_ms, match_rows = _time(conn, match_sql, {"against": search.boolean_query(words)}, repeat)
+            print(f"   {label} ({q})")
+            print(f"      LIKE '%...%'   {like_ms:9.1f} ms  ({like_rows} 筆)")
+            print(f"      FULLTEXT ngram {match_ms:9.1f} ms  ({match_rows} 筆)")
+
+        # 輸入第一個字時 (少於 ngram_token_size) search.py 也是用 LIKE '%...%'
+        short_sql = f"SELECT asset_id FROM {TABLE} WHERE filename LIKE :pattern ORDER BY asset_id DESC LIMIT {limit}"
+        short_ms, short_rows = _time(conn, short_sql, {"pattern": "%海%"}, repeat)
+        print("   1 個字 (海)")
+        print(f"      LIKE '%...%'   {short_ms:9.1f} ms  ({short_rows} 筆)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="比較 LIKE 與 FULLTEXT ngram 的檔名搜尋效能")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="假資料筆數 (預設 100 萬)")
+    parser.add_argument("--repeat", type=int, default=5, help="每個查詢重複次數")
+    parser.add_argument("--limit", type=int, default=100, help="每個查詢取回的筆數 (等同一頁)")
+    parser.add_argument("--reuse", action="store_true", help="沿用既有的 bench_asset，不重新產生")
+    parser.add_argument("--drop", action="store_true", help="跑完刪除 bench_asset")
+    args = parser.parse_args()
+
+    if not args.reuse:
+        create_table(args.rows)
+    run_queries(args.repeat, args.limit)
+    if args.drop:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        print("🧹 已刪除 bench_asset")
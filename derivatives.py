@@ -0,0 +1,345 @@
+# derivatives.py
+# 衍生檔 (縮圖 / 解析度 / 影片資訊 / HLS 轉檔) 背景處理：DB 當持久化佇列，CPU 工作丟給有上限的 process pool
+import functools
+import io
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from minio import Minio
+
+import media
+import models
+from database import SessionLocal
+
+logger = logging.getLogger("RedAnt")
+
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 30      # 第 n 次失敗後延後 n * 30 秒再試
+STALE_AFTER = timedelta(minutes=15)  # 取走超過這麼久還沒結果，視為 worker 掛掉，放回佇列
+HLS_STALE_AFTER = timedelta(hours=3)  # 長片轉檔可能要很久
+
+# ---------- 子行程端 ----------
+_minio_client = None
+
+
+def _client() -> Minio:
+    # 子行程各自建立 MinIO client (不能從主行程 pickle 過來)
+    global _minio_client
+    if _minio_client is None:
+        _minio_client = Minio(
+            os.getenv("MINIO_ENDPOINT"),
+            access_key=os.getenv("MINIO_ACCESS_KEY"),
+            secret_key=os.getenv("MINIO_SECRET_KEY"),
+            secure=False
+        )
+    return _minio_client
+
+
+def build_derivatives(storage_path: str, content_type: str) -> dict:
+    """在子行程執行：讀取 MinIO 原檔 (影片只讀開頭樣本) -> 產生各尺寸 / 格式縮圖存回 MinIO，回傳 metadata。"""
+    client = _client()
+    bucket = os.getenv("MINIO_BUCKET_NAME")
+    is_video = content_type.startswith("video/")
+
+    obj = client.get_object(bucket, storage_path, length=media.VIDEO_SAMPLE_BYTES if is_video else 0)
+    try:
+        fp = io.BytesIO(obj.read())
+    finally:
+        obj.close()
+        obj.release_conn()
+
+    if is_video:
+        # 同一份開頭樣本同時給 ffprobe (時長 / 解析度 / 編碼 ...) 與 ffmpeg (截圖)，原檔只讀一次
+        sample = fp.getvalue()
+        probe = media.probe_video(sample)
+        frame = media.video_frame(sample)
+        if not probe or not frame:
+            # moov 在檔尾等情況開頭樣本不夠，改讓 ffprobe / ffmpeg 經 presigned URL 以 Range 讀需要的部分
+            url = client.presigned_get_object(bucket, storage_path, expires=timedelta(hours=1))
+            probe = probe or media.probe_video(url)
+            frame = frame or media.video_frame(url)
+        if not frame:
+            raise RuntimeError("沒有產生縮圖 (請確認 ffmpeg 已安裝且檔案可解碼)")
+        renditions, _ = media.image_renditions(io.BytesIO(frame))
+        result = probe or {}
+    else:
+        renditions, resolution = media.image_renditions(fp)
+        result = {"resolution": resolution}
+
+    for (size, fmt), data in renditions.items():
+        client.put_object(
+            bucket,
+            media.rendition_key(storage_path, size, fmt),
+            io.BytesIO(data),
+            len(data),
+            content_type=media.MEDIA_TYPES[fmt]
+        )
+    return result
+
+
+def build_hls(storage_path: str, content_type: str) -> dict:
+    """在子行程執行：影片轉成多位元率 HLS，分段與播放清單存到 MinIO 的 media.hls_prefix() 之下。"""
+    client = _client()
+    bucket = os.getenv("MINIO_BUCKET_NAME")
+    # ffmpeg 經 presigned URL 讀原檔，不必先整支下載
+    url = client.presigned_get_object(bucket, storage_path, expires=timedelta(hours=6))
+    probe = media.probe_video(url)
+    if not probe or not probe.get("resolution"):
+        raise RuntimeError("讀不到影片解析度，無法轉檔")
+    width, height = (int(v) for v in probe["resolution"].split("x"))
+
+    prefix = media.hls_prefix(storage_path)
+    with tempfile.TemporaryDirectory(prefix="hls-") as out_dir:
+        rungs = media.package_hls(url, out_dir, width, height, audio=media.has_audio(url))
+        files = []
+        for dirpath, _, filenames in os.walk(out_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                files.append((os.path.relpath(path, out_dir).replace(os.sep, "/"), path))
+        # master.m3u8 最後上傳：看得到 master 就代表全部分段都已就緒
+        files.sort(key=lambda item: item[0] == "master.m3u8")
+        for rel, path in files:
+            client.fput_object(
+                bucket, f"{prefix}/{rel}", path,
+                content_type=media.HLS_MEDIA_TYPES.get(os.path.splitext(rel)[1], "application/octet-stream")
+            )
+    return {"renditions": [f"{side}p@{kbps}k" for side, kbps in rungs]}
+
+
+def probe_stored_video(storage_path: str):
+    """對 MinIO 上的影片跑 ffprobe (經 presigned URL，只抓需要的部分)，給回填既有資料用。"""
+    client = _client()
+    url = client.presigned_get_object(os.getenv("MINIO_BUCKET_NAME"), storage_path, expires=timedelta(hours=1))
+    return media.probe_video(url)
+
+
+# ---------- 主行程端 ----------
+# 衍生檔工作結果中要寫回 Metadata 的欄位
+METADATA_FIELDS = ("resolution", "duration", "video_codec", "bitrate", "frame_rate")
+
+
+def apply_metadata(metadata: models.Metadata, result: dict):
+    for field in METADATA_FIELDS:
+        if result.get(field) is not None:
+            setattr(metadata, field, result[field])
+
+def needs_derivatives(content_type: str) -> bool:
+    return bool(content_type) and content_type.startswith(("image/", "video/"))
+
+
+def needs_hls(content_type: str) -> bool:
+    return bool(content_type) and content_type.startswith("video/")
+
+
+def job_values(asset_id: int, version_id: int, storage_path: str, content_type: str, kind: str = "thumbnail") -> dict:
+    """新衍生檔工作的欄位值 (批次上傳用來一次 INSERT 多筆)。"""
+    return dict(
+        asset_id=asset_id,
+        version_id=version_id,
+        storage_path=storage_path,
+        content_type=content_type,
+        kind=kind,
+        status="pending",
+        attempts=0,
+        next_run_at=datetime.utcnow()
+    )
+
+
+def enqueue(db, asset: models.Asset, version: models.Version, content_type: str):
+    """登記一筆衍生檔工作 (只 add，由呼叫端 commit)。"""
+    db.add(models.DerivativeJob(
+        **job_values(asset.asset_id, version.version_id, version.storage_path, content_type)
+    ))
+    asset.derivative_status = "pending"
+
+
+def enqueue_hls(db, version: models.Version, content_type: str):
+    """登記一筆 HLS 轉檔工作 (只 add，由呼叫端 commit)；不影響 asset.derivative_status (那是縮圖狀態)。"""
+    db.add(models.DerivativeJob(
+        **job_values(version.asset_id, version.version_id, version.storage_path, content_type, kind="hls")
+    ))
+
+
+def status_for_existing_object(db, storage_path: str) -> str:
+    """去重命中時，衍生檔沿用既有物件的：若它的工作還沒做完就仍算 pending。"""
+    unfinished = db.query(models.DerivativeJob.job_id).filter(
+        models.DerivativeJob.kind == "thumbnail",
+        models.DerivativeJob.storage_path == storage_path,
+        models.DerivativeJob.status.in_(("pending", "processing"))
+    ).first()
+    return "pending" if unfinished else "ready"
+
+
+def _assets_showing(db, storage_path: str):
+    # 最新版本指向這個物件的資產 (去重後可能不只一個)
+    return db.query(models.Asset).join(
+        models.Version, models.Asset.latest_version_id == models.Version.version_id
+    ).filter(models.Version.storage_path == storage_path).all()
+
+
+def record_result(db, storage_path: str, result: dict):
+    """衍生檔產生成功：所有指向這個物件的版本 (去重後可能不只一個) 都有縮圖了，並寫回 metadata (由呼叫端 commit)。"""
+    db.query(models.Version).filter(
+        models.Version.storage_path == storage_path
+    ).update({"has_thumbnail": True}, synchronize_session=False)
+    for asset in _assets_showing(db, storage_path):
+        asset.derivative_status = "ready"
+        if asset.metadata_info:
+            apply_metadata(asset.metadata_info, result)
+
+
+def record_hls(db, storage_path: str):
+    """HLS 轉檔成功：所有指向這個物件的版本都可以用 HLS 播放 (由呼叫端 commit)。"""
+    db.query(models.Version).filter(
+        models.Version.storage_path == storage_path
+    ).update({"has_hls": True}, synchronize_session=False)
+
+
+# 各種工作在子行程執行的函式
+JOB_FUNCTIONS = {"thumbnail": build_derivatives, "hls": build_hls}
+
+
+class DerivativeDispatcher:
+    """
+    背景執行緒定期從 derivative_job 取出待處理工作 (只取自己 kind 的)，交給 process pool。
+    - 佇列在 DB：重啟後未完成的工作會繼續
+    - 取工作用 SELECT ... FOR UPDATE SKIP LOCKED，多個 uvicorn worker 不會搶到同一筆
+    - 失敗會延後重試，超過 MAX_ATTEMPTS 次標記為 failed
+    - 縮圖與 HLS 轉檔各用一個 dispatcher / pool，長時間的轉檔不會卡住縮圖
+    """
+
+    def __init__(self, max_workers: int = 2, poll_interval: float = 2.0, kind: str = "thumbnail",
+                 stale_after: timedelta = STALE_AFTER):
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.kind = kind
+        self.stale_after = stale_after
+        self._pool = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._inflight = 0
+
+    def start(self):
+        # 用 spawn 啟動子行程，避免 fork 到已載入 AI 模型與執行緒的主行程
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"derivative-dispatcher-{self.kind}", daemon=True)
+        self._thread.start()
+        logger.info(f"衍生檔 worker pool 已啟動 ({self.kind}, {self.max_workers} processes)")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def wake(self):
+        # 有新工作時叫醒 dispatcher，不必等下一輪 polling
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._requeue_stale()
+                self._dispatch()
+            except Exception as e:
+                logger.error(f"衍生檔 dispatcher 錯誤: {e}", exc_info=True)
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _requeue_stale(self):
+        db = SessionLocal()
+        try:
+            db.query(models.DerivativeJob).filter(
+                models.DerivativeJob.kind == self.kind,
+                models.DerivativeJob.status == "processing",
+                models.DerivativeJob.claimed_at < datetime.utcnow() - self.stale_after
+            ).update({"status": "pending"}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _dispatch(self):
+        with self._lock:
+            free = self.max_workers - self._inflight
+        if free <= 0:
+            return
+
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            jobs = db.query(models.DerivativeJob).filter(
+                models.DerivativeJob.kind == self.kind,
+                models.DerivativeJob.status == "pending",
+                models.DerivativeJob.next_run_at <= now
+            ).order_by(models.DerivativeJob.job_id).limit(free).with_for_update(skip_locked=True).all()
+            for job in jobs:
+                job.status = "processing"
+                job.attempts += 1
+                job.claimed_at = now
+                if self.kind == "thumbnail":
+                    for asset in _assets_showing(db, job.storage_path):
+                        asset.derivative_status = "processing"
+            db.commit()
+            claimed = [(job.job_id, job.storage_path, job.content_type) for job in jobs]
+        finally:
+            db.close()
+
+        for job_id, storage_path, content_type in claimed:
+            with self._lock:
+                self._inflight += 1
+            future = self._pool.submit(JOB_FUNCTIONS[self.kind], storage_path, content_type)
+            future.add_done_callback(functools.partial(self._on_done, job_id))
+
+    def _on_done(self, job_id: int, future):
+        with self._lock:
+            self._inflight -= 1
+        db = SessionLocal()
+        try:
+            job = db.query(models.DerivativeJob).filter(models.DerivativeJob.job_id == job_id).first()
+            if not job:
+                return  # 資產已被刪除
+            try:
+                result = future.result()
+            except Exception as e:
+                job.last_error = str(e)[:1000]
+                if job.attempts >= MAX_ATTEMPTS:
+                    job.status = "failed"
+                    new_status = "failed"
+                    logger.warning(f"衍生檔工作 {job_id} 失敗 {job.attempts} 次，放棄: {e}")
+                else:
+                    job.status = "pending"
+                    job.next_run_at = datetime.utcnow() + timedelta(seconds=RETRY_BACKOFF_SECONDS * job.attempts)
+                    new_status = "pending"
+                    logger.info(f"衍生檔工作 {job_id} 失敗，稍後重試: {e}")
+                if self.kind == "thumbnail":
+                    for asset in _assets_showing(db, job.storage_path):
+                        asset.derivative_status = new_status
+                db.commit()
+                return
+
+            job.status = "done"
+            job.last_error = None
+            if self.kind == "hls":
+                record_hls(db, job.storage_path)
+            else:
+                record_result(db, job.storage_path, result)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"更新衍生檔工作 {job_id} 結果失敗: {e}", exc_info=True)
+        finally:
+            db.close()
+            self.wake()
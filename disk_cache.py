@@ -0,0 +1,289 @@
+# disk_cache.py
+# 本機 SSD 上的 MinIO 物件快取 (read-through)：命中時直接從本機檔案回應，
+# 未命中時照常讀 MinIO，並在背景把整個物件抓下來，下次就會命中。
+# 物件名稱 + 版本資訊 (sha256 / etag) 組成 key：同一 key 的內容永遠不變，不會讀到舊資料。
+# 目錄由同一台機器上的所有 worker 行程共用：一個行程抓下來的檔案其他行程也會命中，
+# 總大小上限以整個目錄計算 (定期掃描目錄，依修改時間淘汰；命中時更新修改時間當作 LRU 順序)。
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Iterator, Optional
+
+try:
+    import fcntl  # 跨行程的淘汰鎖 (Windows 沒有，單機開發時不需要)
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger("RedAnt")
+
+# 超過這麼久的 .tmp 視為中斷的殘檔 (較新的可能是其他行程正在寫入)
+STALE_TMP_SECONDS = 3600
+LOCK_FILENAME = ".evict.lock"
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def iter_file(f: BinaryIO, start: int = 0, length: Optional[int] = None, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """從已開啟的檔案讀出 [start, start + length) 並在結束時關閉；檔案之後被淘汰 (unlink) 也不影響已開啟的 fd。"""
+    try:
+        f.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+class DiskCache:
+    """
+    - max_bytes：快取目錄總大小上限 (所有共用此目錄的行程合計)，超過時淘汰最久沒用的 (LRU)
+    - max_object_bytes：超過這個大小的物件不快取
+    - fill_workers：背景抓檔的執行緒數
+    - scan_interval：多久重新掃描一次目錄 (看到其他行程的填入 / 淘汰，並執行總量上限)
+    記憶體裡的索引只是本行程的近似值；實際內容以目錄為準：索引沒有的檔案也會去看磁碟，
+    本行程寫入累積到上限的 1%、估計總量超過上限，或距上次掃描超過 scan_interval 時重新掃描。
+    """
+
+    def __init__(self, root: str, max_bytes: int, max_object_bytes: int, fill_workers: int = 2,
+                 scan_interval: float = 30):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self.scan_interval = scan_interval
+        self.current_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "hit_bytes": 0, "fills": 0, "fill_bytes": 0, "fill_errors": 0,
+                      "evictions": 0, "scans": 0}
+        self._entries = OrderedDict()  # 檔名 -> 大小
+        self._filling = set()
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self._written_since_scan = 0
+        self._last_scan = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=fill_workers, thread_name_prefix="disk-cache-fill")
+        os.makedirs(root, exist_ok=True)
+        self._scan()
+        if self._entries:
+            logger.info(f"本機物件快取已載入 {len(self._entries)} 個檔案 ({self.current_bytes} bytes)")
+
+    # ---------- 內部 ----------
+    def _name(self, object_name: str, variant: str = "") -> str:
+        # 以物件名稱的雜湊開頭，刪除物件時不必知道版本資訊也能找到全部快取
+        return f"{_digest(object_name)}-{_digest(variant)[:16]}"
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name[:2], name)
+
+    def _scan(self):
+        """
+        掃描整個目錄：淘汰到總大小不超過上限，再用掃描結果取代本行程的索引。
+        多個行程同時掃描時以檔案鎖排隊，避免重複淘汰。
+        """
+        if not self._scan_lock.acquire(blocking=False):
+            return  # 本行程已有其他執行緒在掃描
+        lock_file = None
+        try:
+            if fcntl is not None:
+                lock_file = open(os.path.join(self.root, LOCK_FILENAME), "a")
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            found, total, now = [], 0, time.time()
+            for dirpath, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    if filename == LOCK_FILENAME:
+                        continue
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    if filename.endswith(".tmp"):
+                        # 抓到一半就中斷的殘檔
+                        if now - stat.st_mtime > STALE_TMP_SECONDS:
+                            self._unlink(path)
+                        continue
+                    found.append((stat.st_mtime, filename, stat.st_size))
+                    total += stat.st_size
+            found.sort()
+            evicted = 0
+            while total > self.max_bytes and found:
+                _, filename, size = found.pop(0)
+                self._unlink(self._path(filename))
+                total -= size
+                evicted += 1
+        finally:
+            if lock_file is not None:
+                lock_file.close()  # 關檔即釋放 flock
+            self._scan_lock.release()
+
+        with self._lock:
+            self._entries = OrderedDict((filename, size) for _, filename, size in found)
+            self.current_bytes = total
+            self._written_since_scan = 0
+            self._last_scan = time.monotonic()
+            self.stats["evictions"] += evicted
+            self.stats["scans"] += 1
+
+    def _scan_due(self) -> bool:
+        # 呼叫端需持有 self._lock
+        return (
+            self.current_bytes > self.max_bytes
+            or self._written_since_scan >= self.max_bytes // 100
+            or time.monotonic() - self._last_scan >= self.scan_interval
+        )
+
+    @staticmethod
+    def _unlink(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _store(self, name: str, write: Callable[[object], None]):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 暫存檔名帶 pid：不同行程的執行緒 id 可能相同
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                write(f)
+            size = os.path.getsize(tmp_path)
+            if size > self.max_object_bytes:
+                os.remove(tmp_path)
+                return
+            # 寫完再改名：其他請求 (或其他 worker 行程) 不會看到寫到一半的檔案
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            old = self._entries.pop(name, None)
+            if old is not None:
+                self.current_bytes -= old
+            self._entries[name] = size
+            self.current_bytes += size
+            self._written_since_scan += size
+            self.stats["fills"] += 1
+            self.stats["fill_bytes"] += size
+            scan = self._scan_due()
+        if scan:
+            self._scan()
+
+    # ---------- 對外 ----------
+    def open(self, object_name: str, variant: str = "") -> Optional[BinaryIO]:
+        """
+        命中時回傳已開啟的檔案 (呼叫端負責關閉)，否則 None。
+        先開檔再回應：之後就算被淘汰 (unlink)，已開啟的 fd 仍讀得到完整內容。
+        """
+        name = self._name(object_name, variant)
+        path = self._path(name)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            # 沒有這個檔案，或已被 (其他 worker 行程) 淘汰
+            with self._lock:
+                size = self._entries.pop(name, None)
+                if size is not None:
+                    self.current_bytes -= size
+                self.stats["misses"] += 1
+            return None
+        size = os.fstat(f.fileno()).st_size
+        try:
+            # 修改時間當作共用的 LRU 順序 (掃描時淘汰最舊的)
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            # 其他行程抓下來的檔案也收進本行程的索引
+            old = self._entries.pop(name, None)
+            self.current_bytes += size - (old or 0)
+            self._entries[name] = size
+            self.stats["hits"] += 1
+            self.stats["hit_bytes"] += size
+        return f
+
+    def accepts(self, size: Optional[int]) -> bool:
+        return size is not None and size <= self.max_object_bytes
+
+    def put_bytes(self, object_name: str, data: bytes, variant: str = ""):
+        if not self.accepts(len(data)):
+            return
+        try:
+            self._store(self._name(object_name, variant), lambda f: f.write(data))
+        except Exception as e:
+            with self._lock:
+                self.stats["fill_errors"] += 1
+            logger.warning(f"寫入本機物件快取失敗 ({object_name}): {e}")
+
+    def fill_async(self, object_name: str, open_source: Callable[[], object], variant: str = ""):
+        """
+        背景抓取整個物件寫入快取；同一物件同時只會有一個抓取工作。
+        open_source() 回傳可 read() 的來源 (例如 MinIO get_object 的回應)，用完會 close / release_conn。
+        """
+        name = self._name(object_name, variant)
+        with self._lock:
+            if name in self._filling:
+                return
+            self._filling.add(name)
+
+        def _fill():
+            try:
+                if os.path.exists(self._path(name)):
+                    return  # 其他行程剛抓好
+                source = open_source()
+                try:
+                    self._store(name, lambda f: shutil.copyfileobj(source, f, 1024 * 1024))
+                finally:
+                    source.close()
+                    if hasattr(source, "release_conn"):
+                        source.release_conn()
+            except Exception as e:
+                with self._lock:
+                    self.stats["fill_errors"] += 1
+                logger.warning(f"填入本機物件快取失敗 ({object_name}): {e}")
+            finally:
+                with self._lock:
+                    self._filling.discard(name)
+
+        self._executor.submit(_fill)
+
+    def discard(self, object_name: str):
+        """物件被刪除時一併移除它所有版本的快取 (包含其他行程填入、不在本行程索引裡的)。"""
+        prefix = f"{_digest(object_name)}-"
+        try:
+            names = [n for n in os.listdir(os.path.join(self.root, prefix[:2]))
+                     if n.startswith(prefix) and not n.endswith(".tmp")]
+        except FileNotFoundError:
+            names = []
+        with self._lock:
+            for name in names:
+                self.current_bytes -= self._entries.pop(name, 0)
+        for name in names:
+            self._unlink(self._path(name))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.stats["hits"] + self.stats["misses"]
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "max_object_bytes": self.max_object_bytes,
+                "filling": len(self._filling),
+                "hit_ratio": round(self.stats["hits"] / total, 4) if total else None,
+                **self.stats,
+            }
@@ -73,6 +73,47 @@ function appendTokenToUrl(url) {
     }
 }
 
+// --- [新增] 影片播放：原檔 (Range) ---
+function playProgressive(video, url, mime) {
+    video.innerHTML = '';
+    const source = document.createElement('source');
+    source.src = url;
+    source.type = mime;
+    video.appendChild(source);
+    video.load();
+}
+
+// --- [新增] 影片播放：HLS (Safari 原生支援，其他瀏覽器動態載入 hls.js；都不行就退回原檔) ---
+const HLS_JS_URL = 'https://cdn.jsdelivr.net/npm/hls.js@1/dist/hls.mjs';
+
+async function playHls(video, hlsUrl, fallbackUrl, mime) {
+    if (video.canPlayType('application/vnd.apple.mpegurl')) {
+        video.src = hlsUrl;
+        video.onerror = () => {
+            video.onerror = null;
+            video.removeAttribute('src');
+            playProgressive(video, fallbackUrl, mime);
+        };
+        return;
+    }
+    try {
+        const { default: Hls } = await import(HLS_JS_URL);
+        if (!Hls.isSupported()) throw new Error("瀏覽器不支援 HLS");
+        const hls = new Hls();
+        hls.on(Hls.Events.ERROR, (_, data) => {
+            if (data.fatal) {
+                hls.destroy();
+                playProgressive(video, fallbackUrl, mime);
+            }
+        });
+        hls.loadSource(hlsUrl);
+        hls.attachMedia(video);
+    } catch (error) {
+        console.warn("HLS 播放失敗，改用原檔:", error);
+        playProgressive(video, fallbackUrl, mime);
+    }
+}
+
 // --- UI: 渲染詳情主入口 ---
 function renderDetail(asset) {
     // 1. 基本文字資訊
@@ -210,13 +251,14 @@ function updatePreview(asset, specificVersionNum) {
         video.style.objectFit = 'contain'; 
         video.style.backgroundColor = '#000';
 
-        const source = document.createElement('source');
-        source.src = targetUrl;
-        source.type = mime;
-        video.appendChild(source);
-        
         previewBox.appendChild(video);
-        video.load(); 
+
+        // [新增] 已轉成 HLS 的最新版優先用多位元率播放，否則直接播原檔
+        if (asset.hls_url && !specificVersionNum) {
+            playHls(video, appendTokenToUrl(asset.hls_url), targetUrl, mime);
+        } else {
+            playProgressive(video, targetUrl, mime);
+        }
 
     } else if (mime.startsWith('image/')) {
         // --- 圖片區塊 ---
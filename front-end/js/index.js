@@ -6,6 +6,10 @@ let currentFilter = 'all';
 let currentType = 'category'; 
 let activeTags = new Set();
 let showFavoritesOnly = false;
+let loadedAssets = [];      // [新增] 目前已載入的資產 (分頁累積)
+let nextCursor = null;      // [新增] 下一頁的 cursor，null 代表已到最後一頁
+let totalAssets = null;     // [新增] 後端回傳的總數 (概估)
+let assetsRequestSeq = 0;   // [新增] 篩選連續切換時，只採用最後一次請求的結果
 
 // --- 初始化 ---
 document.addEventListener('DOMContentLoaded', () => {
@@ -14,9 +18,21 @@ document.addEventListener('DOMContentLoaded', () => {
 });
 
 // --- API: 載入資產列表 ---
-async function loadAssets() {
+// [修改] 後端改為分頁：第一頁順便取總數，之後依 X-Next-Cursor 按「載入更多」接著讀
+// [修改] 類型 / 標籤篩選交給後端 (file_type= / tags=)，篩選一變就從第一頁重新查詢；
+//        只在前端過濾已載入的卡片會漏掉還沒載入的頁
+async function loadAssets(cursor = null, { refreshFacets = true } = {}) {
+    const seq = ++assetsRequestSeq;
     try {
-        const response = await fetch(`${API_BASE_URL}/assets/`, {
+        // [新增] view=grid：後端只回網格用到的欄位 (asset_id / filename / file_type / thumbnail_url / tags)
+        const params = new URLSearchParams({ view: 'grid' });
+        if (currentFilter !== 'all') params.set('file_type', currentFilter);
+        // 多選標籤為 OR (後端語法：| 為 OR)
+        if (activeTags.size > 0) params.set('tags', Array.from(activeTags).join('|'));
+        if (cursor) params.set('cursor', cursor);
+        else params.set('include_total', 'true');
+
+        const response = await fetch(`${API_BASE_URL}/assets/?${params}`, {
             method: 'GET',
             headers: api.getHeaders()
         });
@@ -24,12 +40,25 @@ async function loadAssets() {
         if (!response.ok) throw new Error("讀取資料失敗");
 
         const assets = await response.json();
+        // 等待期間篩選又變了：這次的結果已過時
+        if (seq !== assetsRequestSeq) return;
+        nextCursor = response.headers.get('X-Next-Cursor');
+        if (!cursor) {
+            loadedAssets = [];
+            const total = response.headers.get('X-Total-Count');
+            totalAssets = total !== null ? Number(total) : null;
+        }
+        loadedAssets = loadedAssets.concat(assets);
         
-        // 1. 渲染中間的資產卡片
-        renderApiAssets(assets);
+        // 1. 渲染中間的資產卡片 (第一頁清空重畫，之後的頁接在後面)
+        renderApiAssets(assets, Boolean(cursor));
         
-        // 2. [新增] 渲染側邊欄的 AI 標籤
-        renderSidebarTags(assets);
+        // 2. [修改] 側邊欄標籤改由後端 facets 統計 (不必載入全部資產)，只在第一頁時讀取
+        if (!cursor && refreshFacets) loadSidebarFacets();
+
+        // 收藏只存在本機，仍在前端過濾
+        applyFilter();
+        renderLoadMore();
 
     } catch (error) {
         console.error(error);
@@ -40,26 +69,30 @@ async function loadAssets() {
     }
 }
 
+// --- [新增] API: 讀取 facets (各標籤的資產數) ---
+async function loadSidebarFacets() {
+    try {
+        const response = await fetch(`${API_BASE_URL}/assets/facets`, {
+            method: 'GET',
+            headers: api.getHeaders()
+        });
+        if (!response.ok) throw new Error("讀取標籤統計失敗");
+        const facets = await response.json();
+        renderSidebarTags(facets.tags || []);
+    } catch (error) {
+        console.error(error);
+    }
+}
+
 // --- [新增] 渲染側邊欄標籤 ---
-function renderSidebarTags(assets) {
+function renderSidebarTags(tagFacets) {
     const container = document.getElementById('sidebar-tags'); // 記得 HTML 要加 id="sidebar-tags"
     if (!container) return; // 如果找不到容器(例如在別頁)就不執行
 
     container.innerHTML = ''; // 清空舊標籤
 
-    // 1. 收集所有出現過的標籤 (使用 Set 去除重複)
-    const uniqueTags = new Set();
-    
-    assets.forEach(asset => {
-        if (asset.tags && Array.isArray(asset.tags)) {
-            asset.tags.forEach(tagObj => {
-                // 假設後端回傳結構是 { tag_name: "貓咪", ... }
-                if (tagObj.tag_name) {
-                    uniqueTags.add(tagObj.tag_name);
-                }
-            });
-        }
-    });
+    // 1. 後端已依資產數排序，名稱不會重複
+    const uniqueTags = new Set(tagFacets.map(facet => facet.value).filter(Boolean));
 
     // 2. 如果沒有任何標籤
     if (uniqueTags.size === 0) {
@@ -91,20 +124,45 @@ function getLocalFavorites() {
     return stored ? JSON.parse(stored) : [];
 }
 
+// --- [新增] 「載入更多」按鈕 (還有下一頁才顯示) ---
+function renderLoadMore() {
+    const container = document.getElementById('all-assets-container');
+    if (!container) return;
+
+    let button = document.getElementById('load-more-assets');
+    if (!nextCursor) {
+        if (button) button.remove();
+        return;
+    }
+    if (!button) {
+        button = document.createElement('button');
+        button.id = 'load-more-assets';
+        button.innerText = '載入更多';
+        button.style.cssText = 'display: block; margin: 20px auto; padding: 8px 24px; cursor: pointer;';
+        button.onclick = async () => {
+            button.disabled = true;
+            await loadAssets(nextCursor);
+            button.disabled = false;
+        };
+        container.insertAdjacentElement('afterend', button);
+    }
+}
+
 // --- API: 把後端資料畫到畫面上 (網格佈局) ---
-function renderApiAssets(assets) {
+function renderApiAssets(assets, append = false) {
     const container = document.getElementById('all-assets-container'); 
     if (!container) return; 
 
-    container.innerHTML = ''; 
+    if (!append) container.innerHTML = ''; 
 
     const headerTitle = document.querySelector('.section-header');
-    if(headerTitle) headerTitle.innerText = `所有資產列表 (${assets.length})`;
+    if(headerTitle) headerTitle.innerText = `所有資產列表 (${totalAssets !== null ? totalAssets : loadedAssets.length})`;
 
-    if (assets.length === 0) {
+    if (loadedAssets.length === 0) {
         container.style.display = 'flex';
         container.style.justifyContent = 'center';
-        container.innerHTML = '<div style="width:100%; text-align:center; color:#ccc; padding:40px; font-size:1.2rem;">目前沒有任何資產</div>';
+        const emptyText = (currentFilter !== 'all' || activeTags.size > 0) ? '沒有符合條件的資產' : '目前沒有任何資產';
+        container.innerHTML = `<div style="width:100%; text-align:center; color:#ccc; padding:40px; font-size:1.2rem;">${emptyText}</div>`;
         return;
     } else {
         container.style.display = 'grid';
@@ -137,7 +195,7 @@ function renderApiAssets(assets) {
                 <img src="${heartIcon}" class="favorite-btn" onclick="toggleFavorite(event, this)">
                 
                 <div class="card-img-container">
-                    <img src="${thumb}" onerror="this.src='static/image/upload_grey.png'">
+                    <img src="static/image/upload_grey.png" data-thumb-id="${asset.asset_id}" data-thumb-url="${thumb}" onerror="this.src='static/image/upload_grey.png'">
                 </div>
 
                 <div class="card-title">${asset.filename}</div>
@@ -147,6 +205,94 @@ function renderApiAssets(assets) {
         `;
         container.insertAdjacentHTML('beforeend', cardHTML);
     });
+
+    // [新增] 整頁縮圖用一個批次請求載入
+    loadGridThumbnails(container);
+}
+
+// --- [新增] API: 批次載入縮圖 (NDJSON 串流，每讀到一行就換上一張圖) ---
+const THUMBNAIL_BATCH_SIZE = 200;
+
+async function loadGridThumbnails(container) {
+    const imgs = {};
+    // 已處理過的 (前幾頁) 不再重抓
+    container.querySelectorAll('img[data-thumb-id]:not([data-thumb-loaded])').forEach(img => {
+        img.dataset.thumbLoaded = 'true';
+        imgs[img.dataset.thumbId] = img;
+    });
+    const ids = Object.keys(imgs).map(Number);
+
+    // 沒拿到的 (尚無縮圖 / 處理中 / 批次請求失敗) 改用單張縮圖網址 (處理中會回 202，輪詢到好為止)
+    const fallback = (id) => {
+        const img = imgs[id];
+        if (img && img.dataset.thumbUrl) loadThumbnailWithRetry(img, img.dataset.thumbUrl);
+    };
+
+    for (let i = 0; i < ids.length; i += THUMBNAIL_BATCH_SIZE) {
+        const chunk = ids.slice(i, i + THUMBNAIL_BATCH_SIZE);
+        const pending = new Set(chunk.map(String));
+        try {
+            const response = await fetch(`${API_BASE_URL}/assets/thumbnails`, {
+                method: 'POST',
+                headers: api.getHeaders(false, 'POST'),
+                body: JSON.stringify({ asset_ids: chunk, format: 'webp' })
+            });
+            if (!response.ok || !response.body) throw new Error("批次縮圖讀取失敗");
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                lines.filter(line => line.trim()).forEach(line => {
+                    const item = JSON.parse(line);
+                    const id = String(item.asset_id);
+                    pending.delete(id);
+                    if (item.status === 'ok' && imgs[id]) {
+                        imgs[id].src = `data:${item.content_type};base64,${item.data}`;
+                    } else if (item.status !== 'not_found') {
+                        fallback(id);
+                    }
+                });
+            }
+        } catch (error) {
+            console.error(error);
+        }
+        pending.forEach(fallback);
+    }
+}
+
+// [新增] 單張縮圖：背景產生中回 202 (JSON，不能直接塞進 <img>)，依 Retry-After 重試，拿到圖才換上
+const THUMBNAIL_RETRY_LIMIT = 10;
+
+async function loadThumbnailWithRetry(img, url) {
+    let delay = 2;
+    for (let attempt = 0; attempt < THUMBNAIL_RETRY_LIMIT; attempt++) {
+        let response;
+        try {
+            response = await fetch(url);
+        } catch (error) {
+            console.error(error);
+            return;
+        }
+        if (response.status === 202) {
+            delay = Math.max(delay, Number(response.headers.get('Retry-After')) || 0);
+            await new Promise(resolve => setTimeout(resolve, delay * 1000));
+            delay = Math.min(delay * 2, 30);
+            continue;
+        }
+        // 沒有縮圖 (404 等) 就保留預設圖示
+        if (!response.ok) return;
+        const blob = await response.blob();
+        if (!img.isConnected) return;
+        img.src = URL.createObjectURL(blob);
+        img.onload = () => URL.revokeObjectURL(img.src);
+        return;
+    }
 }
 
 // 1. 一般篩選重置
@@ -161,10 +307,10 @@ window.resetFilters = function(element) {
     document.querySelectorAll('.tag-pill').forEach(el => el.classList.remove('active-filter'));
     
     if(element) element.classList.add('active-filter');
-    applyFilter();
+    reloadFilteredAssets();
 }
 
-// 2. 選擇類別
+// 2. 選擇類別 (對應後端 file_type)
 window.filterAssets = function(category, element) {
     currentFilter = category;
     currentType = 'category';
@@ -172,7 +318,7 @@ window.filterAssets = function(category, element) {
     
     document.querySelectorAll('.menu-item, .submenu-item').forEach(el => el.classList.remove('active-filter'));
     if(element) element.classList.add('active-filter');
-    applyFilter();
+    reloadFilteredAssets();
 }
 
 // 3. 我的收藏篩選
@@ -185,7 +331,7 @@ window.filterFavorites = function(element) {
     document.querySelectorAll('.tag-pill').forEach(el => el.classList.remove('active-filter'));
     
     if(element) element.classList.add('active-filter');
-    applyFilter();
+    reloadFilteredAssets();
 }
 
 // 4. [修改] 選擇標籤 (支援多選切換)
@@ -202,7 +348,13 @@ window.toggleTag = function(tag, element) {
     // 如果有點選標籤，要清除左側「所有資產」或「類別」的 active 狀態，避免混淆
     // (這部分看需求，通常標籤是附加篩選，這裡暫保留共存)
     
-    applyFilter();
+    reloadFilteredAssets();
+}
+
+// [新增] 篩選條件改變：cursor 歸零，依新條件從第一頁重查 (標籤統計不變，不必重讀)
+function reloadFilteredAssets() {
+    nextCursor = null;
+    loadAssets(null, { refreshFacets: false });
 }
 
 // 5. 愛心切換
@@ -238,38 +390,13 @@ window.toggleFavorite = function(event, btn) {
 }
 
 // 6. 核心篩選應用
+// [修改] 類型 / 標籤已由後端篩選，這裡只處理存在本機的收藏
 function applyFilter() {
     const allCards = document.querySelectorAll('.card');
 
     allCards.forEach(card => {
-        const cardCategory = card.getAttribute('data-category');
-        // cardTags 現在是一個字串 "tag1,tag2,tag3"
-        const cardTagsStr = card.getAttribute('data-tags') || ""; 
         const isFavorite = card.getAttribute('data-favorite') === 'true';
-        let shouldShow = false;
-
-        // 檢查標籤匹配 (只要 activeTags 裡面有一個標籤符合就顯示 => OR 邏輯)
-        // 若要 AND 邏輯需改寫
-        let tagMatch = true;
-        if (activeTags.size > 0) {
-            tagMatch = false;
-            // 檢查卡片的 tags 是否包含 activeTags 中的任意一個
-            for (let tag of activeTags) {
-                if (cardTagsStr.includes(tag)) { 
-                    tagMatch = true; 
-                    break; 
-                }
-            }
-        }
-
-        if (showFavoritesOnly) {
-            // 收藏模式：必須是收藏 + 標籤符合
-            if (isFavorite && tagMatch) shouldShow = true;
-        } else {
-            // 一般模式：類別符合 + 標籤符合
-            let categoryMatch = (currentFilter === 'all' || cardCategory === currentFilter);
-            if (categoryMatch && tagMatch) shouldShow = true;
-        }
+        const shouldShow = !showFavoritesOnly || isFavorite;
 
         if (shouldShow) card.classList.remove('hidden');
         else card.classList.add('hidden');
@@ -39,6 +39,23 @@ function renderSharePage(data, token) {
 
     // 處理預覽
     const previewArea = document.getElementById('preview-area');
+
+    // [新增] 多個檔案：列出各檔案 (可個別下載)，下載按鈕為整包 ZIP
+    if (data.files && data.files.length > 1) {
+        previewArea.innerHTML = '';
+        const list = document.createElement('div');
+        list.style.cssText = 'color: #fff; font-size: 1rem; width: 100%; overflow-y: auto; max-height: 100%;';
+        data.files.forEach(file => {
+            const row = document.createElement('a');
+            row.href = file.download_link;
+            row.innerText = `${file.filename} (${formatBytes(file.filesize)})`;
+            row.style.cssText = 'display: block; color: #fff; padding: 6px 0;';
+            list.appendChild(row);
+        });
+        previewArea.appendChild(list);
+        return;
+    }
+
     const fileType = data.file_type || "";
     const previewUrl = data.download_link; // 圖片/影片直接用下載連結來預覽
 
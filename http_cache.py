@@ -0,0 +1,98 @@
+# http_cache.py
+# HTTP 快取驗證工具：ETag / Last-Modified、If-None-Match / If-Modified-Since (304)、If-Range、Range 解析
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Tuple
+
+# 指定版本的內容永遠不會變；「最新版」可能換版本，每次都要回來驗證
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def make_etag(value: str) -> str:
+    """強驗證 ETag：優先用內容 SHA-256，沒有時用 MinIO 的 etag。"""
+    return f'"{value.strip(chr(34))}"'
+
+
+def _utc_seconds(dt: datetime) -> datetime:
+    # HTTP 日期只到秒
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def http_date(dt: datetime) -> str:
+    return format_datetime(_utc_seconds(dt), usegmt=True)
+
+
+def _parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return _utc_seconds(parsed) if parsed else None
+
+
+def _etag_list(value: str):
+    return [tag.strip() for tag in value.split(",") if tag.strip()]
+
+
+def is_not_modified(headers, etag: str, last_modified: Optional[datetime]) -> bool:
+    """依 If-None-Match (優先) 或 If-Modified-Since 判斷是否可回 304。"""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match:
+        # If-None-Match 用弱比較：忽略 W/ 前綴
+        tags = [t[2:] if t.startswith("W/") else t for t in _etag_list(if_none_match)]
+        return "*" in tags or etag in tags
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        since = _parse_http_date(if_modified_since)
+        return since is not None and _utc_seconds(last_modified) <= since
+    return False
+
+
+def if_range_matches(headers, etag: str, last_modified: Optional[datetime]) -> bool:
+    """
+    If-Range 成立 (或沒有帶) 才照 Range 回 206；不成立代表客戶端手上的是舊內容，要回完整 200。
+    ETag 必須強比較 (W/ 一律不成立)；日期必須與 Last-Modified 完全相同。
+    """
+    if_range = headers.get("if-range")
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    since = _parse_http_date(if_range)
+    return since is not None and last_modified is not None and since == _utc_seconds(last_modified)
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析單一 bytes range，回傳 (start, end)；沒有 Range、格式不認得或多段 range 時回傳 None (回完整內容)。
+    範圍完全超出檔案時丟 RangeNotSatisfiable (416)。
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+    first, last = (part.strip() for part in spec.split("-", 1))
+    try:
+        if not first:
+            # bytes=-500：最後 500 bytes
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - suffix, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
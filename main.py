@@ -1,15 +1,16 @@
-﻿from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, Security, BackgroundTasks, Form, Request, Response, Body, Header
+﻿from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, Security, BackgroundTasks, Form, Request, Response, Body, Header, Query
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm, APIKeyHeader
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session, joinedload, outerjoin
+from sqlalchemy.orm import Session, joinedload, selectinload, outerjoin
+from sqlalchemy import insert, text, select, func, or_, and_
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
 from database import get_db, SessionLocal
 import models
 import schemas
-import shutil      # <--- 處理檔案複製
 import os          # <--- 處理路徑
-from datetime import datetime, timedelta  # <--- 記得加上逗號和 timedelta
+from datetime import datetime, timedelta, timezone  # <--- 記得加上逗號和 timedelta
 from jose import JWTError, jwt
 import security # 匯入寫的 security.py
 from PIL import Image, ImageFilter  # <--- 新增這個，用來處理圖片
@@ -17,6 +18,7 @@ import uuid  # <--- 用來產生亂碼 Token
 import secrets # <--- 用來產生安全亂碼
 import zipfile
 import json
+import base64
 import csv
 import io
 import pyotp # <--- 用來處理 Google Authenticator
@@ -30,8 +32,26 @@ from deep_translator import GoogleTranslator
 from fastapi.responses import HTMLResponse
 from minio import Minio # <--- 新增
 from minio.error import S3Error
+from minio.commonconfig import CopySource
 import logging
-import subprocess
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import uploads # <--- 上傳串流工具
+import derivatives # <--- 衍生檔 (縮圖) 背景 worker pool
+import media # <--- 縮圖規格 (尺寸 / 格式)
+import admission # <--- 上傳流量控管
+import http_cache # <--- ETag / 304 / Range 工具
+import presign # <--- presigned GET 網址快取 (302 轉址模式)
+import ttl_cache # <--- 行程內 TTL 快取
+import thumbnail_cache # <--- 縮圖 LRU / 依 key 的鎖
+import disk_cache # <--- 本機 SSD 物件快取
+import search # <--- 資產全文搜尋 (FULLTEXT ngram)
+import tag_index # <--- 標籤記憶體索引 (多標籤 AND / OR / NOT)
+import re
+import time
+import calendar
 
 APP_BASE_URL = os.getenv("DOMAIN_HOST", "http://localhost:8000")
 
@@ -46,6 +66,67 @@ logger = logging.getLogger("RedAnt") # 取個帥氣的名字
 #  初始化 app (這行一定要在 add_middleware 之前！)
 app = FastAPI(title="RedAnt DAM System API")
 
+# --- [新增] 上傳流量控管 ---
+# 限制同時進行的上傳數 (全域 / 每位使用者) 與暫存中的總 bytes，額滿時短暫排隊，等不到回 429 + Retry-After
+# 注意：要在 CORS 之前註冊，CORS 才會包在外層，429 回應也帶得到 CORS header
+upload_admission = admission.UploadAdmission(
+    max_inflight=int(os.getenv("UPLOAD_MAX_INFLIGHT", "16")),
+    max_per_user=int(os.getenv("UPLOAD_MAX_INFLIGHT_PER_USER", "4")),
+    max_spooled_bytes=int(os.getenv("UPLOAD_MAX_SPOOLED_MB", "2048")) * 1024 * 1024,
+    max_queue=int(os.getenv("UPLOAD_QUEUE_SIZE", "32")),
+    queue_timeout=float(os.getenv("UPLOAD_QUEUE_TIMEOUT", "5")),
+)
+
+# 會把檔案內容送進 API 的路由 (直傳 /uploads/direct 不經過這裡，不用管)
+_UPLOAD_ROUTES = [
+    ("POST", re.compile(r"^/assets/?$")),
+    ("POST", re.compile(r"^/assets/batch/?$")),
+    ("POST", re.compile(r"^/assets/\d+/versions/?$")),
+    ("PUT", re.compile(r"^/uploads/[^/]+/chunks/\d+/?$")),
+]
+
+def _is_upload_request(request: Request) -> bool:
+    return any(request.method == method and pattern.match(request.url.path) for method, pattern in _UPLOAD_ROUTES)
+
+def _upload_client_key(request: Request) -> str:
+    # 只用來分組計數，不做授權 (授權仍由各路由的 Depends 負責)；解不出身分就以 IP 計
+    api_key = request.headers.get("X-API-TOKEN")
+    if api_key:
+        return f"key:{hashlib.sha256(api_key.encode()).hexdigest()}"
+    auth = request.headers.get("Authorization", "")
+    if auth.lower().startswith("bearer "):
+        try:
+            payload = jwt.decode(auth[7:], security.SECRET_KEY, algorithms=[security.ALGORITHM])
+            if payload.get("sub"):
+                return f"user:{payload['sub']}"
+        except JWTError:
+            pass
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+@app.middleware("http")
+async def upload_admission_middleware(request: Request, call_next):
+    if not _is_upload_request(request):
+        return await call_next(request)
+
+    # 在讀取 body (spool 到暫存) 之前就決定放不放行
+    declared = request.headers.get("content-length")
+    if not declared or not declared.isdigit():
+        return JSONResponse(status_code=411, content={"detail": "上傳請求必須帶 Content-Length"})
+    size = int(declared)
+    client_key = _upload_client_key(request)
+
+    try:
+        await upload_admission.acquire(client_key, size)
+    except admission.AdmissionRejected as e:
+        logger.warning(f"上傳被拒 ({e.reason}): {client_key} {request.method} {request.url.path}")
+        headers = {"Retry-After": str(e.retry_after)} if e.retry_after else {}
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers=headers)
+
+    try:
+        return await call_next(request)
+    finally:
+        await upload_admission.release(client_key, size)
+
 #  設定 CORS (這段要放在 app = FastAPI(...) 之後)
 origins = [
     # 1. 本地開發用 (前端工程師通常用這幾個 Port)
@@ -69,7 +150,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
     # 新增 expose_headers，讓前端能讀到 Accept-Ranges/Content-Range/Content-Length/Content-Type
-    expose_headers=["Accept-Ranges", "Content-Range", "Content-Length", "Content-Type", "ETag"],
+    expose_headers=["Accept-Ranges", "Content-Range", "Content-Length", "Content-Type", "ETag", "Last-Modified", "Cache-Control", "Retry-After", "Link", "X-Next-Cursor", "X-Total-Count"],
     max_age=600
 )
 
@@ -97,6 +178,107 @@ minio_client = Minio(
 )
 
 USE_PRESIGNED = os.getenv("MINIO_USE_PRESIGNED", "false").lower() in ("1", "true", "yes")
+
+# [新增] 轉址模式：下載 / 縮圖 / 分享連結授權通過後回 302 到短效 presigned GET，
+# 檔案內容由瀏覽器直接向 MinIO 讀取 (MINIO_ENDPOINT 必須是客戶端連得到的位址)
+REDIRECT_DOWNLOADS = os.getenv("MINIO_REDIRECT_DOWNLOADS", "false").lower() in ("1", "true", "yes")
+presigned_urls = presign.PresignedUrlCache(
+    ttl_seconds=int(os.getenv("MINIO_PRESIGNED_TTL_SECONDS", "900"))
+)
+
+# [新增] 本機 SSD 物件快取 (選用)：設定 OBJECT_CACHE_DIR 才啟用
+# 熱門檔案命中時由本機檔案回應 (支援 Range)，不再經網路讀 MinIO；目錄與大小上限由同一台機器的 worker 行程共用
+OBJECT_CACHE_DIR = os.getenv("OBJECT_CACHE_DIR")
+object_cache = disk_cache.DiskCache(
+    OBJECT_CACHE_DIR,
+    max_bytes=int(float(os.getenv("OBJECT_CACHE_MAX_GB", "20")) * 1024 ** 3),
+    max_object_bytes=int(os.getenv("OBJECT_CACHE_MAX_OBJECT_MB", "512")) * 1024 * 1024
+) if OBJECT_CACHE_DIR else None
+
+@app.on_event("shutdown")
+def stop_object_cache():
+    if object_cache:
+        object_cache.shutdown()
+
+def _open_cached_object(storage_path: str, version_key: Optional[str], file_size: Optional[int]):
+    """命中回傳已開啟的本機檔案 (呼叫端負責關閉)；未命中時排入背景抓取並回傳 None (這次仍從 MinIO 讀)。"""
+    if not object_cache or not version_key:
+        return None
+    f = object_cache.open(storage_path, version_key)
+    if f is None and object_cache.accepts(file_size):
+        object_cache.fill_async(
+            storage_path,
+            lambda: minio_client.get_object(MINIO_BUCKET_NAME, storage_path),
+            version_key
+        )
+    return f
+
+def _redirect_to_object(storage_path: str, content_type: str, disposition: str = "inline",
+                        filename: Optional[str] = None, headers: Optional[dict] = None):
+    try:
+        url = presigned_urls.get(
+            minio_client, MINIO_BUCKET_NAME, storage_path,
+            content_type=content_type,
+            disposition=presign.content_disposition(disposition, filename)
+        )
+    except Exception as e:
+        logger.error(f"產生 presigned GET URL 失敗: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Storage error")
+    # 轉址本身不快取：每次都要重新經過授權檢查
+    return RedirectResponse(url, status_code=302, headers={"Cache-Control": "no-store", **(headers or {})})
+
+# --- 衍生檔 (縮圖 / 解析度) worker pool ---
+derivative_dispatcher = derivatives.DerivativeDispatcher(
+    max_workers=int(os.getenv("DERIVATIVE_WORKERS", "2"))
+)
+
+# [新增] HLS 轉檔另用一個 pool (預設 1 個 process)，長片轉檔不會卡住縮圖
+hls_dispatcher = derivatives.DerivativeDispatcher(
+    max_workers=int(os.getenv("HLS_WORKERS", "1")),
+    poll_interval=10.0,
+    kind="hls",
+    stale_after=derivatives.HLS_STALE_AFTER
+)
+
+# [新增] 標籤記憶體索引 (每個 worker 行程各一份)：本行程的寫入即時更新，其他行程的寫入靠定期重建追上；只當查詢提示，條件仍由 SQL 判斷
+asset_tag_index = tag_index.TagIndex(refresh_interval=float(os.getenv("TAG_INDEX_REFRESH_SECONDS", "300")))
+
+@app.on_event("startup")
+def start_tag_index():
+    # 背景執行緒載入，載入完成前的多標籤查詢改走 SQL
+    asset_tag_index.start()
+
+@app.on_event("shutdown")
+def stop_tag_index():
+    asset_tag_index.stop()
+
+@app.on_event("startup")
+def start_derivative_workers():
+    derivative_dispatcher.start()
+    hls_dispatcher.start()
+
+@app.on_event("shutdown")
+def stop_derivative_workers():
+    derivative_dispatcher.stop()
+    hls_dispatcher.stop()
+
+# --- 上傳專用執行緒池 ---
+# 雜湊、MinIO 上傳、SQLAlchemy 都是阻塞呼叫，不能直接在 async 路由裡跑，
+# 否則一個大檔上傳就會卡住同一個 uvicorn worker 的所有請求 (含下載與健康檢查)。
+# 另開一個池而不共用 Starlette 預設的 threadpool，避免大量上傳把一般 sync 路由的執行緒吃光。
+upload_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("UPLOAD_IO_WORKERS", "8")),
+    thread_name_prefix="upload-io"
+)
+
+async def run_upload_io(func, *args, **kwargs):
+    """把阻塞的上傳工作丟到 upload_executor 執行，event loop 只負責等待結果。"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(upload_executor, functools.partial(func, *args, **kwargs))
+
+@app.on_event("shutdown")
+def stop_upload_executor():
+    upload_executor.shutdown(wait=False, cancel_futures=True)
 # 定義 API Token 應該放在 Header 的哪個欄位 (例如 X-API-TOKEN)
 api_key_header = APIKeyHeader(name="X-API-TOKEN", auto_error=False)
 
@@ -157,6 +339,7 @@ def generate_ai_tags(asset_id: int, file_path: str):
 
         # 1. 執行辨識 (使用 target_image)
         results = ai_classifier(target_image, top_k=5)
+        tagged_names = []
         
         for res in results:
             if res['score'] < 0.5:
@@ -189,9 +372,12 @@ def generate_ai_tags(asset_id: int, file_path: str):
             if not existing_link:
                 new_link = models.AssetTag(asset_id=asset_id, tag_id=tag.tag_id)
                 db.add(new_link)
+                tagged_names.append(final_tag_name)
                 logger.info(f"   ✅ 加入標籤: {final_tag_name}")
 
         db.commit()
+        asset_tag_index.add_tags(asset_id, tagged_names)
+        asset_facets_cache.clear()
         logger.info(f"🤖 AI 分析完成: Asset {asset_id}")
 
     except Exception as e:
@@ -340,7 +526,264 @@ def require_permission(resource: str, action: str):
         return current_user
     return permission_checker
 
-# [修正版] API: 單檔上傳 (支援圖片與影片截圖)
+# [新增] 共用：新資產寫入 Asset / Version / Metadata / AuditLog (只 flush，由呼叫端 commit)
+# 標籤索引、分面統計快取等記憶體狀態由呼叫端在 commit 成功後才更新，交易回滾時才不會留下不存在的資產
+def _create_asset_records(
+    db: Session,
+    user: models.User,
+    filename: str,
+    content_type: Optional[str],
+    object_name: str,
+    file_size: int,
+    action_type: str = "UPLOAD",
+    sha256: Optional[str] = None,
+    is_duplicate: bool = False,
+    etag: Optional[str] = None
+) -> models.Asset:
+    # 重複內容直接沿用既有的解析度 / 影片資訊；新內容等衍生檔 worker 處理完再補上
+    known = _known_metadata(db, sha256 if is_duplicate else None)
+    stats = _known_object_stats(db, object_name) if is_duplicate else {"etag": etag, "has_thumbnail": False}
+
+    new_asset = models.Asset(
+        filename=filename,
+        file_type=content_type,
+        uploaded_by_user_id=user.user_id,
+        latest_version_id=None
+    )
+    db.add(new_asset)
+    db.flush()
+
+    new_version = models.Version(
+        asset_id=new_asset.asset_id,
+        version_number=1,
+        storage_path=object_name,
+        sha256=sha256,
+        filesize=file_size,
+        content_type=content_type,
+        **stats
+    )
+    db.add(new_version)
+    db.flush()
+
+    db.add(models.Metadata(
+        asset_id=new_asset.asset_id,
+        filesize=file_size,
+        encoding_format=content_type.split("/")[-1] if content_type else "bin",
+        **known
+    ))
+
+    new_asset.latest_version_id = new_version.version_id
+    _schedule_derivatives(db, new_asset, new_version, content_type, is_duplicate)
+
+    db.add(models.AuditLog(
+        user_id=user.user_id,
+        asset_id=new_asset.asset_id,
+        action_type=action_type,
+    ))
+    return new_asset
+
+# [新增] 共用：既有資產新增一個版本並更新 metadata (只 flush，由呼叫端 commit)
+# 分享連結指向最新版，呼叫端 commit 成功後要清掉 share_links_cache
+def _add_version_records(
+    db: Session,
+    asset: models.Asset,
+    user: models.User,
+    object_name: str,
+    file_size: int,
+    content_type: Optional[str],
+    sha256: Optional[str] = None,
+    is_duplicate: bool = False,
+    etag: Optional[str] = None
+) -> models.Version:
+    known = _known_metadata(db, sha256 if is_duplicate else None)
+    stats = _known_object_stats(db, object_name) if is_duplicate else {"etag": etag, "has_thumbnail": False}
+
+    current_version_num = asset.latest_version.version_number if asset.latest_version else 0
+    new_version_num = current_version_num + 1
+
+    new_version = models.Version(
+        asset_id=asset.asset_id,
+        version_number=new_version_num,
+        storage_path=object_name,  # 存 MinIO Key
+        sha256=sha256,
+        filesize=file_size,
+        content_type=content_type,
+        **stats
+    )
+    db.add(new_version)
+    db.flush()
+
+    asset.latest_version_id = new_version.version_id
+    _schedule_derivatives(db, asset, new_version, content_type, is_duplicate)
+
+    # 更新或建立 metadata_info
+    encoding_format = content_type.split("/")[-1] if content_type else "bin"
+    if asset.metadata_info:
+        asset.metadata_info.filesize = file_size
+        asset.metadata_info.encoding_format = encoding_format
+        for field, value in known.items():
+            setattr(asset.metadata_info, field, value)
+    else:
+        db.add(models.Metadata(
+            asset_id=asset.asset_id,
+            filesize=file_size,
+            encoding_format=encoding_format,
+            **known
+        ))
+
+    # 寫入稽核日誌
+    db.add(models.AuditLog(
+        user_id=user.user_id,
+        asset_id=asset.asset_id,
+        action_type=f"UPDATE_VERSION_v{new_version_num}"
+    ))
+    return new_version
+
+# [新增] 共用：縮圖 / 解析度交給衍生檔 worker pool 背景處理，上傳請求不再等待
+def _schedule_derivatives(
+    db: Session,
+    asset: models.Asset,
+    version: models.Version,
+    content_type: Optional[str],
+    is_duplicate: bool
+):
+    if not derivatives.needs_derivatives(content_type):
+        asset.derivative_status = None
+    elif is_duplicate:
+        # 去重命中：縮圖已存在 (或正由原本那筆工作產生中)
+        asset.derivative_status = derivatives.status_for_existing_object(db, version.storage_path)
+    else:
+        derivatives.enqueue(db, asset, version, content_type)
+        # [新增] 影片另外排一筆 HLS 轉檔 (去重命中的沿用原物件的 HLS)
+        if derivatives.needs_hls(content_type):
+            derivatives.enqueue_hls(db, version, content_type)
+
+# [新增] 共用：刪除 MinIO 原檔與其各規格縮圖 (失敗只記錄)
+def _remove_object_files(storage_path: str):
+    if object_cache:
+        object_cache.discard(storage_path)
+        for key in media.rendition_keys(storage_path):
+            object_cache.discard(key)
+    try:
+        minio_client.remove_object(MINIO_BUCKET_NAME, storage_path)
+        for key in media.rendition_keys(storage_path):
+            minio_client.remove_object(MINIO_BUCKET_NAME, key)
+        # HLS 分段與播放清單、/render 產生的各種規格
+        for prefix in (media.hls_prefix(storage_path), media.render_prefix(storage_path)):
+            for obj in minio_client.list_objects(MINIO_BUCKET_NAME, prefix=f"{prefix}/", recursive=True):
+                minio_client.remove_object(MINIO_BUCKET_NAME, obj.object_name)
+                if object_cache:
+                    object_cache.discard(obj.object_name)
+        logger.info(f"🗑️ 已從 MinIO 刪除: {storage_path}")
+    except Exception as e:
+        logger.warning(f"⚠️ MinIO 刪除失敗 ({storage_path}): {e}")
+
+# ==========================================
+# [新增] 內容去重 (Content-addressed dedup)
+# 相同 SHA-256 的內容在 MinIO 只存一份，StoredObject.ref_count 記錄被幾個 Version 引用
+# ==========================================
+def _acquire_stored_object(db: Session, sha256: str) -> Optional[str]:
+    # 內容已存在：引用數 +1 並回傳既有的 MinIO Key；不存在回傳 None
+    stored = db.query(models.StoredObject).filter(
+        models.StoredObject.sha256 == sha256
+    ).with_for_update().first()
+    if not stored:
+        return None
+    stored.ref_count += 1
+    return stored.storage_path
+
+def _register_stored_object(db: Session, sha256: str, object_name: str, file_size: int, discard_own: bool = True) -> str:
+    # 登記新寫入的物件；若同時有人傳了相同內容而先登記，改用對方的物件並刪掉自己這份
+    # (discard_own=False 時由呼叫端在 commit 成功後自己刪)
+    try:
+        with db.begin_nested():
+            db.add(models.StoredObject(sha256=sha256, storage_path=object_name, filesize=file_size, ref_count=1))
+    except IntegrityError:
+        existing = _acquire_stored_object(db, sha256)
+        if not existing:
+            raise
+        # 同一個 key 被對方登記了 (理論上 key 含亂數不會發生)：那就是對方的物件，不能刪
+        if discard_own and existing != object_name:
+            _remove_object_files(object_name)
+        return existing
+    return object_name
+
+def _release_stored_object(db: Session, version: models.Version) -> bool:
+    # 版本被刪除時引用數 -1，回傳 True 代表已無人引用、可以刪除 MinIO 實體檔
+    if not version.sha256:
+        return True # 去重前的舊資料，每個版本各自一份
+    stored = db.query(models.StoredObject).filter(
+        models.StoredObject.sha256 == version.sha256
+    ).with_for_update().first()
+    if not stored:
+        return True
+    stored.ref_count -= 1
+    if stored.ref_count > 0:
+        return False
+    db.delete(stored)
+    return True
+
+def _known_object_stats(db: Session, storage_path: str) -> dict:
+    # 去重命中時，MinIO etag 與縮圖 / HLS 狀態沿用指向同一個物件的既有版本
+    row = db.query(models.Version.etag, models.Version.has_thumbnail, models.Version.has_hls).filter(
+        models.Version.storage_path == storage_path,
+        models.Version.etag.isnot(None)
+    ).first()
+    return {
+        "etag": row.etag if row else None,
+        "has_thumbnail": bool(row and row.has_thumbnail),
+        "has_hls": bool(row and row.has_hls),
+    }
+
+def _write_etag(result) -> Optional[str]:
+    # MinIO 回傳的 etag 可能帶引號，統一去掉再存
+    etag = getattr(result, "etag", None)
+    return etag.strip('"') if etag else None
+
+def _known_metadata(db: Session, sha256: Optional[str]) -> dict:
+    # 重複內容不再產生縮圖 / 跑 ffprobe，解析度與影片資訊沿用已有相同內容的資產
+    # sha256 為 None (新內容) 時全部留空，等衍生檔 worker 補上
+    row = None
+    if sha256:
+        row = db.query(models.Metadata).join(
+            models.Version, models.Version.asset_id == models.Metadata.asset_id
+        ).filter(models.Version.sha256 == sha256).first()
+    known = {field: getattr(row, field) if row else None for field in derivatives.METADATA_FIELDS}
+    known["resolution"] = known["resolution"] or "Unknown"
+    return known
+
+def _store_spooled_upload(db: Session, fp, object_name: str, declared_type: Optional[str]):
+    """
+    把已 spool 的上傳檔存進 MinIO (以 SHA-256 去重)。
+    先在本機串流算出雜湊，內容已存在就直接引用既有物件、完全不寫 MinIO。
+    回傳 (storage_path, file_size, sha256, content_type, is_duplicate, etag)；重複內容的 etag 為 None
+    """
+    fp.seek(0)
+    file_size, sha256, head = uploads.hash_stream(fp)
+    if file_size == 0:
+        raise HTTPException(status_code=400, detail="上傳的檔案是空的 (0 bytes)")
+    content_type = uploads.resolve_content_type(declared_type, head)
+
+    existing = _acquire_stored_object(db, sha256)
+    if existing:
+        logger.info(f"♻️ 內容重複，直接引用既有物件: {existing} (sha256={sha256})")
+        return existing, file_size, sha256, content_type, True, None
+
+    # 分段直送 MinIO，記憶體中最多只會有一個 part (uploads.MINIO_PART_SIZE)
+    fp.seek(0)
+    result = minio_client.put_object(
+        MINIO_BUCKET_NAME,
+        object_name,
+        fp,
+        length=file_size,
+        part_size=uploads.MINIO_PART_SIZE,
+        content_type=content_type
+    )
+    storage_path = _register_stored_object(db, sha256, object_name, file_size)
+    is_duplicate = storage_path != object_name
+    return storage_path, file_size, sha256, content_type, is_duplicate, None if is_duplicate else _write_etag(result)
+
+# [修正版] API: 單檔上傳 (串流直送 MinIO、內容去重，縮圖於背景產生)
 @app.post("/assets/", response_model=schemas.AssetOut)
 async def create_asset(  # <--- 注意：這裡要加 async (為了用 await)
     background_tasks: BackgroundTasks,
@@ -348,157 +791,205 @@ async def create_asset(  # <--- 注意：這裡要加 async (為了用 await)
     current_user: models.User = Depends(require_permission("asset", "upload")),
     db: Session = Depends(get_db)
 ):
-    # 1. 準備暫存資料夾
-    upload_dir = "temp_uploads"
-    if not os.path.exists(upload_dir):
-        os.makedirs(upload_dir)
+    # event loop 上只做等待；雜湊 / MinIO / DB 全部在 upload_executor 執行
+    asset_out, storage_path = await run_upload_io(_create_asset_blocking, file, current_user, db)
 
-    # 2. 產生檔名與路徑
+    if asset_out.file_type and asset_out.file_type.startswith("image/"):
+        background_tasks.add_task(generate_ai_tags, asset_out.asset_id, storage_path)
+    return asset_out
+
+def _create_asset_blocking(file: UploadFile, current_user: models.User, db: Session):
+    """單檔上傳的阻塞部分 (在 upload_executor 執行)，回傳 (AssetOut, MinIO 物件名稱)。"""
+    # 1. 產生 MinIO 物件名稱
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    safe_filename = f"{timestamp}_{secrets.token_hex(4)}_{file.filename}"
-    temp_file_path = f"{upload_dir}/{safe_filename}"
-    
-    object_name = f"{timestamp}_{file.filename}"
-    thumb_location = f"{os.path.splitext(temp_file_path)[0]}_thumb.jpg"
-    thumb_object_name = f"{os.path.splitext(object_name)[0]}_thumb.jpg"
+    # 加亂數：物件 key 不可變且被去重 / 快取共用，同一秒同檔名的兩次上傳不能寫到同一個 key
+    object_name = f"{timestamp}_{secrets.token_hex(4)}_{file.filename}"
 
-    has_thumbnail = False
-    resolution = "Unknown"
-    file_size = 0
+    new_object = False
 
     try:
-        # [關鍵修正] 強制歸零指標，確保從頭讀取
-        await file.seek(0)
-        
-        # 3. 串流寫入硬碟
-        contents = await file.read() # 先讀進記憶體 (注意：如果檔案太大可能會爆，但在測試階段先求有)
-        with open(temp_file_path, "wb") as buffer:
-            buffer.write(contents)
-        
-        # 檢查檔案大小 (如果這裡還是 0，那就是前端傳送的問題)
-        file_size = os.path.getsize(temp_file_path)
-        if file_size == 0:
-            raise HTTPException(status_code=400, detail="上傳的檔案是空的 (0 bytes)")
-
-        # 4. 處理縮圖 (圖片/影片)
-        if file.content_type and file.content_type.startswith("image/"):
-            try:
-                with Image.open(temp_file_path) as img:
-                    resolution = f"{img.size[0]}x{img.size[1]}"
-                    img.thumbnail((300, 300))
-                    if img.mode in ("RGBA", "P"):
-                        img = img.convert("RGB")
-                    img.save(thumb_location, "JPEG")
-                    has_thumbnail = True
-            except Exception:
-                pass
-
-        elif file.content_type and file.content_type.startswith("video/"):
-            # 影片截圖 (需安裝 ffmpeg)
-            try:
-                subprocess.call([
-                    'ffmpeg', '-y', 
-                    '-i', temp_file_path, 
-                    '-ss', '00:00:01.000', 
-                    '-vframes', '1',
-                    '-vf', 'scale=300:-1', 
-                    thumb_location
-                ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                
-                if os.path.exists(thumb_location):
-                    has_thumbnail = True
-            except Exception as e:
-                logger.info(f"影片截圖失敗 (請確認伺服器已安裝 ffmpeg): {e}")
-
-        # 5. 上傳到 MinIO
-        if has_thumbnail:
-            try:
-                minio_client.fput_object(MINIO_BUCKET_NAME, thumb_object_name, thumb_location, content_type="image/jpeg")
-            except:
-                pass
-
-        minio_client.fput_object(
-            MINIO_BUCKET_NAME,
-            object_name,
-            temp_file_path,
-            content_type=file.content_type
-        )
-
-        # 6. 寫入資料庫
-        new_asset = models.Asset(
-            filename=file.filename,
-            file_type=file.content_type,
-            uploaded_by_user_id=current_user.user_id,
-            latest_version_id=None 
+        # 2. 算 SHA-256 後去重；新內容才以 multipart 串流上傳 MinIO
+        storage_path, file_size, sha256, content_type, is_duplicate, etag = _store_spooled_upload(
+            db, file.file, object_name, file.content_type
         )
-        db.add(new_asset)
-        db.flush()
-
-        new_version = models.Version(
-            asset_id=new_asset.asset_id,
-            version_number=1,
-            storage_path=object_name 
-        )
-        db.add(new_version)
-        db.flush()
+        new_object = not is_duplicate
 
-        new_metadata = models.Metadata(
-            asset_id=new_asset.asset_id,
-            filesize=file_size,
-            resolution=resolution,
-            encoding_format=file.content_type.split("/")[-1] if file.content_type else "bin"
+        # 3. 寫入資料庫，縮圖 / 解析度排入衍生檔佇列 (不在請求中處理)
+        new_asset = _create_asset_records(
+            db, current_user, file.filename, content_type, storage_path, file_size,
+            sha256=sha256, is_duplicate=is_duplicate, etag=etag
         )
-        db.add(new_metadata)
-
-        new_asset.latest_version_id = new_version.version_id
-        
-        new_log = models.AuditLog(
-            user_id=current_user.user_id,
-            asset_id=new_asset.asset_id,
-            action_type="UPLOAD",
-        )
-        db.add(new_log)
-        
         db.commit()
+        asset_tag_index.add_asset(new_asset.asset_id, content_type, current_user.user_id)
+        asset_facets_cache.clear()
         db.refresh(new_asset)
-        
-        if new_asset.file_type and new_asset.file_type.startswith("image/"):
-            background_tasks.add_task(generate_ai_tags, new_asset.asset_id, object_name)
+        derivative_dispatcher.wake()
 
         new_asset.download_url = f"{APP_BASE_URL}/assets/{new_asset.asset_id}/download"
         new_asset.thumbnail_url = f"{APP_BASE_URL}/assets/{new_asset.asset_id}/thumbnail"
 
-        return new_asset
+        # 在這個執行緒就轉成 schema，關聯 (tags / versions / uploader) 的 lazy load 才不會回到 event loop 上查 DB
+        return schemas.AssetOut.model_validate(new_asset), storage_path
 
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         logger.error(f"上傳失敗: {e}", exc_info=True)
+        # 寫 DB 失敗時，把剛上傳的 MinIO 物件清掉 (重複內容是別人的物件，不能刪)
+        if new_object:
+            _remove_object_files(object_name)
         raise HTTPException(status_code=500, detail=f"伺服器錯誤: {str(e)}")
     
-    finally:
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-        if has_thumbnail and os.path.exists(thumb_location):
-            os.remove(thumb_location)
-    
 # ==========================================
-# 2. 下載資產 API (MinIO 版)
+# [新增] 簽章下載 / 縮圖網址 (HMAC，短效期)
+# token 內含 asset / version / user / 到期時間與串流所需的物件資訊，驗證只在記憶體中進行
 # ==========================================
-@app.get("/assets/{asset_id}/download")
-def download_asset(
-    asset_id: int,
+SIGNED_URL_TTL_SECONDS = int(os.getenv("SIGNED_URL_TTL_SECONDS", "3600"))
+
+def _signed_url_expiry() -> int:
+    # 到期時間對齊固定區間：同一區間內產生的網址相同，瀏覽器快取才會命中 (實際效期介於 TTL/2 ~ TTL)
+    window = max(SIGNED_URL_TTL_SECONDS // 2, 1)
+    return (int(time.time()) // window + 2) * window
+
+def _signed_download_url(asset: models.Asset, version: Optional[models.Version], user: models.User) -> Optional[str]:
+    # 尚未回填物件資訊的舊版本無法簽 (串流需要大小與 etag)，由呼叫端改用一般網址
+    if not version or version.filesize is None or not (version.sha256 or version.etag):
+        return None
+    token = security.create_signed_token("download", {
+        "a": asset.asset_id,
+        "v": version.version_id,
+        "u": user.user_id,
+        "k": version.storage_path,
+        "s": version.filesize,
+        "h": version.sha256 or version.etag,
+        "m": calendar.timegm(version.created_at.utctimetuple()) if version.created_at else None,
+        "c": version.content_type or asset.file_type or "application/octet-stream",
+        "n": asset.filename,
+    }, _signed_url_expiry())
+    return f"{APP_BASE_URL}/assets/{asset.asset_id}/download?st={token}"
+
+def _signed_thumbnail_url(asset: models.Asset, version: Optional[models.Version], user: models.User) -> Optional[str]:
+    # 縮圖還沒產生時不簽 (要查 DB 才知道處理狀態)
+    if not version or not version.has_thumbnail:
+        return None
+    token = security.create_signed_token("thumbnail", {
+        "a": asset.asset_id,
+        "v": version.version_id,
+        "u": user.user_id,
+        "k": version.storage_path,
+    }, _signed_url_expiry())
+    return f"{APP_BASE_URL}/assets/{asset.asset_id}/thumbnail?st={token}"
+
+def _attach_signed_links(asset: models.Asset, user: models.User):
+    version = asset.latest_version
+    asset.download_url = (_signed_download_url(asset, version, user)
+                          or f"{APP_BASE_URL}/assets/{asset.asset_id}/download")
+    asset.thumbnail_url = (_signed_thumbnail_url(asset, version, user)
+                           or f"{APP_BASE_URL}/assets/{asset.asset_id}/thumbnail")
+    asset.hls_url = f"{APP_BASE_URL}/assets/{asset.asset_id}/hls/master.m3u8" if version and version.has_hls else None
+
+# [新增] 共用：串流一個版本的 MinIO 物件 (ETag / Last-Modified、304、If-Range、Range)
+# 只需要一次 MinIO 請求；呼叫端負責授權並提供物件資訊
+def _stream_version_object(
     request: Request,
-    version_number: Optional[int] = None,
-    token: Optional[str] = None,
-    api_key: Optional[str] = None,
-    db: Session = Depends(get_db),
+    storage_path: str,
+    file_size: int,
+    etag_value: str,
+    last_modified: Optional[datetime],
+    content_type: str,
+    filename: str,
+    immutable: bool,
+    disposition: str = "inline"
 ):
-    # 1. 找資產
-    asset = db.query(models.Asset).filter(models.Asset.asset_id == asset_id).first()
-    if not asset:
-        raise HTTPException(status_code=404, detail="檔案不存在")
+    # 快取驗證：ETag 優先用內容 SHA-256 (去重前的舊資料用 MinIO etag)
+    etag = http_cache.make_etag(etag_value)
+    cache_headers = {
+        "ETag": etag,
+        "Cache-Control": http_cache.IMMUTABLE_CACHE_CONTROL if immutable else http_cache.REVALIDATE_CACHE_CONTROL,
+    }
+    if last_modified:
+        cache_headers["Last-Modified"] = http_cache.http_date(last_modified)
+
+    if http_cache.is_not_modified(request.headers, etag, last_modified):
+        return Response(status_code=304, headers=cache_headers)
+
+    # 解析 Range header (有帶 If-Range 且內容已變時，改回完整內容)
+    range_header = request.headers.get("Range")
+    if not http_cache.if_range_matches(request.headers, etag, last_modified):
+        range_header = None
+    try:
+        byte_range = http_cache.parse_range(range_header, file_size)
+    except http_cache.RangeNotSatisfiable:
+        raise HTTPException(
+            status_code=416, detail="Range Not Satisfiable", headers={"Content-Range": f"bytes */{file_size}"}
+        )
+
+    # [新增] 本機快取命中：先開檔再回應，檔案之後被 (其他 worker 行程) 淘汰也不影響這次的回應
+    cached_file = _open_cached_object(storage_path, etag_value, file_size)
+    if cached_file is not None and os.fstat(cached_file.fileno()).st_size != file_size:
+        # 大小對不上 (不該發生)：不用這份快取
+        cached_file.close()
+        cached_file = None
+    if cached_file is not None:
+        start, length = (byte_range[0], byte_range[1] - byte_range[0] + 1) if byte_range else (0, file_size)
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Content-Length": str(length),
+            "Content-Disposition": presign.content_disposition(disposition, filename),
+            "Content-Type": content_type,
+            **cache_headers
+        }
+        if byte_range:
+            headers["Content-Range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{file_size}"
+        return StreamingResponse(
+            disk_cache.iter_file(cached_file, start, length),
+            status_code=206 if byte_range else 200,
+            headers=headers,
+            media_type=content_type
+        )
+
+    try:
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+
+            obj = minio_client.get_object(
+                MINIO_BUCKET_NAME,
+                storage_path,
+                offset=start,
+                length=length
+            )
+
+            headers = {
+                "Content-Range": f"bytes {start}-{end}/{file_size}",
+                "Accept-Ranges": "bytes",
+                "Content-Length": str(length),
+                "Content-Disposition": presign.content_disposition(disposition, filename),
+                "Content-Type": content_type,
+                **cache_headers
+            }
+            return StreamingResponse(obj, status_code=206, headers=headers, media_type=content_type)
+
+        obj = minio_client.get_object(MINIO_BUCKET_NAME, storage_path)
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Content-Length": str(file_size),
+            "Content-Disposition": presign.content_disposition(disposition, filename),
+            "Content-Type": content_type,
+            **cache_headers
+        }
+        return StreamingResponse(obj, headers=headers, media_type=content_type)
 
-    # 2. 驗證 (略...保持你原本的代碼)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"下載失敗: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"讀取失敗: {e}")
+    
+# [新增] 共用：<video> / <img> 無法帶 header，token 或 api_key 也可以放在 query string
+def _user_from_query_or_header(request: Request, token: Optional[str], api_key: Optional[str], db: Session) -> models.User:
     user = None
     jwt_token = token
     if not jwt_token:
@@ -524,7 +1015,46 @@ def download_asset(
 
     if not user:
         raise HTTPException(status_code=401, detail="無效的憑證")
+    return user
+
+# ==========================================
+# 2. 下載資產 API (MinIO 版)
+# ==========================================
+@app.get("/assets/{asset_id}/download")
+def download_asset(
+    asset_id: int,
+    request: Request,
+    version_number: Optional[int] = None,
+    token: Optional[str] = None,
+    api_key: Optional[str] = None,
+    st: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    # 0. [新增] 簽章網址：物件資訊都在 token 裡，驗章後直接串流，不查資料庫 (播放器的大量 Range 請求走這裡)
+    if st:
+        claims = security.verify_signed_token(st, "download")
+        if not claims or claims.get("a") != asset_id:
+            raise HTTPException(status_code=401, detail="下載連結無效或已過期")
+        if REDIRECT_DOWNLOADS:
+            return _redirect_to_object(claims["k"], claims["c"], filename=claims["n"])
+        return _stream_version_object(
+            request,
+            storage_path=claims["k"],
+            file_size=claims["s"],
+            etag_value=claims["h"],
+            last_modified=datetime.fromtimestamp(claims["m"], tz=timezone.utc) if claims.get("m") else None,
+            content_type=claims["c"],
+            filename=claims["n"],
+            immutable=True  # token 綁定特定版本
+        )
+
+    # 1. 找資產
+    asset = db.query(models.Asset).filter(models.Asset.asset_id == asset_id).first()
+    if not asset:
+        raise HTTPException(status_code=404, detail="檔案不存在")
 
+    # 2. 驗證
+    user = _user_from_query_or_header(request, token, api_key, db)
     if user.role_id != 1 and asset.uploaded_by_user_id != user.user_id:
         raise HTTPException(status_code=403, detail="權限不足")
 
@@ -544,68 +1074,149 @@ def download_asset(
 
     if not target_version:
         raise HTTPException(status_code=404, detail="此資產沒有任何版本檔案")
+
+    # [新增] 轉址模式：Range / 304 交給 MinIO 處理，app 不經手檔案內容
+    if REDIRECT_DOWNLOADS:
+        return _redirect_to_object(
+            target_version.storage_path,
+            target_version.content_type or asset.file_type or "application/octet-stream",
+            filename=asset.filename
+        )
     
-    # 4. [修正] 這裡要改用 target_version 取得檔案大小
+    # 4. [修正] 檔案大小 / etag 寫入時已記錄在 Version 上，整個下載只需要一次 MinIO 請求
+    if target_version.filesize is not None and (target_version.sha256 or target_version.etag):
+        file_size = target_version.filesize
+        object_etag = target_version.etag
+        last_modified = target_version.created_at
+    else:
+        # 尚未回填的舊資料才需要先問 MinIO (可執行 reconcile_versions.py 補齊)
+        try:
+            stat = minio_client.stat_object(MINIO_BUCKET_NAME, target_version.storage_path)
+        except Exception as e:
+            logger.error(f"MinIO stat_object error: {e}")
+            raise HTTPException(status_code=500, detail="Storage error")
+        file_size, object_etag, last_modified = stat.size, stat.etag, stat.last_modified
+
+    content_type = target_version.content_type or asset.file_type or "application/octet-stream"
+
+    # 5. 串流 (含 ETag / 304 / Range)；指定版本號的內容不會再變 -> immutable，最新版每次回來驗證
+    return _stream_version_object(
+        request,
+        storage_path=target_version.storage_path,
+        file_size=file_size,
+        etag_value=target_version.sha256 or object_etag,
+        last_modified=last_modified,
+        content_type=content_type,
+        filename=asset.filename,
+        immutable=bool(version_number)
+    )
+    
+# ==========================================
+# [新增] HLS 播放 (多位元率)
+# master.m3u8 走一般授權，並把各檔位的播放清單改寫成帶簽章 (st) 的網址；
+# 之後播放器抓播放清單 / 分段只驗章，不查資料庫
+# ==========================================
+_HLS_FILE_PATTERN = re.compile(r"^v\d+/(index\.m3u8|seg_\d+\.ts)$")
+
+def _read_object_text(object_name: str) -> str:
+    obj = minio_client.get_object(MINIO_BUCKET_NAME, object_name)
     try:
-        # ❌ 原本寫 version.storage_path (錯誤)
-        # ✅ 改成 target_version.storage_path (正確)
-        stat = minio_client.stat_object(MINIO_BUCKET_NAME, target_version.storage_path)
-        file_size = stat.size
-    except Exception as e:
-        logger.error(f"MinIO stat_object error: {e}")
-        raise HTTPException(status_code=500, detail="Storage error")
+        return obj.read().decode("utf-8")
+    finally:
+        obj.close()
+        obj.release_conn()
+
+def _rewrite_playlist(playlist: str, to_url) -> str:
+    # 非 # 開頭的行是 URI (相對路徑)，逐行換成可直接存取的網址
+    lines = []
+    for line in playlist.splitlines():
+        stripped = line.strip()
+        lines.append(to_url(stripped) if stripped and not stripped.startswith("#") else line)
+    return "\n".join(lines) + "\n"
+
+def _playlist_response(body: str):
+    # 內含短效簽章，不能被快取
+    return Response(content=body, media_type=media.HLS_MEDIA_TYPES[".m3u8"], headers={"Cache-Control": "no-store"})
+
+@app.get("/assets/{asset_id}/hls/master.m3u8")
+def get_hls_master_playlist(
+    asset_id: int,
+    request: Request,
+    version_number: Optional[int] = None,
+    token: Optional[str] = None,
+    api_key: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    asset = db.query(models.Asset).filter(models.Asset.asset_id == asset_id).first()
+    if not asset:
+        raise HTTPException(status_code=404, detail="檔案不存在")
+    user = _user_from_query_or_header(request, token, api_key, db)
+    if user.role_id != 1 and asset.uploaded_by_user_id != user.user_id:
+        raise HTTPException(status_code=403, detail="權限不足")
 
-    content_type = asset.file_type or "application/octet-stream"
+    if version_number:
+        version = db.query(models.Version).filter(
+            models.Version.asset_id == asset_id,
+            models.Version.version_number == version_number
+        ).first()
+    else:
+        version = asset.latest_version
+    if not version or not version.has_hls:
+        raise HTTPException(status_code=404, detail="此影片尚未完成 HLS 轉檔")
 
-    # 5. 解析 Range header
-    range_header = request.headers.get("Range")
+    prefix = media.hls_prefix(version.storage_path)
     try:
-        if range_header:
-            if not range_header.startswith("bytes="):
-                raise HTTPException(status_code=416, detail="Invalid Range")
-            ranges = range_header.replace("bytes=", "").split("-")
-            start = int(ranges[0]) if ranges[0] else 0
-            end = int(ranges[1]) if (len(ranges) > 1 and ranges[1]) else file_size - 1
-            if start >= file_size:
-                raise HTTPException(status_code=416, detail="Range Not Satisfiable")
-            if end >= file_size:
-                end = file_size - 1
-            length = end - start + 1
+        master = _read_object_text(f"{prefix}/master.m3u8")
+    except Exception as e:
+        logger.error(f"讀取 HLS 播放清單失敗: {e}")
+        raise HTTPException(status_code=404, detail="無法讀取 HLS 播放清單")
+
+    st = security.create_signed_token("hls", {
+        "a": asset_id, "v": version.version_id, "u": user.user_id, "k": prefix,
+    }, _signed_url_expiry())
+    return _playlist_response(_rewrite_playlist(
+        master, lambda uri: f"{APP_BASE_URL}/assets/{asset_id}/hls/{uri}?st={st}"
+    ))
+
+@app.get("/assets/{asset_id}/hls/{file_path:path}")
+def get_hls_file(asset_id: int, file_path: str, st: str):
+    claims = security.verify_signed_token(st, "hls")
+    if not claims or claims.get("a") != asset_id:
+        raise HTTPException(status_code=401, detail="播放連結無效或已過期")
+    if not _HLS_FILE_PATTERN.match(file_path):
+        raise HTTPException(status_code=404, detail="檔案不存在")
+    object_name = f"{claims['k']}/{file_path}"
 
-            # [修正] 這裡也要改成 target_version
-            obj = minio_client.get_object(
-                MINIO_BUCKET_NAME,
-                target_version.storage_path, # <--- 修正處
-                offset=start,
-                length=length
+    if file_path.endswith(".m3u8"):
+        # 檔位播放清單：分段網址轉址模式下直接給 MinIO presigned GET，否則走這個端點
+        variant_dir = file_path.rsplit("/", 1)[0]
+        try:
+            playlist = _read_object_text(object_name)
+        except Exception as e:
+            logger.error(f"讀取 HLS 播放清單失敗: {e}")
+            raise HTTPException(status_code=404, detail="無法讀取 HLS 播放清單")
+        if REDIRECT_DOWNLOADS:
+            to_url = lambda uri: presigned_urls.get(
+                minio_client, MINIO_BUCKET_NAME, f"{claims['k']}/{variant_dir}/{uri}", content_type=media.HLS_MEDIA_TYPES[".ts"]
             )
+        else:
+            to_url = lambda uri: f"{APP_BASE_URL}/assets/{asset_id}/hls/{variant_dir}/{uri}?st={st}"
+        return _playlist_response(_rewrite_playlist(playlist, to_url))
 
-            headers = {
-                "Content-Range": f"bytes {start}-{end}/{file_size}",
-                "Accept-Ranges": "bytes",
-                "Content-Length": str(length),
-                "Content-Disposition": f'inline; filename="{asset.filename}"',
-                "Content-Type": content_type
-            }
-            return StreamingResponse(obj, status_code=206, headers=headers, media_type=content_type)
-
-        # [修正] 這裡也要改成 target_version
-        obj = minio_client.get_object(MINIO_BUCKET_NAME, target_version.storage_path) # <--- 修正處
-        headers = {
-            "Accept-Ranges": "bytes",
-            "Content-Length": str(file_size),
-            "Content-Disposition": f'inline; filename="{asset.filename}"',
-            "Content-Type": content_type,
-            "Cache-Control": "no-cache" # 順便加上這個保險
-        }
-        return StreamingResponse(obj, headers=headers, media_type=content_type)
-
-    except HTTPException:
-        raise
+    # 分段內容不會再變
+    if REDIRECT_DOWNLOADS:
+        return _redirect_to_object(object_name, media.HLS_MEDIA_TYPES[".ts"])
+    try:
+        obj = minio_client.get_object(MINIO_BUCKET_NAME, object_name)
     except Exception as e:
-        logger.error(f"下載失敗: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"讀取失敗: {e}")
-    
+        logger.error(f"讀取 HLS 分段失敗: {e}")
+        raise HTTPException(status_code=404, detail="檔案不存在")
+    return StreamingResponse(
+        obj,
+        media_type=media.HLS_MEDIA_TYPES[".ts"],
+        headers={"Cache-Control": http_cache.IMMUTABLE_CACHE_CONTROL}
+    )
+
 @app.post("/token", response_model=schemas.Token)
 def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
@@ -680,46 +1291,376 @@ def logout(
     
     return {"message": "已記錄登出事件"}
 
+# [新增] 資產列表分頁 (keyset)：依 asset_id 由新到舊排序，cursor 記錄上一頁最後一筆的 asset_id。
+# 不用 OFFSET：翻到後面的頁數也只掃 limit 筆，翻頁期間有新增 / 刪除也不會重複或漏掉
+ASSET_PAGE_DEFAULT = int(os.getenv("ASSET_PAGE_DEFAULT", "100"))
+ASSET_PAGE_MAX = int(os.getenv("ASSET_PAGE_MAX", "500"))
+# 總數的快取秒數 (總數只是給畫面顯示的參考值，不必每頁都 COUNT)
+asset_count_cache = ttl_cache.TTLCache(ttl_seconds=int(os.getenv("ASSET_COUNT_CACHE_TTL_SECONDS", "60")))
+
+# [修改] 搜尋 (?q=) 依相關度排序時，cursor 另外記錄上一頁最後一筆的 rank
+def _encode_asset_cursor(asset_id: int, rank: Optional[int] = None) -> str:
+    position = {"id": asset_id} if rank is None else {"id": asset_id, "r": rank}
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_asset_cursor(cursor: str, ranked: bool = False) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+        position = {"id": int(position["id"]), "r": int(position["r"]) if ranked else None}
+    except Exception:
+        raise HTTPException(status_code=400, detail="無效的 cursor")
+    return position
+
+def _asset_page_order(hits):
+    """列表的排序鍵：一般依 asset_id 由新到舊；搜尋時先依 rank 再依 asset_id。"""
+    if hits is None:
+        return [models.Asset.asset_id.desc()]
+    return [hits.c.rank.desc(), models.Asset.asset_id.desc()]
+
+def _asset_page_after(hits, position: dict):
+    """排在 cursor 之後的條件 (與 _asset_page_order 對應)。"""
+    if hits is None:
+        return models.Asset.asset_id < position["id"]
+    return or_(
+        hits.c.rank < position["r"],
+        and_(hits.c.rank == position["r"], models.Asset.asset_id < position["id"]),
+    )
+
+def _approximate_asset_total(db: Session, query, cache_key) -> int:
+    total = asset_count_cache.get(cache_key)
+    if total is not None:
+        return total
+    if cache_key[0] is None and not any(cache_key[1:]):
+        # Admin 看整個資料庫且沒有篩選：用 InnoDB 的統計值，不掃表 (會有誤差，僅供顯示)
+        total = db.execute(text(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'asset'"
+        )).scalar()
+    if total is None:
+        total = query.order_by(None).count()
+    total = int(total)
+    asset_count_cache.set(cache_key, total)
+    return total
+
+# [新增] 列表精簡模式 (?view=grid 或 ?fields=)：一條 SQL 只選網格需要的欄位，標籤由 MySQL 聚合成 JSON，
+# 直接組 dict 輸出，不建立 ORM 物件、不走 AssetOut 的巢狀驗證
+GRID_FIELDS = ("asset_id", "filename", "file_type", "thumbnail_url", "tags")
+LEAN_FIELDS = {
+    "asset_id", "filename", "file_type", "latest_version_id", "derivative_status",
+    "filesize", "content_type", "created_at", "tags", "download_url", "thumbnail_url", "hls_url",
+}
+
+def _parse_lean_fields(fields: Optional[str]) -> List[str]:
+    if not fields:
+        return list(GRID_FIELDS)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in LEAN_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"不支援的欄位: {', '.join(unknown)}")
+    # asset_id 一律回傳 (分頁與前端都要用)
+    return ["asset_id"] + [f for f in dict.fromkeys(requested) if f != "asset_id"]
+
+def _lean_asset_rows(db: Session, clauses, hits, position: Optional[dict], limit: int, wanted: set):
+    Asset, Version = models.Asset, models.Version
+    columns = [Asset.asset_id, Asset.filename, Asset.file_type, Asset.latest_version_id, Asset.derivative_status]
+    if hits is not None:
+        columns.append(hits.c.rank.label("search_rank"))
+    with_version = bool(wanted & {"filesize", "content_type", "created_at", "download_url", "thumbnail_url", "hls_url"})
+    if with_version:
+        # 簽章網址需要的版本欄位；這些名稱與 Asset 的欄位不重複，同一列可同時當 asset / version 傳給簽章函式
+        columns += [
+            Version.version_id, Version.storage_path, Version.filesize, Version.sha256, Version.etag,
+            Version.created_at, Version.content_type, Version.has_thumbnail, Version.has_hls,
+        ]
+    if "tags" in wanted:
+        tags_json = (
+            select(func.json_arrayagg(func.json_object(
+                "tag_id", models.Tag.tag_id,
+                "tag_name", models.Tag.tag_name,
+                "is_ai_suggested", models.Tag.is_ai_suggested,
+            )))
+            .select_from(models.AssetTag)
+            .join(models.Tag, models.Tag.tag_id == models.AssetTag.tag_id)
+            .where(models.AssetTag.asset_id == Asset.asset_id)
+            .correlate(Asset)
+            .scalar_subquery()
+        )
+        columns.append(tags_json.label("tags_json"))
+
+    stmt = select(*columns).select_from(Asset)
+    if hits is not None:
+        stmt = stmt.join(hits, hits.c.asset_id == Asset.asset_id)
+    if with_version:
+        stmt = stmt.outerjoin(Version, Version.version_id == Asset.latest_version_id)
+    stmt = stmt.where(*clauses)
+    if position is not None:
+        stmt = stmt.where(_asset_page_after(hits, position))
+    stmt = stmt.order_by(*_asset_page_order(hits)).limit(limit)
+    return db.execute(stmt).all()
+
+def _lean_asset_dict(row, fields: List[str], user: models.User) -> dict:
+    version = row if "version_id" in row._fields and row.version_id is not None else None
+    item = {}
+    for field in fields:
+        if field == "tags":
+            tags = json.loads(row.tags_json) if row.tags_json else []
+            for t in tags:
+                t["is_ai_suggested"] = bool(t["is_ai_suggested"])
+            item["tags"] = tags
+        elif field == "download_url":
+            item[field] = _signed_download_url(row, version, user) or f"{APP_BASE_URL}/assets/{row.asset_id}/download"
+        elif field == "thumbnail_url":
+            item[field] = _signed_thumbnail_url(row, version, user) or f"{APP_BASE_URL}/assets/{row.asset_id}/thumbnail"
+        elif field == "hls_url":
+            item[field] = f"{APP_BASE_URL}/assets/{row.asset_id}/hls/master.m3u8" if version and version.has_hls else None
+        elif field == "created_at":
+            item[field] = version.created_at.isoformat() if version and version.created_at else None
+        elif field in ("filesize", "content_type"):
+            item[field] = getattr(version, field) if version else None
+        else:
+            item[field] = getattr(row, field)
+    return item
+
 # [修改] 搜尋資產 API (對應 FR-3.1)
 # 支援網址參數: ?filename=xxx&file_type=yyy
 # [修改] 搜尋資產 API (支援 檔名、類型、標籤)
+# [修改] 改為分頁回傳：?limit=&cursor=，下一頁的 cursor 放在 X-Next-Cursor 與 Link 標頭；
+# ?include_total=true 時另外回傳 X-Total-Count (概估值)
+# [新增] ?view=grid 只回網格需要的欄位；?fields=a,b,c 自選欄位 (見 LEAN_FIELDS)
+# [新增] ?q= 全文搜尋 檔名 / 標籤 / 分類名稱，依相關度排序 (見 search.py)；?filename= 改走 FULLTEXT 索引
+# [新增] ?tags= 多標籤布林條件 (逗號 AND、| OR、- NOT，例：貓咪,風景|海邊,-室內)，條件一律由 SQL 的 EXISTS 判斷；
+# 記憶體標籤索引 (見 tag_index.py) 只用來估總數、縮小分頁掃描的範圍。Admin 可用 ?owner_id= 只看某位使用者的資產
+
+def _asset_base_clauses(current_user: models.User, filename: Optional[str], file_type: Optional[str],
+                        tag: Optional[str], owner_id: Optional[int]):
+    """列表 / facets 共用的篩選條件；回傳 (條件, 實際的擁有者範圍)。"""
+    clauses = []
+    # 權限過濾：非 Admin 只能看自己的資產
+    if current_user.role_id != 1:
+        owner_id = current_user.user_id
+    if owner_id is not None:
+        clauses.append(models.Asset.uploaded_by_user_id == owner_id)
+    
+    # 搜尋邏輯
+    if filename:
+        # [修改] 不再用 LIKE '%xxx%' (每次都全表掃描)，改用檔名的 FULLTEXT 索引
+        filename_clause = search.filename_clause(filename)
+        if filename_clause is not None:
+            clauses.append(filename_clause)
+    if file_type:
+        clauses.append(models.Asset.file_type == file_type)
+    if tag:
+        # 用 EXISTS 而不是 JOIN：一個資產只會出現一次，LIMIT 才會正確
+        clauses.append(models.Asset.tags.any(models.Tag.tag_name == tag))
+    return clauses, owner_id
+
+def _parse_tag_groups(tags: str):
+    try:
+        return tag_index.parse_expression(tags)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _tag_page_floor(candidates, below: Optional[int], limit: int) -> Optional[int]:
+    """
+    由本行程的標籤索引估出這一頁的 asset_id 下限：索引裡往下數第 limit + 1 個候選。
+    SQL 只掃描 [下限, cursor) 這一段 (條件仍由 EXISTS 判斷)，其他行程新加的標籤落在這段內一樣查得到；
+    若這段實際命中不到 limit + 1 筆 (索引落後)，呼叫端要拿掉下限再查一次。候選不夠一頁時回傳 None。
+    """
+    page_ids = tag_index.ids_desc(candidates, below=below, limit=limit + 1)
+    return page_ids[-1] if len(page_ids) > limit else None
+
 @app.get("/assets/", response_model=List[schemas.AssetOut])
 def read_assets(
+    request: Request,
+    response: Response,
     filename: Optional[str] = None,
     file_type: Optional[str] = None,
     tag: Optional[str] = None,
+    tags: Optional[str] = None,
+    owner_id: Optional[int] = None,
+    q: Optional[str] = None,
+    limit: int = Query(ASSET_PAGE_DEFAULT, ge=1, le=ASSET_PAGE_MAX),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    view: str = Query("full", pattern="^(full|grid)$"),
+    fields: Optional[str] = None,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     
-    query = db.query(models.Asset).options(
-        joinedload(models.Asset.tags),
-        joinedload(models.Asset.metadata_info),
-        joinedload(models.Asset.latest_version),
-        joinedload(models.Asset.uploader)
-    )
-    # 權限過濾：非 Admin 只能看自己的資產
-    if current_user.role_id != 1:
-        query = query.filter(models.Asset.uploaded_by_user_id == current_user.user_id)
-    
-    # 搜尋邏輯 (保持不變)
-    if filename:
-        query = query.filter(models.Asset.filename.like(f"%{filename}%"))
-    if file_type:
-        query = query.filter(models.Asset.file_type == file_type)
-    if tag:
-        query = query.join(models.AssetTag).join(models.Tag).filter(models.Tag.tag_name == tag)
-        
-    assets = query.all()
+    clauses, owner_id = _asset_base_clauses(current_user, filename, file_type, tag, owner_id)
+
+    # [新增] 全文搜尋的命中清單 (asset_id, rank)；沒有有效關鍵字時視同沒帶 q
+    hits = search.hits_subquery(q) if q else None
+
+    position = _decode_asset_cursor(cursor, ranked=hits is not None) if cursor else None
+
+    # [新增] 多標籤條件：一律由 SQL (EXISTS) 判斷，不能只信本行程的索引 (其他 worker 的異動最多晚 TAG_INDEX_REFRESH_SECONDS 才進來)。
+    # 索引只當提示：總數直接用索引的筆數 (X-Total-Count 本來就是概估)，並替分頁掃描加上 asset_id 下限
+    index_total = page_floor = None
+    if tags:
+        groups = _parse_tag_groups(tags)
+        clauses.append(tag_index.sql_clause(groups))
+        if hits is None and not filename and not tag:
+            candidates = asset_tag_index.resolve(groups, file_type=file_type or None, owner_id=owner_id)
+            if candidates is not None:
+                index_total = tag_index.count(candidates)
+                page_floor = _tag_page_floor(candidates, position["id"] if position else None, limit)
+
+    def _page_clauses(use_floor: bool):
+        if use_floor and page_floor is not None:
+            return [*clauses, models.Asset.asset_id >= page_floor]
+        return clauses
+
+    if include_total and index_total is not None:
+        response.headers["X-Total-Count"] = str(index_total)
+    elif include_total:
+        count_query = db.query(models.Asset)
+        if hits is not None:
+            count_query = count_query.join(hits, hits.c.asset_id == models.Asset.asset_id)
+        count_query = count_query.filter(*clauses)
+        total = _approximate_asset_total(db, count_query, (owner_id, filename, file_type, tag, q if hits is not None else None, tags))
+        response.headers["X-Total-Count"] = str(total)
+
+    def _set_next_cursor(last_asset_id: int, rank: Optional[int] = None):
+        next_cursor = _encode_asset_cursor(last_asset_id, rank)
+        response.headers["X-Next-Cursor"] = next_cursor
+        next_url = request.url.include_query_params(cursor=next_cursor).remove_query_params("include_total")
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+
+    # [新增] 精簡模式：直接回傳 JSON，不經過 response_model
+    if view == "grid" or fields:
+        wanted = _parse_lean_fields(fields)
+        rows = _lean_asset_rows(db, _page_clauses(True), hits, position, limit + 1, set(wanted))
+        if page_floor is not None and len(rows) <= limit:
+            # 下限內湊不滿一頁 (索引落後其他行程的異動)：拿掉下限重查
+            rows = _lean_asset_rows(db, clauses, hits, position, limit + 1, set(wanted))
+        if len(rows) > limit:
+            rows = rows[:limit]
+            _set_next_cursor(rows[-1].asset_id, rows[-1].search_rank if hits is not None else None)
+        items = [_lean_asset_dict(row, wanted, current_user) for row in rows]
+        return Response(
+            content=json.dumps(items, ensure_ascii=False, separators=(",", ":")),
+            media_type="application/json",
+            headers=dict(response.headers),
+        )
 
-    # [新增] 幫每個資產加上下載連結
+    def _full_rows(page_clauses):
+        if hits is not None:
+            query = db.query(models.Asset, hits.c.rank).join(hits, hits.c.asset_id == models.Asset.asset_id)
+        else:
+            query = db.query(models.Asset)
+        query = query.filter(*page_clauses)
+        if position is not None:
+            query = query.filter(_asset_page_after(hits, position))
+
+        # 多取一筆判斷是否還有下一頁；標籤 (多對多) 改用 selectinload，避免 JOIN 讓 LIMIT 算到重複列
+        return query.options(
+            selectinload(models.Asset.tags),
+            joinedload(models.Asset.metadata_info),
+            joinedload(models.Asset.latest_version),
+            joinedload(models.Asset.uploader)
+        ).order_by(*_asset_page_order(hits)).limit(limit + 1).all()
+
+    rows = _full_rows(_page_clauses(True))
+    if page_floor is not None and len(rows) <= limit:
+        rows = _full_rows(clauses)
+    if hits is None:
+        rows = [(asset, None) for asset in rows]
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        _set_next_cursor(rows[-1][0].asset_id, rows[-1][1])
+    assets = [asset for asset, _ in rows]
+
+    # [新增] 幫每個資產加上下載連結 (簽章網址，播放 / 顯示時不必再查資料庫)
     # 因為 SQLAlchemy 物件是可變的，我們直接掛一個屬性上去，Pydantic 就會讀到了
     for asset in assets:
-        asset.download_url = f"{APP_BASE_URL}/assets/{asset.asset_id}/download"
-        asset.thumbnail_url = f"{APP_BASE_URL}/assets/{asset.asset_id}/thumbnail"
+        _attach_signed_links(asset, current_user)
         
     return assets
 
+# [新增] 資產瀏覽的 facets：目前篩選條件下各類型 / 標籤 / 分類 / 上傳者的資產數 (篩選參數與 GET /assets/ 相同)
+# 每個 facet 一條 GROUP BY；結果依 (使用者範圍, 篩選條件) 快取，上傳 / 標籤 / 分類異動時清空
+FACET_CACHE_TTL_SECONDS = int(os.getenv("FACET_CACHE_TTL_SECONDS", "60"))
+asset_facets_cache = ttl_cache.TTLCache(ttl_seconds=FACET_CACHE_TTL_SECONDS)
+
+def _facet_counts(db: Session, stmt) -> List[schemas.FacetCount]:
+    return [
+        schemas.FacetCount(value=None if value is None else str(value), label=label, count=n)
+        for value, label, n in db.execute(stmt).all()
+    ]
+
+# 注意：要放在 /assets/{asset_id} 之前，否則 "facets" 會被當成 asset_id
+@app.get("/assets/facets", response_model=schemas.AssetFacetsOut)
+def read_asset_facets(
+    filename: Optional[str] = None,
+    file_type: Optional[str] = None,
+    tag: Optional[str] = None,
+    tags: Optional[str] = None,
+    owner_id: Optional[int] = None,
+    q: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    clauses, owner_id = _asset_base_clauses(current_user, filename, file_type, tag, owner_id)
+    cache_key = (owner_id, filename, file_type, tag, tags, q, limit)
+    cached = asset_facets_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    if tags:
+        groups = _parse_tag_groups(tags)
+        clauses.append(tag_index.sql_clause(groups))
+
+    Asset = models.Asset
+    hits = search.hits_subquery(q) if q else None
+
+    def _matched(*columns):
+        # 符合篩選條件的資產 (直接 GROUP BY 資產欄位，或當成標籤 / 分類的 IN 子查詢)
+        stmt = select(*columns).select_from(Asset)
+        if hits is not None:
+            stmt = stmt.join(hits, hits.c.asset_id == Asset.asset_id)
+        return stmt.where(*clauses)
+
+    # 當 IN 子查詢時不要跟外層的 asset 自動 correlate
+    matched_ids = _matched(Asset.asset_id).correlate(None)
+
+    n = func.count().label("n")
+    total = db.execute(_matched(func.count())).scalar()
+    file_types = _facet_counts(db, (
+        _matched(Asset.file_type, Asset.file_type.label("label"), n)
+        .group_by(Asset.file_type).order_by(n.desc()).limit(limit)
+    ))
+    tag_counts = _facet_counts(db, (
+        select(models.Tag.tag_name, models.Tag.tag_name.label("label"), n)
+        .select_from(models.AssetTag)
+        .join(models.Tag, models.Tag.tag_id == models.AssetTag.tag_id)
+        .where(models.AssetTag.asset_id.in_(matched_ids))
+        .group_by(models.Tag.tag_id, models.Tag.tag_name).order_by(n.desc()).limit(limit)
+    ))
+    categories = _facet_counts(db, (
+        select(models.Category.category_id, models.Category.category_name, n)
+        .select_from(models.AssetCategory)
+        .join(models.Category, models.Category.category_id == models.AssetCategory.category_id)
+        .where(models.AssetCategory.asset_id.in_(matched_ids))
+        .group_by(models.Category.category_id, models.Category.category_name).order_by(n.desc()).limit(limit)
+    ))
+    uploaders = _facet_counts(db, (
+        _matched(models.User.user_id, models.User.user_name, n)
+        .join(models.User, models.User.user_id == Asset.uploaded_by_user_id)
+        .group_by(models.User.user_id, models.User.user_name).order_by(n.desc()).limit(limit)
+    ))
+
+    result = schemas.AssetFacetsOut(
+        total=total, file_types=file_types, tags=tag_counts, categories=categories, uploaders=uploaders
+    )
+    asset_facets_cache.set(cache_key, result)
+    return result
+
 @app.get("/assets/{asset_id}", response_model=schemas.AssetOut)
 def read_asset(
     asset_id: int,
@@ -738,17 +1679,13 @@ def read_asset(
     # 權限：Admin 或 上傳者
     if current_user.role_id != 1 and asset.uploaded_by_user_id != current_user.user_id:
         raise HTTPException(status_code=403, detail="權限不足")
-    asset.download_url = f"{APP_BASE_URL}/assets/{asset.asset_id}/download"
-    asset.thumbnail_url = f"{APP_BASE_URL}/assets/{asset.asset_id}/thumbnail"
+    _attach_signed_links(asset, current_user)
  
     try:
         if asset.latest_version and USE_PRESIGNED:
-            presigned = minio_client.presigned_get_object(
-                MINIO_BUCKET_NAME,
-                asset.latest_version.storage_path,
-                expires=timedelta(hours=1)
+            asset.presigned_url = presigned_urls.get(
+                minio_client, MINIO_BUCKET_NAME, asset.latest_version.storage_path
             )
-            asset.presigned_url = presigned
         else:
             asset.presigned_url = None
     except Exception as e:
@@ -773,29 +1710,31 @@ def delete_asset(
     if asset.uploaded_by_user_id != current_user.user_id and current_user.role_id != 1:
         raise HTTPException(status_code=403, detail="權限不足")
 
-    # 3. 清理 MinIO 實體檔案 (先刪檔案，再動 DB)
-    for v in asset.versions: # 透過 relationship 直接拿版本，不用再 query 一次
-        try:
-            minio_client.remove_object(MINIO_BUCKET_NAME, v.storage_path)
-            thumb_path = f"{os.path.splitext(v.storage_path)[0]}_thumb.jpg"
-            minio_client.remove_object(MINIO_BUCKET_NAME, thumb_path)
-            logger.info(f"🗑️ 已從 MinIO 刪除: {v.storage_path}")
-        except Exception as e:
-            logger.warning(f"⚠️ MinIO 刪除失敗: {e}")
-
     try:
-        # 4. [關鍵步驟] 解開循環依賴鎖
+        # 3. [關鍵步驟] 解開循環依賴鎖
         # 先把指向 Version 的線剪斷，這樣 MySQL 就不會因為 Version 還被引用而阻止刪除
         asset.latest_version_id = None
         db.commit()
         
+        # 4. 計算引用數：去重後同一個 MinIO 物件可能被多個版本共用，只有歸零的才刪實體檔
+        orphan_paths = {v.storage_path for v in asset.versions if _release_stored_object(db, v)}
+
         # 5. 執行刪除
         # 因為 models.py 已經設定了 cascade="all, delete-orphan"
         # SQLAlchemy 會自動幫你先刪除 Metadata, Comments, Versions，最後刪 Asset
         db.delete(asset)
         db.commit()
+
+        # 分享連結的解析快取可能還指向這個資產
+        share_links_cache.clear()
+        asset_tag_index.remove_asset(asset_id)
+        asset_facets_cache.clear()
+
+        # 6. DB 確定刪除後才清理 MinIO 實體檔案
+        for path in orphan_paths:
+            _remove_object_files(path)
         
-        # 6. 寫入日誌
+        # 7. 寫入日誌
         try:
             new_log = models.AuditLog(
                 user_id=current_user.user_id,
@@ -859,27 +1798,35 @@ def admin_delete_user(
         # 1) 抓出該使用者的資產（包含版本）
         assets = db.query(models.Asset).filter(models.Asset.uploaded_by_user_id == user.user_id).options(joinedload(models.Asset.versions)).all()
 
-        # 2) 刪除 MinIO 的物件（每個版本及對應縮圖）
+        # 2) 刪除該使用者的資產並計算引用數
+        # 去重後同一個 MinIO 物件可能被其他使用者的版本共用，只有引用歸零的才刪實體檔
+        asset_ids = [a.asset_id for a in assets]
+        for a in assets:
+            a.latest_version_id = None
+        db.commit()
+        orphan_paths = set()
         for a in assets:
             for v in a.versions or []:
-                try:
-                    minio_client.remove_object(MINIO_BUCKET_NAME, v.storage_path)
-                    logger.info(f"MinIO: 已刪除物件 {v.storage_path}")
-                except Exception as e:
-                    logger.warning(f"MinIO 刪除失敗 ({v.storage_path}): {e}")
-                # 嘗試刪除縮圖
-                try:
-                    thumb = f"{os.path.splitext(v.storage_path)[0]}_thumb.jpg"
-                    minio_client.remove_object(MINIO_BUCKET_NAME, thumb)
-                except Exception:
-                    # 不重要的錯誤，記錄即可
-                    pass
+                if _release_stored_object(db, v):
+                    orphan_paths.add(v.storage_path)
+            db.delete(a)
+        db.commit()
+
+        share_links_cache.clear()
+        for asset_id in asset_ids:
+            asset_tag_index.remove_asset(asset_id)
+        asset_facets_cache.clear()
+
+        # DB 確定刪除後才清理 MinIO 實體檔案（每個物件及對應縮圖）
+        for path in orphan_paths:
+            _remove_object_files(path)
 
         # 3) 刪除使用者相關的 DB 記錄（tokens, reset tokens, audit logs 等）
         try:
             db.query(models.ApiToken).filter(models.ApiToken.user_id == user.user_id).delete(synchronize_session=False)
             db.query(models.PasswordResetToken).filter(models.PasswordResetToken.user_id == user.user_id).delete(synchronize_session=False)
             db.query(models.AuditLog).filter(models.AuditLog.user_id == user.user_id).delete(synchronize_session=False)
+            db.query(models.UploadSession).filter(models.UploadSession.user_id == user.user_id).delete(synchronize_session=False)
             # 如有其他需要清除的表（ShareLink/ShareAsset/ExportJob 等），可一併加入
         except Exception as e:
             logger.warning(f"刪除使用者相關 DB 記錄時發生問題: {e}")
@@ -916,7 +1863,7 @@ def admin_delete_user(
         logger.error(f"Admin delete user failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"刪除失敗: {e}")
 
-# ---------- 更新 create_asset_version：暫存 -> 上傳 MinIO -> 產生縮圖（圖片或影片） ----------
+# ---------- 更新 create_asset_version：去重 -> 串流上傳 MinIO -> 縮圖排入背景佇列（圖片或影片） ----------
 @app.post("/assets/{asset_id}/versions", response_model=schemas.AssetOut)
 def create_asset_version(
     asset_id: int,
@@ -930,169 +1877,659 @@ def create_asset_version(
     if not asset:
         raise HTTPException(status_code=404, detail="找不到該資產")
 
-    # 2. 處理檔案儲存 
-    upload_dir = "temp_uploads"
-    os.makedirs(upload_dir, exist_ok=True)
-    
     # 為了不覆蓋舊檔，我們在檔名加上時間戳記
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
     safe_object_name = f"{timestamp}_v{secrets.token_hex(4)}_{file.filename}"
-    temp_path = os.path.join(upload_dir, safe_object_name)
-    
-    # 1. 儲存到暫存檔
+
+    # 2. 算 SHA-256 後去重；新內容才串流上傳 MinIO
     try:
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        storage_path, file_size, sha256, content_type, is_duplicate, etag = _store_spooled_upload(
+            db, file.file, safe_object_name, file.content_type
+        )
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"寫入暫存檔失敗: {e}")
-    
-    # 取得新檔案大小
-    file_size = os.path.getsize(temp_path)
-    
-    resolution = "Unknown"
-    has_thumbnail = False
-    thumb_object_name = f"{os.path.splitext(safe_object_name)[0]}_thumb.jpg"
-    temp_thumb_path = os.path.join(upload_dir, f"thumb_{secrets.token_hex(4)}.jpg")
-    
-    # 圖片縮圖
-    if file.content_type and file.content_type.startswith("image/"):
-        try:
-            with Image.open(temp_path) as img:
-                resolution = f"{img.size[0]}x{img.size[1]}"
-                img_copy = img.copy()
-                img_copy.thumbnail((300, 300))
-                if img_copy.mode in ("RGBA", "P"):
-                    img_copy = img_copy.convert("RGB")
-                img_copy.save(temp_thumb_path, "JPEG")
-                has_thumbnail = True
-        except Exception as e:
-            logger.info(f"圖片縮圖失敗: {e}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"上傳 MinIO 失敗: {e}")
 
-        # 3. 如果是影片，用 ffmpeg 擷取第一秒做縮圖（需要 ffmpeg 安裝）
-    elif file.content_type and file.content_type.startswith("video/"):
-        try:
-            # 嘗試用 ffmpeg 抽圖
-            cmd = [
-                "ffmpeg", "-y",
-                "-i", temp_path,
-                "-ss", "00:00:01.000",
-                "-vframes", "1",
-                "-vf", "scale=300:-1",
-                temp_thumb_path
-            ]
-            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-            if os.path.exists(temp_thumb_path):
-                has_thumbnail = True
-        except Exception as e:
-            logger.info(f"影片擷取縮圖失敗（請確認 ffmpeg 安裝）: {e}")
+    # 3. 資料庫：建立新版本與更新 metadata，縮圖排入衍生檔佇列
+    try:
+        _add_version_records(
+            db, asset, current_user, storage_path, file_size, content_type,
+            sha256=sha256, is_duplicate=is_duplicate, etag=etag
+        )
+
+        db.commit()
+        share_links_cache.clear()
+        db.refresh(asset)
+        derivative_dispatcher.wake()
+
+        # 補上連結屬性
+        asset.download_url = f"{APP_BASE_URL}/assets/{asset.asset_id}/download"
+        asset.thumbnail_url = f"{APP_BASE_URL}/assets/{asset.asset_id}/thumbnail"
 
-        # 嘗試解析影片解析度（若 ffprobe 可用也可以更準確）
+        # 產生 presigned URL（供前端直接播放/下載）
         try:
-            # 使用 Pillow 讀取截圖得到解析度，若截圖存在
-            if os.path.exists(temp_thumb_path):
-                with Image.open(temp_thumb_path) as timg:
-                    resolution = f"{timg.size[0]}x{timg.size[1]}"
+            asset.presigned_url = presigned_urls.get(minio_client, MINIO_BUCKET_NAME, storage_path)
         except Exception:
-            pass
+            asset.presigned_url = None
+
+        return asset
 
-    # 4. 上傳原始檔到 MinIO
+    except Exception as e:
+        db.rollback()
+        # 回滾時清理剛上傳到 MinIO 的檔案（重複內容是別人的物件，不能刪）
+        if not is_duplicate:
+            _remove_object_files(safe_object_name)
+        raise HTTPException(status_code=500, detail=f"版本更新失敗: {e}")
+  
+# ==========================================
+# [新增] 分段 / 可續傳上傳 (Upload Session，底層為 MinIO multipart upload)
+# 流程：POST /uploads/ 建立 -> PUT 各分段 (可平行) -> GET 查詢已收到的分段 -> POST complete 完成
+# ==========================================
+def _get_upload_session(
+    db: Session, session_id: str, user: models.User, mode: Optional[str] = "multipart"
+) -> models.UploadSession:
+    session = db.query(models.UploadSession).filter(models.UploadSession.session_id == session_id).first()
+    if not session or session.user_id != user.user_id:
+        raise HTTPException(status_code=404, detail="上傳工作階段不存在")
+    if mode and session.mode != mode:
+        raise HTTPException(status_code=409, detail=f"此上傳工作階段為 {session.mode} 模式，不支援這個操作")
+    if session.status != "uploading":
+        raise HTTPException(status_code=409, detail=f"上傳工作階段狀態為 {session.status}，無法再操作")
+    if session.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=410, detail="上傳工作階段已過期")
+    return session
+
+# 合併中 (completing) 超過這個時間沒有結果，視為處理它的請求已中斷，重試的請求可以接手
+UPLOAD_COMPLETE_STALE_AFTER = timedelta(minutes=int(os.getenv("UPLOAD_COMPLETE_STALE_MINUTES", "15")))
+
+def _claim_upload_completion(db: Session, session_id: str, user: models.User, mode: str) -> models.UploadSession:
+    """
+    以 row lock (SELECT ... FOR UPDATE) 把工作階段從 uploading 轉成 completing 並 commit，
+    同一個工作階段同時只會有一個請求在合併 / 寫入資料庫。
+    已完成的工作階段原樣回傳 (status 為 completed)，由呼叫端回傳既有資產，重試 complete 是冪等的。
+    """
     try:
-        minio_client.fput_object(
-            MINIO_BUCKET_NAME,
-            safe_object_name,
-            temp_path,
-            content_type=file.content_type or "application/octet-stream"
+        session = db.query(models.UploadSession).filter(
+            models.UploadSession.session_id == session_id
+        ).with_for_update().first()
+        if not session or session.user_id != user.user_id:
+            raise HTTPException(status_code=404, detail="上傳工作階段不存在")
+        if session.mode != mode:
+            raise HTTPException(status_code=409, detail=f"此上傳工作階段為 {session.mode} 模式，不支援這個操作")
+        if session.status == "completed" and session.asset_id:
+            db.rollback()
+            return session
+        now = datetime.utcnow()
+        if session.status == "completing":
+            if session.completing_at and session.completing_at > now - UPLOAD_COMPLETE_STALE_AFTER:
+                raise HTTPException(status_code=409, detail="上傳工作階段正在合併中，請稍後再試")
+        elif session.status != "uploading":
+            raise HTTPException(status_code=409, detail=f"上傳工作階段狀態為 {session.status}，無法再操作")
+        if session.expires_at < now:
+            raise HTTPException(status_code=410, detail="上傳工作階段已過期")
+    except HTTPException:
+        db.rollback()  # 放掉 row lock
+        raise
+
+    session.status = "completing"
+    session.completing_at = now
+    db.commit()
+    return session
+
+def _release_upload_completion(db: Session, session: models.UploadSession, status: str = "completing"):
+    """
+    合併 / 寫入資料庫失敗：放掉 completing 的佔用，客戶端可以立即重試。
+    status="uploading" 代表還沒合併 (可以繼續補傳分段)；維持 completing 代表物件已合併，重試時直接沿用。
+    """
+    try:
+        db.rollback()
+        if session.status != "completing":
+            return  # 已被標成 aborted 等最終狀態
+        session.status = status
+        session.completing_at = None
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"釋放上傳工作階段失敗 ({session.session_id}): {e}")
+
+def _completed_session_asset(db: Session, session: models.UploadSession) -> models.Asset:
+    asset = db.query(models.Asset).filter(models.Asset.asset_id == session.asset_id).first()
+    if not asset:
+        raise HTTPException(status_code=404, detail="找不到該資產")
+    asset.download_url = f"{APP_BASE_URL}/assets/{asset.asset_id}/download"
+    asset.thumbnail_url = f"{APP_BASE_URL}/assets/{asset.asset_id}/thumbnail"
+    return asset
+
+def _list_uploaded_parts(session: models.UploadSession) -> list:
+    # 直接問 MinIO 目前收到哪些 part (ListParts 一次最多回 1000 筆，需要翻頁)
+    parts = []
+    marker = None
+    while True:
+        result = minio_client._list_parts(
+            MINIO_BUCKET_NAME, session.object_name, session.upload_id,
+            max_parts=1000, part_number_marker=marker
+        )
+        parts.extend(result.parts)
+        if not result.is_truncated:
+            break
+        marker = result.next_part_number_marker
+    return sorted(parts, key=lambda p: p.part_number)
+
+def _upload_session_out(session: models.UploadSession, parts: list) -> dict:
+    return {
+        "session_id": session.session_id,
+        "filename": session.filename,
+        "status": session.status,
+        "total_size": session.total_size,
+        "chunk_size": session.chunk_size,
+        "total_chunks": session.total_chunks,
+        "uploaded_chunks": [p.part_number for p in parts],
+        "expires_at": session.expires_at,
+        "asset_id": session.asset_id,
+    }
+
+@app.post("/uploads/", response_model=schemas.UploadSessionOut)
+def create_upload_session(
+    payload: schemas.UploadSessionCreate,
+    current_user: models.User = Depends(require_permission("asset", "upload")),
+    db: Session = Depends(get_db)
+):
+    if payload.total_size <= 0:
+        raise HTTPException(status_code=400, detail="total_size 必須大於 0")
+
+    chunk_size = payload.chunk_size or uploads.DEFAULT_CHUNK_SIZE
+    if not (uploads.MIN_CHUNK_SIZE <= chunk_size <= uploads.MAX_CHUNK_SIZE):
+        raise HTTPException(
+            status_code=400,
+            detail=f"chunk_size 必須介於 {uploads.MIN_CHUNK_SIZE} 與 {uploads.MAX_CHUNK_SIZE} bytes 之間"
+        )
+    total_chunks = -(-payload.total_size // chunk_size)
+    if total_chunks > uploads.MAX_CHUNKS:
+        raise HTTPException(status_code=400, detail="分段數量超過上限，請加大 chunk_size")
+
+    # 若是上傳新版本，先確認資產存在且有權限
+    if payload.asset_id:
+        asset = db.query(models.Asset).filter(models.Asset.asset_id == payload.asset_id).first()
+        if not asset:
+            raise HTTPException(status_code=404, detail="找不到該資產")
+        if current_user.role_id != 1 and asset.uploaded_by_user_id != current_user.user_id:
+            raise HTTPException(status_code=403, detail="權限不足")
+
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    object_name = f"{timestamp}_{secrets.token_hex(4)}_{payload.filename}"
+    content_type = payload.content_type or "application/octet-stream"
+
+    try:
+        upload_id = minio_client._create_multipart_upload(
+            MINIO_BUCKET_NAME, object_name, {"Content-Type": content_type}
         )
     except Exception as e:
-        # 上傳失敗，清理並回報
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        raise HTTPException(status_code=500, detail=f"上傳 MinIO 失敗: {e}")
+        logger.error(f"建立 MinIO multipart upload 失敗: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="無法建立上傳工作階段")
 
-    # 5. 上傳縮圖（若有）
-    if has_thumbnail and os.path.exists(temp_thumb_path):
-        try:
-            minio_client.fput_object(
-                MINIO_BUCKET_NAME,
-                thumb_object_name,
-                temp_thumb_path,
-                content_type="image/jpeg"
-            )
-        except Exception as e:
-            logger.warning(f"縮圖上傳失敗: {e}")
-            
-    # 6. 資料庫：建立新版本與更新 metadata
+    session = models.UploadSession(
+        session_id=uuid.uuid4().hex,
+        user_id=current_user.user_id,
+        asset_id=payload.asset_id,
+        filename=payload.filename,
+        content_type=payload.content_type,
+        total_size=payload.total_size,
+        chunk_size=chunk_size,
+        total_chunks=total_chunks,
+        object_name=object_name,
+        upload_id=upload_id,
+        status="uploading",
+        expires_at=datetime.utcnow() + timedelta(hours=uploads.SESSION_TTL_HOURS)
+    )
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+    return _upload_session_out(session, [])
+
+@app.get("/uploads/{session_id}", response_model=schemas.UploadSessionOut)
+def read_upload_session(
+    session_id: str,
+    current_user: models.User = Depends(require_permission("asset", "upload")),
+    db: Session = Depends(get_db)
+):
+    session = _get_upload_session(db, session_id, current_user)
     try:
-        current_version_num = asset.latest_version.version_number if asset.latest_version else 0
-        new_version_num = current_version_num + 1
+        parts = _list_uploaded_parts(session)
+    except Exception as e:
+        logger.error(f"查詢 MinIO 分段失敗: {e}")
+        raise HTTPException(status_code=500, detail="無法查詢已上傳的分段")
+    return _upload_session_out(session, parts)
+
+@app.put("/uploads/{session_id}/chunks/{chunk_number}")
+async def upload_session_chunk(
+    session_id: str,
+    chunk_number: int,
+    request: Request,
+    current_user: models.User = Depends(require_permission("asset", "upload")),
+    db: Session = Depends(get_db)
+):
+    """
+    Body 直接放該分段的原始 bytes (application/octet-stream)。
+    同一分段重傳會覆蓋舊的，因此斷線後只要補傳缺少的分段即可。
+    """
+    session = await run_upload_io(_get_upload_session, db, session_id, current_user)
+    if not (1 <= chunk_number <= session.total_chunks):
+        raise HTTPException(status_code=400, detail=f"chunk_number 必須介於 1 與 {session.total_chunks} 之間")
 
-        new_version = models.Version(
-            asset_id=asset.asset_id,
-            version_number=new_version_num,
-            storage_path=safe_object_name  # 存 MinIO Key
+    expected = uploads.expected_chunk_length(
+        session.total_size, session.chunk_size, session.total_chunks, chunk_number
+    )
+    declared = request.headers.get("Content-Length")
+    if declared and declared.isdigit() and int(declared) != expected:
+        raise HTTPException(status_code=400, detail=f"分段 {chunk_number} 大小應為 {expected} bytes")
+
+    # 伺服器一次只持有這一個分段
+    data = await request.body()
+    if len(data) != expected:
+        raise HTTPException(status_code=400, detail=f"分段 {chunk_number} 大小應為 {expected} bytes")
+
+    try:
+        etag = await run_upload_io(
+            minio_client._upload_part,
+            MINIO_BUCKET_NAME, session.object_name, data, None, session.upload_id, chunk_number
         )
-        db.add(new_version)
-        db.flush()
+    except Exception as e:
+        logger.error(f"上傳分段失敗 ({session_id} #{chunk_number}): {e}")
+        raise HTTPException(status_code=500, detail="分段寫入儲存系統失敗，請重試")
 
-        asset.latest_version_id = new_version.version_id
+    return {"chunk_number": chunk_number, "size": len(data), "etag": etag}
 
-        # 更新或建立 metadata_info
-        if asset.metadata_info:
-            asset.metadata_info.filesize = file_size
-            asset.metadata_info.resolution = resolution
-            asset.metadata_info.encoding_format = file.content_type.split("/")[-1] if file.content_type else "bin"
+@app.post("/uploads/{session_id}/complete", response_model=schemas.AssetOut)
+def complete_upload_session(
+    session_id: str,
+    background_tasks: BackgroundTasks,
+    current_user: models.User = Depends(require_permission("asset", "upload")),
+    db: Session = Depends(get_db)
+):
+    session = _claim_upload_completion(db, session_id, current_user, mode="multipart")
+    if session.status == "completed":
+        return _completed_session_asset(db, session)
+
+    # 1. 合併分段 (先前中斷的請求若已合併完成就直接沿用)
+    try:
+        merged_etag = _assemble_upload_session(session)
+    except HTTPException:
+        _release_upload_completion(db, session, "uploading")
+        raise
+
+    # 2. 讀回一次算 SHA-256 (分段是平行上傳的，無法邊收邊算)
+    obj = None
+    try:
+        obj = minio_client.get_object(MINIO_BUCKET_NAME, session.object_name)
+        file_size, sha256, head = uploads.hash_stream(obj)
+    except Exception as e:
+        logger.error(f"讀取合併後的物件失敗: {e}", exc_info=True)
+        _release_upload_completion(db, session)
+        raise HTTPException(status_code=500, detail="讀取合併後的檔案失敗，請重試")
+    finally:
+        if obj is not None:
+            obj.close()
+            obj.release_conn()
+
+    content_type = uploads.resolve_content_type(session.content_type, head)
+
+    # 3. 去重：內容已存在就改引用既有物件 (合併的這份等資料庫寫入成功才刪，失敗時重試還用得到)
+    try:
+        storage_path = _acquire_stored_object(db, sha256)
+        is_duplicate = storage_path is not None
+        if not is_duplicate:
+            storage_path = _register_stored_object(db, sha256, session.object_name, file_size, discard_own=False)
+            is_duplicate = storage_path != session.object_name
+    except Exception as e:
+        logger.error(f"登記上傳物件失敗: {e}", exc_info=True)
+        _release_upload_completion(db, session)
+        raise HTTPException(status_code=500, detail="伺服器錯誤，請重試")
+
+    # 4. 寫入資料庫：新資產或既有資產的新版本
+    asset = _finalize_upload_session(
+        db, session, current_user, storage_path, file_size, content_type,
+        sha256=sha256, is_duplicate=is_duplicate, etag=None if is_duplicate else merged_etag,
+        keep_object=True
+    )
+    if is_duplicate:
+        logger.info(f"♻️ 內容重複，直接引用既有物件: {storage_path} (sha256={sha256})")
+        _remove_object_files(session.object_name)
+
+    if content_type.startswith("image/"):
+        background_tasks.add_task(generate_ai_tags, asset.asset_id, storage_path)
+
+    asset.download_url = f"{APP_BASE_URL}/assets/{asset.asset_id}/download"
+    asset.thumbnail_url = f"{APP_BASE_URL}/assets/{asset.asset_id}/thumbnail"
+    return asset
+
+def _assemble_upload_session(session: models.UploadSession) -> Optional[str]:
+    """在 MinIO 合併分段，回傳合併後物件的 etag；物件已存在 (上一次已合併) 時直接沿用。"""
+    try:
+        stat = minio_client.stat_object(MINIO_BUCKET_NAME, session.object_name)
+        logger.info(f"分段先前已合併，沿用既有物件: {session.object_name}")
+        return _write_etag(stat)
+    except S3Error as e:
+        if e.code not in ("NoSuchKey", "NoSuchObject"):
+            logger.error(f"查詢 MinIO 物件失敗: {e}")
+            raise HTTPException(status_code=500, detail="無法確認上傳結果")
+
+    # 確認所有分段都到齊
+    try:
+        parts = _list_uploaded_parts(session)
+    except Exception as e:
+        logger.error(f"查詢 MinIO 分段失敗: {e}")
+        raise HTTPException(status_code=500, detail="無法查詢已上傳的分段")
+    received = {p.part_number for p in parts}
+    missing = [n for n in range(1, session.total_chunks + 1) if n not in received]
+    if missing:
+        raise HTTPException(status_code=409, detail={"message": "仍有分段未上傳", "missing_chunks": missing[:100]})
+
+    try:
+        merged = minio_client._complete_multipart_upload(MINIO_BUCKET_NAME, session.object_name, session.upload_id, parts)
+    except Exception as e:
+        logger.error(f"合併分段失敗: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="合併分段失敗")
+    return _write_etag(merged)
+
+def _finalize_upload_session(
+    db: Session,
+    session: models.UploadSession,
+    current_user: models.User,
+    storage_path: str,
+    file_size: int,
+    content_type: str,
+    sha256: Optional[str] = None,
+    is_duplicate: bool = False,
+    etag: Optional[str] = None,
+    keep_object: bool = False
+) -> models.Asset:
+    # 上傳完成後共用：建立新資產或新版本、標記工作階段完成並 commit，衍生檔排入佇列
+    # 失敗時放掉 completing 讓客戶端重試；keep_object=True 時保留物件 (分段合併後的物件，重試時直接沿用)
+    created = not session.asset_id
+    try:
+        if session.asset_id:
+            asset = db.query(models.Asset).filter(models.Asset.asset_id == session.asset_id).first()
+            if not asset:
+                raise HTTPException(status_code=404, detail="找不到該資產")
+            _add_version_records(
+                db, asset, current_user, storage_path, file_size, content_type,
+                sha256=sha256, is_duplicate=is_duplicate, etag=etag
+            )
         else:
-            new_meta = models.Metadata(
-                asset_id=asset.asset_id,
-                filesize=file_size,
-                resolution=resolution,
-                encoding_format=file.content_type.split("/")[-1] if file.content_type else "bin"
+            asset = _create_asset_records(
+                db, current_user, session.filename, content_type, storage_path, file_size,
+                sha256=sha256, is_duplicate=is_duplicate, etag=etag
             )
-            db.add(new_meta)
+            session.asset_id = asset.asset_id
+        session.status = "completed"
+        session.completing_at = None
+        db.commit()
+        if created:
+            asset_tag_index.add_asset(asset.asset_id, content_type, current_user.user_id)
+            asset_facets_cache.clear()
+        else:
+            share_links_cache.clear()
+        db.refresh(asset)
+        derivative_dispatcher.wake()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"上傳完成但寫入資料庫失敗: {e}", exc_info=True)
+        if not is_duplicate and not keep_object:
+            _remove_object_files(storage_path)
+        _release_upload_completion(db, session)
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=500, detail=f"伺服器錯誤: {str(e)}")
+    return asset
 
-        # 寫入稽核日誌
-        db.add(models.AuditLog(
-            user_id=current_user.user_id,
-            asset_id=asset.asset_id,
-            action_type=f"UPDATE_VERSION_v{new_version_num}"
-        ))
+@app.delete("/uploads/{session_id}")
+def abort_upload_session(
+    session_id: str,
+    current_user: models.User = Depends(require_permission("asset", "upload")),
+    db: Session = Depends(get_db)
+):
+    session = _get_upload_session(db, session_id, current_user, mode=None)
+    if session.mode == "direct":
+        # 瀏覽器可能已經 PUT 完成，把物件一併刪掉
+        _remove_object_files(session.object_name)
+    else:
+        try:
+            minio_client._abort_multipart_upload(MINIO_BUCKET_NAME, session.object_name, session.upload_id)
+        except Exception as e:
+            logger.warning(f"取消 MinIO multipart upload 失敗: {e}")
+    session.status = "aborted"
+    db.commit()
+    return {"message": "上傳工作階段已取消"}
+
+# [新增] 清理過期的上傳工作階段：沒完成就過期 (使用者放棄、請求中斷) 的 multipart upload 要 abort，
+# MinIO 才會釋放已收到的分段；已合併但沒寫入資料庫的物件、直傳的暫存物件一併刪除
+UPLOAD_CLEANUP_INTERVAL_SECONDS = float(os.getenv("UPLOAD_CLEANUP_INTERVAL_MINUTES", "30")) * 60
+UPLOAD_CLEANUP_BATCH = 200
+_upload_cleanup_stop = threading.Event()
+
+def cleanup_expired_upload_sessions() -> int:
+    """處理一批過期的工作階段並標成 expired，回傳處理筆數 (多個 worker 行程同時跑時以 SKIP LOCKED 錯開)。"""
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        sessions = db.query(models.UploadSession).filter(
+            models.UploadSession.expires_at < now,
+            or_(
+                models.UploadSession.status == "uploading",
+                # 合併中的只收已中斷的，正在進行的請求不要動
+                and_(
+                    models.UploadSession.status == "completing",
+                    or_(
+                        models.UploadSession.completing_at.is_(None),
+                        models.UploadSession.completing_at < now - UPLOAD_COMPLETE_STALE_AFTER
+                    )
+                )
+            )
+        ).order_by(models.UploadSession.expires_at).limit(UPLOAD_CLEANUP_BATCH).with_for_update(skip_locked=True).all()
+
+        for session in sessions:
+            if session.mode == "multipart" and session.upload_id:
+                try:
+                    minio_client._abort_multipart_upload(MINIO_BUCKET_NAME, session.object_name, session.upload_id)
+                except Exception as e:
+                    # 已合併完成 (completing 中斷) 或 MinIO 已自行清掉時會失敗，繼續處理物件本身
+                    logger.info(f"abort multipart upload 失敗 ({session.session_id}): {e}")
+            referenced = db.query(models.StoredObject.sha256).filter(
+                models.StoredObject.storage_path == session.object_name
+            ).first()
+            if not referenced:
+                _remove_object_files(session.object_name)
+            session.status = "expired"
+            session.completing_at = None
+        db.commit()
+        if sessions:
+            logger.info(f"🧹 已清理 {len(sessions)} 個過期的上傳工作階段")
+        return len(sessions)
+    finally:
+        db.close()
+
+def _run_upload_cleanup():
+    while not _upload_cleanup_stop.is_set():
+        try:
+            while cleanup_expired_upload_sessions() >= UPLOAD_CLEANUP_BATCH:
+                pass
+        except Exception as e:
+            logger.warning(f"清理上傳工作階段失敗: {e}")
+        _upload_cleanup_stop.wait(UPLOAD_CLEANUP_INTERVAL_SECONDS)
+
+@app.on_event("startup")
+def start_upload_cleanup():
+    _upload_cleanup_stop.clear()
+    threading.Thread(target=_run_upload_cleanup, name="upload-cleanup", daemon=True).start()
+
+@app.on_event("shutdown")
+def stop_upload_cleanup():
+    _upload_cleanup_stop.set()
+
+# ==========================================
+# [新增] Presigned 直傳 (檔案不經過 API 伺服器)
+# 流程：POST /uploads/direct 取得 presigned PUT URL -> 瀏覽器直接 PUT 到 MinIO
+#       -> POST /uploads/direct/{session_id}/finalize 確認物件並建立資料
+# 注意：直傳的內容不做 SHA-256 去重 (要算雜湊就得把整個檔案再讀回 API，失去直傳的意義)
+# presigned PUT 只能寫到暫存 key (DIRECT_UPLOAD_PREFIX)；finalize 時由伺服器複製到自己選的正式 key 再刪掉暫存，
+# 之後就算 URL 還沒過期、有人再 PUT 一次，也改不到已建立資產的內容
+# ==========================================
+DIRECT_UPLOAD_URL_TTL = timedelta(minutes=int(os.getenv("DIRECT_UPLOAD_URL_TTL_MINUTES", "15")))
+DIRECT_UPLOAD_PREFIX = "incoming/"
+def _promote_direct_upload(staging_key: str, final_key: str):
+    """把直傳的暫存物件複製到正式 key (MinIO 伺服器端複製，不經過 API)，回傳正式物件的 stat。"""
+    # 直傳大小上限 (uploads.MAX_SINGLE_PUT_SIZE) 與單次 CopyObject 相同，一次複製即可
+    minio_client.copy_object(MINIO_BUCKET_NAME, final_key, CopySource(MINIO_BUCKET_NAME, staging_key))
+    return minio_client.stat_object(MINIO_BUCKET_NAME, final_key)
+
+@app.post("/uploads/direct", response_model=schemas.DirectUploadOut)
+def create_direct_upload(
+    payload: schemas.UploadSessionCreate,
+    current_user: models.User = Depends(require_permission("asset", "upload")),
+    db: Session = Depends(get_db)
+):
+    if payload.total_size <= 0:
+        raise HTTPException(status_code=400, detail="total_size 必須大於 0")
+    if payload.total_size > uploads.MAX_SINGLE_PUT_SIZE:
+        # 單次 PUT 超過上限，瀏覽器上傳到最後才會失敗，先擋下來
+        raise HTTPException(
+            status_code=413,
+            detail=f"直傳單檔上限為 {uploads.MAX_SINGLE_PUT_SIZE // 1024 ** 3} GiB，請改用分段上傳 (/uploads/)"
+        )
+
+    # 若是上傳新版本，先確認資產存在且有權限
+    if payload.asset_id:
+        asset = db.query(models.Asset).filter(models.Asset.asset_id == payload.asset_id).first()
+        if not asset:
+            raise HTTPException(status_code=404, detail="找不到該資產")
+        if current_user.role_id != 1 and asset.uploaded_by_user_id != current_user.user_id:
+            raise HTTPException(status_code=403, detail="權限不足")
+
+    # 瀏覽器只拿得到暫存 key 的 PUT 權限，正式 key 到 finalize 才決定
+    session_id = uuid.uuid4().hex
+    object_name = f"{DIRECT_UPLOAD_PREFIX}{session_id}"
+
+    url_expires_at = datetime.utcnow() + DIRECT_UPLOAD_URL_TTL
+    try:
+        upload_url = minio_client.presigned_put_object(
+            MINIO_BUCKET_NAME, object_name, expires=DIRECT_UPLOAD_URL_TTL
+        )
+    except Exception as e:
+        logger.error(f"產生 presigned PUT URL 失敗: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="無法產生上傳網址")
+
+    session = models.UploadSession(
+        session_id=session_id,
+        user_id=current_user.user_id,
+        asset_id=payload.asset_id,
+        filename=payload.filename,
+        content_type=payload.content_type,
+        total_size=payload.total_size,
+        # 直傳沒有分段；chunk_size 是 INT 欄位，放檔案大小的話超過 2 GiB 就寫不進去
+        chunk_size=0,
+        total_chunks=1,
+        object_name=object_name,
+        upload_id=None,
+        mode="direct",
+        status="uploading",
+        # 工作階段比 URL 活得久，URL 到期前剛傳完的檔案仍然可以 finalize
+        expires_at=datetime.utcnow() + timedelta(hours=uploads.SESSION_TTL_HOURS)
+    )
+    db.add(session)
+    db.commit()
 
-        db.commit()
-        db.refresh(asset)
+    headers = {"Content-Type": payload.content_type} if payload.content_type else {}
+    return {
+        "session_id": session.session_id,
+        "filename": session.filename,
+        "upload_url": upload_url,
+        "method": "PUT",
+        "headers": headers,
+        "expires_at": url_expires_at,
+        "asset_id": session.asset_id,
+    }
 
-        # 補上連結屬性
-        asset.download_url = f"{APP_BASE_URL}/assets/{asset.asset_id}/download"
-        asset.thumbnail_url = f"{APP_BASE_URL}/assets/{asset.asset_id}/thumbnail"
+@app.post("/uploads/direct/{session_id}/finalize", response_model=schemas.AssetOut)
+def finalize_direct_upload(
+    session_id: str,
+    background_tasks: BackgroundTasks,
+    current_user: models.User = Depends(require_permission("asset", "upload")),
+    db: Session = Depends(get_db)
+):
+    session = _claim_upload_completion(db, session_id, current_user, mode="direct")
+    if session.status == "completed":
+        return _completed_session_asset(db, session)
 
-        # 產生 presigned URL（供前端直接播放/下載）
-        try:
-            asset.presigned_url = minio_client.presigned_get_object(
-                MINIO_BUCKET_NAME,
-                safe_object_name,
-                expires=timedelta(hours=1)
-            )
-        except Exception:
-            asset.presigned_url = None
+    # 1. 確認暫存物件真的在 MinIO 上
+    try:
+        staged = minio_client.stat_object(MINIO_BUCKET_NAME, session.object_name)
+    except S3Error as e:
+        _release_upload_completion(db, session, "uploading")
+        if e.code in ("NoSuchKey", "NoSuchObject"):
+            raise HTTPException(status_code=409, detail="檔案尚未上傳到儲存系統")
+        logger.error(f"查詢 MinIO 物件失敗: {e}")
+        raise HTTPException(status_code=500, detail="無法確認上傳結果")
+    if staged.size != session.total_size:
+        # 大小不符就不必複製 (也避免超過單次 CopyObject 上限)
+        _remove_object_files(session.object_name)
+        session.status = "aborted"
+        db.commit()
+        raise HTTPException(
+            status_code=400,
+            detail=f"上傳的檔案大小 ({staged.size}) 與宣告的 total_size ({session.total_size}) 不符，請重新上傳"
+        )
 
-        return asset
+    # 2. 複製到伺服器決定的正式 key；之後的檢查 (大小 / 檔頭 / etag) 都看正式物件，暫存 key 再被覆寫也影響不到
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    object_name = f"{timestamp}_{secrets.token_hex(4)}_{session.filename}"
+    try:
+        stat = _promote_direct_upload(session.object_name, object_name)
+    except Exception as e:
+        logger.error(f"複製直傳物件失敗 ({session.object_name} -> {object_name}): {e}", exc_info=True)
+        _release_upload_completion(db, session, "uploading")
+        raise HTTPException(status_code=500, detail="無法確認上傳結果")
+
+    if stat.size != session.total_size:
+        _remove_object_files(object_name)
+        _remove_object_files(session.object_name)
+        session.status = "aborted"
+        db.commit()
+        raise HTTPException(
+            status_code=400,
+            detail=f"上傳的檔案大小 ({stat.size}) 與宣告的 total_size ({session.total_size}) 不符，請重新上傳"
+        )
 
+    # 3. 只讀檔頭判斷內容類型
+    obj = None
+    try:
+        obj = minio_client.get_object(MINIO_BUCKET_NAME, object_name, length=uploads.SNIFF_BYTES)
+        head = obj.read()
     except Exception as e:
-        db.rollback()
-        # 回滾時清理剛上傳到 MinIO 的檔案（盡量）
-        try:
-            minio_client.remove_object(MINIO_BUCKET_NAME, safe_object_name)
-            if has_thumbnail:
-                minio_client.remove_object(MINIO_BUCKET_NAME, thumb_object_name)
-        except:
-            pass
-        raise HTTPException(status_code=500, detail=f"版本更新失敗: {e}")
+        logger.warning(f"讀取檔頭失敗 ({object_name}): {e}")
+        head = b""
     finally:
-        # 清理暫存檔
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        if os.path.exists(temp_thumb_path):
-            os.remove(temp_thumb_path)
-  
+        if obj is not None:
+            obj.close()
+            obj.release_conn()
+    content_type = uploads.resolve_content_type(session.content_type or stat.content_type, head)
+
+    # 4. 建立 Asset / Version / Metadata / AuditLog，衍生檔與 AI 標籤與一般上傳相同
+    asset = _finalize_upload_session(
+        db, session, current_user, object_name, stat.size, content_type, etag=_write_etag(stat)
+    )
+    # 寫入資料庫成功才刪暫存物件 (失敗時可以直接重試 finalize)
+    _remove_object_files(session.object_name)
+
+    if content_type.startswith("image/"):
+        background_tasks.add_task(generate_ai_tags, asset.asset_id, object_name)
+
+    asset.download_url = f"{APP_BASE_URL}/assets/{asset.asset_id}/download"
+    asset.thumbnail_url = f"{APP_BASE_URL}/assets/{asset.asset_id}/thumbnail"
+    return asset
+
 # [新增] API 1: 產生分享連結 (FR-5.2)
 @app.post("/assets/{asset_id}/share", response_model=schemas.ShareLinkOut)
 def create_share_link(
@@ -1148,48 +2585,232 @@ def create_share_link(
         "full_url": f"{APP_BASE_URL}/share/{token}"
     }
 
-@app.get("/share/{token}")
-def access_share_link(token: str, db: Session = Depends(get_db)):
-    # 1. 找連結
-    share_link = db.query(models.ShareLink).filter(models.ShareLink.token == token).first()
-    if not share_link:
-        raise HTTPException(status_code=404, detail="連結無效或不存在")
+# [新增] 分享連結解析結果快取：token -> (到期時間, 權限, 各資產最新版本的串流資訊)
+# 熱門連結在 TTL 內不再查 MySQL；資產刪除時整個清空
+SHARE_MAX_ASSETS = 200
+share_links_cache = ttl_cache.TTLCache(ttl_seconds=int(os.getenv("SHARE_CACHE_TTL_SECONDS", "30")))
 
-    # 2. 檢查過期
-    if share_link.expires_at < datetime.utcnow():
-        raise HTTPException(status_code=410, detail="此連結已過期")
+# [新增] 一個連結分享多個資產
+@app.post("/shares", response_model=schemas.ShareLinkOut)
+def create_multi_share_link(
+    link_data: schemas.MultiShareLinkCreate,
+    current_user: models.User = Depends(require_permission("asset", "view")),
+    db: Session = Depends(get_db)
+):
+    asset_ids = list(dict.fromkeys(link_data.asset_ids))
+    if not asset_ids:
+        raise HTTPException(status_code=400, detail="請至少選擇一個資產")
+    if len(asset_ids) > SHARE_MAX_ASSETS:
+        raise HTTPException(status_code=400, detail=f"一個連結最多分享 {SHARE_MAX_ASSETS} 個資產")
+
+    assets = db.query(models.Asset).filter(models.Asset.asset_id.in_(asset_ids)).all()
+    if len(assets) != len(asset_ids):
+        raise HTTPException(status_code=404, detail="找不到部分資產")
+    # 權限：Admin 或 上傳者
+    if current_user.role_id != 1 and any(a.uploaded_by_user_id != current_user.user_id for a in assets):
+        raise HTTPException(status_code=403, detail="權限不足")
 
-    # 3. 找資產
-    share_asset_record = db.query(models.ShareAsset).filter(models.ShareAsset.link_id == share_link.link_id).first()
-    if not share_asset_record:
-        raise HTTPException(status_code=404, detail="連結未關聯任何資產")
+    token = str(uuid.uuid4())
+    expires_at = datetime.utcnow() + timedelta(minutes=link_data.expires_in_minutes)
+    new_link = models.ShareLink(
+        token=token,
+        created_by_user_id=current_user.user_id,
+        expires_at=expires_at,
+        permission_type=link_data.permission_type
+    )
+    db.add(new_link)
+    db.flush() # 取得 link_id
 
-    asset = share_asset_record.asset
-    if not asset.latest_version:
-        raise HTTPException(status_code=404, detail="檔案遺失")
+    db.add_all([models.ShareAsset(link_id=new_link.link_id, asset_id=asset_id) for asset_id in asset_ids])
+    db.add_all([
+        models.AuditLog(user_id=current_user.user_id, asset_id=asset_id, action_type="SHARE_ASSET")
+        for asset_id in asset_ids
+    ])
+    db.commit()
 
-    # 4. 從 MinIO 取得資產檔案
-    try:
-        file_path = asset.latest_version.storage_path
+    return {
+        "token": token,
+        "expires_at": expires_at,
+        "permission_type": new_link.permission_type,
+        "full_url": f"{APP_BASE_URL}/share/{token}"
+    }
+
+def _resolve_share_link(token: str, db: Session) -> dict:
+    resolved = share_links_cache.get(token)
+    if resolved is not None:
+        return resolved
+
+    # 1. 找連結 (連同關聯資產與最新版本一次載入)
+    share_link = db.query(models.ShareLink).options(
+        selectinload(models.ShareLink.shared_assets)
+        .joinedload(models.ShareAsset.asset)
+        .joinedload(models.Asset.latest_version)
+    ).filter(models.ShareLink.token == token).first()
+    if not share_link:
+        raise HTTPException(status_code=404, detail="連結無效或不存在")
 
-        # 使用 MinIO 獲取文件
-        obj = minio_client.get_object(MINIO_BUCKET_NAME, file_path)
-        content_type = asset.file_type or "application/octet-stream"
+    items = []
+    for record in sorted(share_link.shared_assets, key=lambda r: r.asset_id):
+        asset, version = record.asset, record.asset.latest_version
+        if not version:
+            continue
+        file_size, object_etag, last_modified = version.filesize, version.etag, version.created_at
+        if file_size is None or not (version.sha256 or version.etag):
+            # 尚未回填物件資訊的舊資料才問 MinIO
+            try:
+                stat = minio_client.stat_object(MINIO_BUCKET_NAME, version.storage_path)
+            except Exception as e:
+                logger.warning(f"分享連結物件不存在 ({version.storage_path}): {e}")
+                continue
+            file_size, object_etag, last_modified = stat.size, stat.etag, stat.last_modified
+        items.append({
+            "asset_id": asset.asset_id,
+            "filename": asset.filename,
+            "storage_path": version.storage_path,
+            "file_size": file_size,
+            "etag": version.sha256 or object_etag,
+            "last_modified": last_modified,
+            "content_type": version.content_type or asset.file_type or "application/octet-stream",
+        })
+
+    resolved = {
+        "expires_at": share_link.expires_at,
+        "permission_type": share_link.permission_type,
+        "items": items,
+    }
+    ttl = (share_link.expires_at - datetime.utcnow()).total_seconds() if share_link.expires_at else None
+    if ttl is None or ttl > 0:
+        share_links_cache.set(token, resolved, ttl)
+    return resolved
+
+def _active_share_link(token: str, db: Session) -> dict:
+    resolved = _resolve_share_link(token, db)
+    # 2. 檢查過期 (快取命中時也要檢查)
+    if resolved["expires_at"] and resolved["expires_at"] < datetime.utcnow():
+        raise HTTPException(status_code=410, detail="此連結已過期")
+    if not resolved["items"]:
+        raise HTTPException(status_code=404, detail="連結未關聯任何資產")
+    return resolved
+
+class _ZipChunkBuffer:
+    """給 zipfile 寫入的不可 seek 緩衝：寫進來的 bytes 由產生器取走後送出。"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def _zip_entry_names(items):
+    # ZIP 內檔名重複時加上 (2)、(3) ...
+    seen, names = {}, []
+    for item in items:
+        base, ext = os.path.splitext(item["filename"])
+        count = seen.get(item["filename"], 0) + 1
+        seen[item["filename"]] = count
+        names.append(item["filename"] if count == 1 else f"{base} ({count}){ext}")
+    return names
+
+def _stream_share_zip(items):
+    """邊從 MinIO 讀邊打包成 ZIP 送出 (不落地暫存檔)；媒體檔多半已壓縮，用 STORED 不再壓縮。"""
+    buffer = _ZipChunkBuffer()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for item, name in zip(items, _zip_entry_names(items)):
+            info = zipfile.ZipInfo(name, date_time=(item["last_modified"] or datetime.utcnow()).timetuple()[:6])
+            info.file_size = item["file_size"]  # 事先給大小，超過 4GB 的檔案會自動用 ZIP64
+            obj = minio_client.get_object(MINIO_BUCKET_NAME, item["storage_path"])
+            try:
+                with archive.open(info, mode="w") as entry:
+                    for chunk in obj.stream(1024 * 1024):
+                        entry.write(chunk)
+                        yield buffer.drain()
+            finally:
+                obj.close()
+                obj.release_conn()
+            yield buffer.drain()
+    yield buffer.drain()
+
+@app.get("/share/{token}/info")
+def read_share_link_info(token: str, db: Session = Depends(get_db)):
+    resolved = _active_share_link(token, db)
+    items = resolved["items"]
+    files = [{
+        "asset_id": item["asset_id"],
+        "filename": item["filename"],
+        "filesize": item["file_size"],
+        "file_type": item["content_type"],
+        "download_link": f"{APP_BASE_URL}/share/{token}?asset_id={item['asset_id']}",
+    } for item in items]
+    single = files[0] if len(files) == 1 else None
+    return {
+        "expires_at": resolved["expires_at"],
+        "permission_type": resolved["permission_type"],
+        "filename": single["filename"] if single else f"{len(files)} 個檔案",
+        "filesize": sum(f["filesize"] or 0 for f in files),
+        "file_type": single["file_type"] if single else "application/zip",
+        "download_link": single["download_link"] if single else f"{APP_BASE_URL}/share/{token}",
+        "files": files,
+    }
 
-        # 根據權限類型配置回傳行為
-        disposition = "attachment" if share_link.permission_type == "downloadable" else "inline"
+@app.get("/share/{token}")
+def access_share_link(
+    token: str,
+    request: Request,
+    asset_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    resolved = _active_share_link(token, db)
+    items = resolved["items"]
+    if asset_id is not None:
+        items = [item for item in items if item["asset_id"] == asset_id]
+        if not items:
+            raise HTTPException(status_code=404, detail="連結未關聯此資產")
+
+    # 多個資產：即時打包 ZIP 串流
+    if len(items) > 1:
         return StreamingResponse(
-            obj,
-            media_type=content_type,
+            _stream_share_zip(items),
+            media_type="application/zip",
             headers={
-                "Content-Disposition": f'{disposition}; filename="{asset.filename}"',
+                "Content-Disposition": presign.content_disposition("attachment", f"share_{token[:8]}.zip"),
                 "Cache-Control": "no-cache",
             },
         )
 
-    except Exception as e:
-        logger.error(f"MinIO 讀取失敗: {e}")
-        raise HTTPException(status_code=500, detail="檔案讀取失敗")
+    # 單一資產：與下載 API 相同的 Range / 304 處理 (影片可以拖曳)
+    item = items[0]
+    # 根據權限類型配置回傳行為
+    disposition = "attachment" if resolved["permission_type"] == "downloadable" else "inline"
+
+    # [新增] 轉址模式：檔名 / 內容類型透過 response-content-* 參數交給 MinIO 回應
+    if REDIRECT_DOWNLOADS:
+        return _redirect_to_object(
+            item["storage_path"],
+            item["content_type"],
+            disposition=disposition,
+            filename=item["filename"]
+        )
+
+    return _stream_version_object(
+        request,
+        storage_path=item["storage_path"],
+        file_size=item["file_size"],
+        etag_value=item["etag"],
+        last_modified=item["last_modified"],
+        content_type=item["content_type"],
+        filename=item["filename"],
+        immutable=False,  # 連結指向「最新版」，可能換版本
+        disposition=disposition
+    )
     
 # [新增] 產生 API Token (FR-7.1)
 @app.post("/users/me/api_tokens", response_model=schemas.ApiTokenOut)
@@ -1403,6 +3024,8 @@ def add_tag_to_asset(
         new_asset_tag = models.AssetTag(asset_id=asset_id, tag_id=tag.tag_id)
         db.add(new_asset_tag)
         db.commit()
+        asset_tag_index.add_tags(asset_id, [tag.tag_name])
+        asset_facets_cache.clear()
     
     return tag
 
@@ -1428,41 +3051,363 @@ def read_asset_tags(
 def read_all_tags(db: Session = Depends(get_db)):
     return db.query(models.Tag).all()
 
+# [新增] 縮圖讀取：熱門縮圖放在行程內 LRU (依總大小上限)，缺縮圖時排入衍生檔佇列 (同一物件同時 miss 只排一次)
+thumbnail_bytes = thumbnail_cache.ByteLRUCache(
+    max_bytes=int(os.getenv("THUMBNAIL_CACHE_MB", "64")) * 1024 * 1024
+)
+thumbnail_locks = thumbnail_cache.KeyedLocks()
+thumbnail_failures = thumbnail_cache.RecentFailures(ttl_seconds=300)
+
+def _read_derivative(object_name: str) -> bytes:
+    # 縮圖 / render 等衍生檔 (小物件，內容不會變)：記憶體 LRU -> 本機 SSD 快取 -> MinIO
+    data = thumbnail_bytes.get(object_name)
+    if data is not None:
+        return data
+    cached_file = object_cache.open(object_name) if object_cache else None
+    data = None
+    if cached_file is not None:
+        with cached_file:
+            data = cached_file.read()
+    if data is None:
+        obj = minio_client.get_object(MINIO_BUCKET_NAME, object_name)
+        try:
+            data = obj.read()
+        finally:
+            obj.close()
+            obj.release_conn()
+        if object_cache:
+            object_cache.put_bytes(object_name, data)
+    # 縮圖物件名稱綁定原檔，內容不會變，可以放心快取
+    thumbnail_bytes.put(object_name, data)
+    return data
+
+def _request_thumbnails(db: Session, asset: models.Asset, version: models.Version) -> str:
+    """
+    版本還沒有縮圖 (舊資料、ffmpeg 失敗) 時排一筆衍生檔工作交給 derivative_dispatcher，請求本身不做影像處理。
+    回傳 "ready" (MinIO 上其實已經有了)、"pending" (背景產生中) 或 "none" (這個檔案產生不了縮圖)。
+    """
+    content_type = version.content_type or asset.file_type or ""
+    storage_path = version.storage_path
+    if not derivatives.needs_derivatives(content_type) or storage_path in thumbnail_failures:
+        return "none"
+
+    with thumbnail_locks.hold(storage_path):
+        # 可能已被其他 worker 行程產生好，先確認一次
+        # 看最大的 WebP：只有多規格縮圖的流程會產生它，舊資料只有 _thumb.jpg 的仍需重產
+        try:
+            minio_client.stat_object(MINIO_BUCKET_NAME, media.rendition_key(storage_path, max(media.RENDITION_SIZES), "webp"))
+            derivatives.record_result(db, storage_path, {})
+            db.commit()
+            version.has_thumbnail = True
+            return "ready"
+        except S3Error:
+            pass
+
+        last_job = db.query(models.DerivativeJob.status).filter(
+            models.DerivativeJob.kind == "thumbnail",
+            models.DerivativeJob.storage_path == storage_path
+        ).order_by(models.DerivativeJob.job_id.desc()).first()
+        if last_job and last_job.status in ("pending", "processing"):
+            return "pending"
+        if last_job and last_job.status == "failed":
+            # 背景工作已重試到上限仍失敗，不再重排
+            thumbnail_failures.add(storage_path)
+            return "none"
+
+        db.add(models.DerivativeJob(
+            **derivatives.job_values(asset.asset_id, version.version_id, storage_path, content_type)
+        ))
+        if asset.latest_version_id == version.version_id:
+            asset.derivative_status = "pending"
+        db.commit()
+    derivative_dispatcher.wake()
+    logger.info(f"縮圖不存在，已排入衍生檔佇列: {storage_path}")
+    return "pending"
+
+def _thumbnail_pending_response(asset_id: int) -> JSONResponse:
+    # 衍生檔還在背景產生中：回 202 + pending，前端可稍後重試 (不要拿原檔頂替)
+    return JSONResponse(
+        status_code=202,
+        content={"status": "pending", "asset_id": asset_id},
+        headers={"Retry-After": "2", "Cache-Control": "no-store"}
+    )
+
 # [修正版] API: 取得縮圖 (改為從 MinIO 讀取)
+# 可用 ?size=64|300|1024 與 ?format=webp|jpeg 指定規格；沒指定格式時依 Accept 協商 (支援 WebP 就給 WebP)
+# 帶 version_number 或簽章 (綁定版本) 的網址內容不會再變 -> immutable；最新版用 ETag 驗證
 @app.get("/assets/{asset_id}/thumbnail")
-def get_asset_thumbnail(asset_id: int, db: Session = Depends(get_db)):
-    # 1. 找資產
-    asset = db.query(models.Asset).filter(models.Asset.asset_id == asset_id).first()
-    if not asset or not asset.latest_version:
-         raise HTTPException(status_code=404, detail="檔案不存在")
-    
-    version = asset.latest_version
-    original_object_name = version.storage_path # 這裡是 MinIO 裡的物件名稱
-    
-    # 2. 推算縮圖物件名稱
-    # 邏輯: 原檔名_thumb.jpg
-    thumb_object_name = f"{os.path.splitext(original_object_name)[0]}_thumb.jpg"
-    
-    # 3. 嘗試從 MinIO 讀取
+def get_asset_thumbnail(
+    asset_id: int,
+    request: Request,
+    size: Optional[int] = Query(None, ge=1),
+    fmt: Optional[str] = Query(None, alias="format"),
+    version_number: Optional[int] = None,
+    st: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    # 挑選縮圖規格
     try:
-        # 先試著讀取縮圖
-        try:
-            data = minio_client.get_object(MINIO_BUCKET_NAME, thumb_object_name)
-            return StreamingResponse(data, media_type="image/jpeg")
-        except S3Error:
-            # 如果縮圖不存在 (例如非圖片檔)，改讀原檔
-            data = minio_client.get_object(MINIO_BUCKET_NAME, original_object_name)
-            
-            # 判斷一下 Content-Type，如果是圖片就回傳，不是就回傳預設圖或原檔
-            media_type = asset.file_type or "application/octet-stream"
-            return StreamingResponse(data, media_type=media_type)
-            
+        thumb_size, thumb_format = media.pick_rendition(size, fmt, request.headers.get("accept", ""))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"不支援的縮圖格式，可用: {', '.join(media.RENDITION_FORMATS)}")
+    headers = {} if fmt else {"Vary": "Accept"}
+
+    if st:
+        # [新增] 簽章網址：簽發時已確認縮圖存在，驗章後直接讀 MinIO，不查資料庫
+        claims = security.verify_signed_token(st, "thumbnail")
+        if not claims or claims.get("a") != asset_id:
+            raise HTTPException(status_code=401, detail="縮圖連結無效或已過期")
+        storage_path, version_id, immutable = claims["k"], claims["v"], True
+    else:
+        # 1. 找資產 / 版本
+        asset = db.query(models.Asset).filter(models.Asset.asset_id == asset_id).first()
+        if not asset or not asset.latest_version:
+             raise HTTPException(status_code=404, detail="檔案不存在")
+
+        if version_number:
+            version = db.query(models.Version).filter(
+                models.Version.asset_id == asset_id,
+                models.Version.version_number == version_number
+            ).first()
+            if not version:
+                raise HTTPException(status_code=404, detail=f"找不到版本 v{version_number}")
+        else:
+            version = asset.latest_version
+            if asset.derivative_status in ("pending", "processing"):
+                return _thumbnail_pending_response(asset.asset_id)
+
+        # 2. 缺縮圖就排入衍生檔佇列，這次回 202 (影像處理不在請求中做)
+        if not version.has_thumbnail:
+            state = _request_thumbnails(db, asset, version)
+            if state == "pending":
+                return _thumbnail_pending_response(asset.asset_id)
+            if state != "ready":
+                raise HTTPException(status_code=404, detail="此檔案沒有縮圖")
+        storage_path, version_id, immutable = version.storage_path, version.version_id, bool(version_number)
+
+    thumb_object_name = media.rendition_key(storage_path, thumb_size, thumb_format)
+    media_type = media.MEDIA_TYPES[thumb_format]
+
+    # [新增] 轉址模式：直接轉到 MinIO 上的縮圖
+    if REDIRECT_DOWNLOADS:
+        return _redirect_to_object(thumb_object_name, media_type, headers=headers)
+
+    # 3. 快取驗證：版本 + 規格決定內容，ETag 不必讀物件就能算出
+    etag = http_cache.make_etag(f"{version_id}-{thumb_size}-{thumb_format}")
+    headers.update({
+        "ETag": etag,
+        "Cache-Control": http_cache.IMMUTABLE_CACHE_CONTROL if immutable else http_cache.REVALIDATE_CACHE_CONTROL,
+    })
+    if http_cache.is_not_modified(request.headers, etag, None):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        data = _read_derivative(thumb_object_name)
     except Exception as e:
         logger.error(f"讀取縮圖失敗: {e}")
-        # 如果真的都讀不到，回傳 404 或者一張預設的 "No Image" 圖片
         # 這裡簡單回 404，前端 img onerror 會處理
         raise HTTPException(status_code=404, detail="無法讀取影像")
+    return Response(content=data, media_type=media_type, headers=headers)
     
+# [新增] API: 批次取得縮圖 (資產網格一頁一個請求)
+# 回傳 NDJSON 串流，每行一個資產：{"asset_id", "status", ...}，status 為 ok 時帶 base64 的 data。
+# DB 只查一次；MinIO 讀取平行進行 (經過縮圖 LRU)，先讀到的先送出。
+# status 為 missing (尚無縮圖) 時前端改用單張縮圖網址，由它排入背景產生 (回 202 後稍後重試)。
+THUMBNAIL_BATCH_MAX = 500
+thumbnail_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("THUMBNAIL_BATCH_CONCURRENCY", "16")),
+    thread_name_prefix="thumb-io"
+)
+
+@app.on_event("shutdown")
+def stop_thumbnail_executor():
+    thumbnail_executor.shutdown(wait=False, cancel_futures=True)
+
+def _ndjson_line(item: dict) -> bytes:
+    return (json.dumps(item) + "\n").encode("utf-8")
+
+@app.post("/assets/thumbnails")
+def get_asset_thumbnails_batch(
+    payload: schemas.ThumbnailBatchRequest,
+    request: Request,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    asset_ids = list(dict.fromkeys(payload.asset_ids))  # 去重並保留順序
+    if len(asset_ids) > THUMBNAIL_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"一次最多 {THUMBNAIL_BATCH_MAX} 個資產")
+    try:
+        thumb_size, thumb_format = media.pick_rendition(payload.size, payload.format, request.headers.get("accept", ""))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"不支援的縮圖格式，可用: {', '.join(media.RENDITION_FORMATS)}")
+    media_type = media.MEDIA_TYPES[thumb_format]
+
+    # 1. 一次查出所有資產的最新版本 (非 Admin 只看得到自己的，其餘一律回 not_found)
+    query = db.query(
+        models.Asset.asset_id,
+        models.Asset.derivative_status,
+        models.Version.version_id,
+        models.Version.storage_path,
+        models.Version.has_thumbnail
+    ).join(
+        models.Version, models.Asset.latest_version_id == models.Version.version_id
+    ).filter(models.Asset.asset_id.in_(asset_ids))
+    if current_user.role_id != 1:
+        query = query.filter(models.Asset.uploaded_by_user_id == current_user.user_id)
+    rows = {row.asset_id: row for row in query.all()} if asset_ids else {}
+
+    def generate():
+        futures = {}
+        for asset_id in asset_ids:
+            row = rows.get(asset_id)
+            if row is None:
+                yield _ndjson_line({"asset_id": asset_id, "status": "not_found"})
+            elif row.derivative_status in ("pending", "processing"):
+                yield _ndjson_line({"asset_id": asset_id, "status": "pending"})
+            elif not row.has_thumbnail:
+                yield _ndjson_line({"asset_id": asset_id, "status": "missing"})
+            else:
+                object_name = media.rendition_key(row.storage_path, thumb_size, thumb_format)
+                futures[thumbnail_executor.submit(_read_derivative, object_name)] = row
+
+        # 2. 平行讀取 MinIO，完成一個送一個
+        for future in as_completed(futures):
+            row = futures[future]
+            try:
+                data = future.result()
+            except Exception as e:
+                logger.error(f"批次讀取縮圖失敗 (asset {row.asset_id}): {e}")
+                yield _ndjson_line({"asset_id": row.asset_id, "status": "error"})
+                continue
+            yield _ndjson_line({
+                "asset_id": row.asset_id,
+                "status": "ok",
+                "version_id": row.version_id,
+                "content_type": media_type,
+                "data": base64.b64encode(data).decode("ascii")
+            })
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson", headers={"Cache-Control": "no-store"})
+
+# [新增] API: 依參數產生圖片 (尺寸 / 裁切方式 / 格式 / 品質，參數值限白名單)
+# 結果存回 MinIO (key 由版本原檔 + 參數決定)，之後同樣的請求直接讀快取；
+# 同一個 worker 內同時進來的相同請求只會產生一次
+def _ensure_render(object_name: str, storage_path: str, params, read: bool = True) -> Optional[bytes]:
+    """確保 render 結果存在；read=False (轉址模式) 時只確認存在、不讀內容。"""
+    def cached():
+        try:
+            if read:
+                return _read_derivative(object_name)
+            minio_client.stat_object(MINIO_BUCKET_NAME, object_name)
+            return b""
+        except S3Error as e:
+            if e.code not in ("NoSuchKey", "NoSuchObject"):
+                raise
+            return None
+
+    data = cached()
+    if data is not None:
+        return data
+
+    with thumbnail_locks.hold(object_name):
+        # 等鎖期間可能已被同樣的請求產生好
+        data = cached()
+        if data is not None:
+            return data
+
+        obj = minio_client.get_object(MINIO_BUCKET_NAME, storage_path)
+        try:
+            data = media.render_image(io.BytesIO(obj.read()), *params)
+        finally:
+            obj.close()
+            obj.release_conn()
+        minio_client.put_object(
+            MINIO_BUCKET_NAME, object_name, io.BytesIO(data), len(data),
+            content_type=media.MEDIA_TYPES[params[3]]
+        )
+        thumbnail_bytes.put(object_name, data)
+        return data
+
+@app.get("/assets/{asset_id}/render")
+def render_asset(
+    asset_id: int,
+    request: Request,
+    w: Optional[int] = None,
+    h: Optional[int] = None,
+    fit: Optional[str] = None,
+    fmt: Optional[str] = None,
+    q: Optional[int] = None,
+    version_number: Optional[int] = None,
+    token: Optional[str] = None,
+    api_key: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    try:
+        params = media.normalize_render_params(w, h, fit, fmt, q)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    asset = db.query(models.Asset).filter(models.Asset.asset_id == asset_id).first()
+    if not asset:
+        raise HTTPException(status_code=404, detail="檔案不存在")
+    user = _user_from_query_or_header(request, token, api_key, db)
+    if user.role_id != 1 and asset.uploaded_by_user_id != user.user_id:
+        raise HTTPException(status_code=403, detail="權限不足")
+
+    if version_number:
+        version = db.query(models.Version).filter(
+            models.Version.asset_id == asset_id,
+            models.Version.version_number == version_number
+        ).first()
+    else:
+        version = asset.latest_version
+    if not version:
+        raise HTTPException(status_code=404, detail="此資產沒有任何版本檔案")
+    if not (version.content_type or asset.file_type or "").startswith("image/"):
+        raise HTTPException(status_code=400, detail="僅支援圖片")
+
+    object_name = media.render_key(version.storage_path, *params)
+    media_type = media.MEDIA_TYPES[params[3]]
+    etag = http_cache.make_etag(f"{version.version_id}-{os.path.basename(object_name)}")
+    headers = {
+        "ETag": etag,
+        "Cache-Control": http_cache.IMMUTABLE_CACHE_CONTROL if version_number else http_cache.REVALIDATE_CACHE_CONTROL,
+    }
+    if http_cache.is_not_modified(request.headers, etag, None):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        data = _ensure_render(object_name, version.storage_path, params, read=not REDIRECT_DOWNLOADS)
+    except S3Error as e:
+        logger.error(f"MinIO 讀寫失敗 (asset {asset_id}, {object_name}): {e}")
+        raise HTTPException(status_code=500, detail="Storage error")
+    except Exception as e:
+        logger.error(f"產生圖片失敗 (asset {asset_id}, {object_name}): {e}", exc_info=True)
+        raise HTTPException(status_code=422, detail="無法處理這張圖片")
+
+    if REDIRECT_DOWNLOADS:
+        return _redirect_to_object(object_name, media_type)
+    return Response(content=data, media_type=media_type, headers=headers)
+
+# [新增] API: 讀取快取狀態 (本機 SSD 物件快取 + 記憶體縮圖 LRU；數值為目前這個 worker 行程的)
+@app.get("/admin/cache-metrics")
+def read_cache_metrics(current_user: models.User = Depends(get_current_user)):
+    if current_user.role_id != 1:
+        raise HTTPException(status_code=403, detail="權限不足: 僅限管理員使用")
+    return {
+        "pid": os.getpid(),
+        "object_cache": object_cache.snapshot() if object_cache else None,
+        "thumbnail_memory": thumbnail_bytes.snapshot(),
+        "tag_index": asset_tag_index.snapshot(),
+    }
+
+# [新增] API: 上傳流量控管狀態 (監控用，數值為目前這個 worker 行程的)
+@app.get("/admin/upload-metrics")
+def read_upload_metrics(current_user: models.User = Depends(get_current_user)):
+    if current_user.role_id != 1:
+        raise HTTPException(status_code=403, detail="權限不足: 僅限管理員使用")
+    return {"pid": os.getpid(), **upload_admission.snapshot()}
+
 # [新增] API: 匯出稽核日誌為 CSV (FR-6.2)
 @app.get("/admin/audit-logs/export")
 def export_audit_logs(
@@ -1618,159 +3563,247 @@ def admin_update_user_role(
     db.refresh(user)
     return user
     
-# [修正版] API: 批次上傳 (FR-2.2)
-@app.post("/assets/batch", response_model=List[schemas.AssetOut])
+# ==========================================
+# [修正版] 批次上傳 (FR-2.2)
+# 第 1 階段：每個檔案在執行緒池中各自 算 SHA-256 -> 去重 -> 串流上傳 MinIO，彼此重疊進行
+# 第 2 階段：所有成功的檔案在同一個交易中一次寫入資料庫
+# ==========================================
+BATCH_UPLOAD_CONCURRENCY = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", "4"))
+
+class _BatchContentClaims:
+    """同一批次中相同內容只上傳一次：第一個算出該雜湊的檔案負責上傳，其餘等它的結果。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._claims = {}
+
+    def claim(self, sha256: str):
+        # 回傳 (claim, 是否由自己負責上傳)
+        with self._lock:
+            claim = self._claims.get(sha256)
+            if claim:
+                return claim, False
+            claim = self._claims[sha256] = {"done": threading.Event(), "key": None, "etag": None, "error": None}
+            return claim, True
+
+    @staticmethod
+    def resolve(claim: dict, key: Optional[str] = None, etag: Optional[str] = None, error: Optional[Exception] = None):
+        claim["key"], claim["etag"], claim["error"] = key, etag, error
+        claim["done"].set()
+
+    @staticmethod
+    def wait(claim: dict):
+        # 回傳 (MinIO 物件名稱, etag)
+        claim["done"].wait()
+        if claim["error"]:
+            raise RuntimeError(f"相同內容的檔案上傳失敗: {claim['error']}")
+        return claim["key"], claim["etag"]
+
+def _stage_batch_file(file: UploadFile, claims: _BatchContentClaims) -> dict:
+    """第 1 階段 (在執行緒池中執行，不碰請求的 DB session)。回傳寫入資料庫需要的資訊。"""
+    fp = file.file
+    fp.seek(0)
+    file_size, sha256, head = uploads.hash_stream(fp)
+    if file_size == 0:
+        raise ValueError("上傳的檔案是空的 (0 bytes)")
+    content_type = uploads.resolve_content_type(file.content_type, head)
+
+    claim, is_owner = claims.claim(sha256)
+    if is_owner:
+        try:
+            key = etag = None
+            check_db = SessionLocal()
+            try:
+                exists = check_db.query(models.StoredObject.sha256).filter(
+                    models.StoredObject.sha256 == sha256
+                ).first() is not None
+            finally:
+                check_db.close()
+            if not exists:
+                # 加上亂數避免同批次同名檔案 (同一秒內) 互相覆蓋
+                key = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}_{file.filename}"
+                fp.seek(0)
+                result = minio_client.put_object(
+                    MINIO_BUCKET_NAME,
+                    key,
+                    fp,
+                    length=file_size,
+                    part_size=uploads.MINIO_PART_SIZE,
+                    content_type=content_type
+                )
+                etag = _write_etag(result)
+            _BatchContentClaims.resolve(claim, key=key, etag=etag)
+        except Exception as e:
+            _BatchContentClaims.resolve(claim, error=e)
+            raise
+        uploaded_key = key
+    else:
+        uploaded_key, etag = _BatchContentClaims.wait(claim)
+
+    return {
+        "filename": file.filename,
+        "content_type": content_type,
+        "size": file_size,
+        "sha256": sha256,
+        "uploaded_key": uploaded_key,  # 這批次新寫入 MinIO 的物件；None 代表內容原本就存在
+        "etag": etag,
+        "storage_path": None,
+    }
+
+def _persist_batch_uploads(db: Session, user: models.User, items: List[dict]) -> List[models.Asset]:
+    """第 2 階段：把已存進 MinIO 的檔案寫入資料庫 (只 flush，由呼叫端 commit 後再更新標籤索引)。"""
+    # 1. 引用計數：內容已登記就 +1，否則登記這批次新上傳的物件
+    new_paths = set()
+    for item in items:
+        path = _acquire_stored_object(db, item["sha256"])
+        if path is None:
+            if not item["uploaded_key"]:
+                raise RuntimeError("引用的既有內容已被刪除，請重新上傳")
+            path = _register_stored_object(db, item["sha256"], item["uploaded_key"], item["size"])
+            if path == item["uploaded_key"]:
+                new_paths.add(path)
+        item["storage_path"] = path
+
+    # 2. Asset / Version 需要取回主鍵，一次 flush
+    assets = [
+        models.Asset(filename=item["filename"], file_type=item["content_type"], uploaded_by_user_id=user.user_id)
+        for item in items
+    ]
+    db.add_all(assets)
+    db.flush()
+    versions = []
+    for asset, item in zip(assets, items):
+        path = item["storage_path"]
+        if path in new_paths:
+            stats = {"etag": item["etag"], "has_thumbnail": False}
+        else:
+            stats = _known_object_stats(db, path)
+        versions.append(models.Version(
+            asset_id=asset.asset_id,
+            version_number=1,
+            storage_path=path,
+            sha256=item["sha256"],
+            filesize=item["size"],
+            content_type=item["content_type"],
+            **stats
+        ))
+    db.add_all(versions)
+    db.flush()
+
+    # 3. 其餘資料表不需要主鍵，整批 executemany
+    metadata_rows, log_rows, job_rows = [], [], []
+    for asset, version, item in zip(assets, versions, items):
+        asset.latest_version_id = version.version_id
+        content_type, path = item["content_type"], item["storage_path"]
+        is_new = path in new_paths
+
+        if not derivatives.needs_derivatives(content_type):
+            asset.derivative_status = None
+        elif is_new:
+            # 同批次重複的內容只排一筆工作，完成時會更新所有指向該物件的資產
+            if not any(row["storage_path"] == path for row in job_rows):
+                job_rows.append(derivatives.job_values(asset.asset_id, version.version_id, path, content_type))
+                if derivatives.needs_hls(content_type):
+                    job_rows.append(derivatives.job_values(asset.asset_id, version.version_id, path, content_type, kind="hls"))
+            asset.derivative_status = "pending"
+        else:
+            asset.derivative_status = derivatives.status_for_existing_object(db, path)
+
+        metadata_rows.append(dict(
+            asset_id=asset.asset_id,
+            filesize=item["size"],
+            encoding_format=content_type.split("/")[-1] if content_type else "bin",
+            **_known_metadata(db, None if is_new else item["sha256"])
+        ))
+        log_rows.append(dict(user_id=user.user_id, asset_id=asset.asset_id, action_type="BATCH_UPLOAD"))
+
+    db.execute(insert(models.Metadata), metadata_rows)
+    db.execute(insert(models.AuditLog), log_rows)
+    if job_rows:
+        db.execute(insert(models.DerivativeJob), job_rows)
+    db.flush()
+    return assets
+
+@app.post("/assets/batch", response_model=List[schemas.BatchUploadResult])
 def create_batch_assets(
     background_tasks: BackgroundTasks, # 加入這個以便處理 AI 分析
     files: List[UploadFile] = File(...), 
     current_user: models.User = Depends(require_permission("asset", "upload")),
     db: Session = Depends(get_db)
 ):
-    success_assets = []
-    
-    # 1. 準備暫存資料夾
-    upload_dir = "temp_uploads"
-    if not os.path.exists(upload_dir):
-        os.makedirs(upload_dir)
+    """
+    回傳與上傳順序相同的逐檔結果：成功附上資產，失敗附上原因 (單一檔案失敗不影響其他檔案)。
+    平行度由環境變數 BATCH_UPLOAD_CONCURRENCY 控制。
+    """
+    results = [{"filename": f.filename, "success": False, "asset": None, "error": None} for f in files]
+    staged = {}  # index -> item
+
+    # 1. 平行：雜湊 / 去重 / 上傳 MinIO
+    claims = _BatchContentClaims()
+    workers = max(1, min(BATCH_UPLOAD_CONCURRENCY, len(files)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-upload") as pool:
+        futures = {pool.submit(_stage_batch_file, f, claims): i for i, f in enumerate(files)}
+        for future, i in futures.items():
+            try:
+                staged[i] = future.result()
+            except Exception as e:
+                logger.error(f"File {files[i].filename} failed: {e}", exc_info=True)
+                results[i]["error"] = str(e)
 
-    for file in files:
-        # 每個檔案都獨立處理，避免一個失敗全部失敗
-        temp_file_path = ""
-        thumb_location = ""
+    # 2. 寫入資料庫：先整批一個交易；整批失敗時退回逐檔交易，把錯誤限縮在出問題的檔案
+    persisted = {}  # index -> asset_id
+    if staged:
+        indexes = sorted(staged)
         try:
-            # 2. 產生檔名與路徑
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            safe_filename = f"{timestamp}_{secrets.token_hex(4)}_{file.filename}" 
-            temp_file_path = f"{upload_dir}/{safe_filename}"
-            
-            # MinIO 物件名稱
-            object_name = f"{timestamp}_{file.filename}"
-            thumb_location = f"{os.path.splitext(temp_file_path)[0]}_thumb.jpg"
-            thumb_object_name = f"{os.path.splitext(object_name)[0]}_thumb.jpg"
-            
-            has_thumbnail = False
-            resolution = "Unknown"
-
-            # 3. 寫入暫存檔
-            with open(temp_file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            file_size = os.path.getsize(temp_file_path)
-
-            # 4. 處理縮圖 (支援圖片與影片)
-            if file.content_type and file.content_type.startswith("image/"):
-                try:
-                    with Image.open(temp_file_path) as img:
-                        resolution = f"{img.size[0]}x{img.size[1]}"
-                        img_copy = img.copy()
-                        img_copy.thumbnail((300, 300))
-                        if img_copy.mode in ("RGBA", "P"):
-                            img_copy = img_copy.convert("RGB")
-                        img_copy.save(thumb_location, "JPEG")
-                        has_thumbnail = True
-                except Exception as e:
-                    logger.info(f"⚠️ 圖片縮圖失敗: {e}")
-
-            elif file.content_type and file.content_type.startswith("video/"):
-                # 影片截圖 (需安裝 ffmpeg)
-                try:
-                    subprocess.call([
-                        'ffmpeg', '-y', 
-                        '-i', temp_file_path, 
-                        '-ss', '00:00:01.000', 
-                        '-vframes', '1',
-                        '-vf', 'scale=300:-1', 
-                        thumb_location
-                    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                    if os.path.exists(thumb_location):
-                        has_thumbnail = True
-                except Exception as e:
-                    logger.info(f"⚠️ 影片截圖失敗: {e}")
-
-            # 5. 上傳到 MinIO
-            # A. 上傳縮圖
-            if has_thumbnail:
+            assets = _persist_batch_uploads(db, current_user, [staged[i] for i in indexes])
+            db.commit()
+            persisted = {i: a.asset_id for i, a in zip(indexes, assets)}
+            for i in indexes:
+                asset_tag_index.add_asset(persisted[i], staged[i]["content_type"], current_user.user_id)
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"批次寫入失敗，改為逐檔寫入: {e}")
+            for i in indexes:
                 try:
-                    minio_client.fput_object(
-                        MINIO_BUCKET_NAME,
-                        thumb_object_name,
-                        thumb_location,
-                        content_type="image/jpeg"
-                    )
+                    asset = _persist_batch_uploads(db, current_user, [staged[i]])[0]
+                    db.commit()
+                    persisted[i] = asset.asset_id
+                    asset_tag_index.add_asset(asset.asset_id, staged[i]["content_type"], current_user.user_id)
                 except Exception as e:
-                    logger.error(f"縮圖上傳 MinIO 失敗: {e}")
-
-            # B. 上傳原檔
-            minio_client.fput_object(
-                MINIO_BUCKET_NAME,
-                object_name,
-                temp_file_path,
-                content_type=file.content_type
-            )
+                    db.rollback()
+                    logger.error(f"File {files[i].filename} failed: {e}", exc_info=True)
+                    results[i]["error"] = str(e)
+        if persisted:
+            asset_facets_cache.clear()
+        derivative_dispatcher.wake()
+
+    # 3. 這批次上傳了、最後卻沒有任何資產引用的物件 (寫 DB 失敗或撞到同時上傳的相同內容) 要清掉
+    referenced = {staged[i]["storage_path"] for i in persisted}
+    for key in {item["uploaded_key"] for item in staged.values() if item["uploaded_key"]} - referenced:
+        _remove_object_files(key)
+
+    # 4. 一次撈回成功的資產組成回應
+    if persisted:
+        loaded = db.query(models.Asset).options(
+            joinedload(models.Asset.metadata_info),
+            joinedload(models.Asset.uploader),
+            joinedload(models.Asset.latest_version),
+            selectinload(models.Asset.versions),
+            selectinload(models.Asset.tags),
+        ).filter(models.Asset.asset_id.in_(persisted.values())).all()
+        by_id = {a.asset_id: a for a in loaded}
+        for i, asset_id in persisted.items():
+            asset = by_id[asset_id]
+            asset.download_url = f"{APP_BASE_URL}/assets/{asset_id}/download"
+            asset.thumbnail_url = f"{APP_BASE_URL}/assets/{asset_id}/thumbnail"
+            results[i]["asset"] = asset
+            results[i]["success"] = True
 
-            # 6. 寫入資料庫
-            new_asset = models.Asset(
-                filename=file.filename,
-                file_type=file.content_type,
-                uploaded_by_user_id=current_user.user_id,
-                latest_version_id=None
-            )
-            db.add(new_asset)
-            db.flush()
-
-            new_version = models.Version(
-                asset_id=new_asset.asset_id,
-                version_number=1,
-                storage_path=object_name 
-            )
-            db.add(new_version)
-            db.flush()
-
-            new_metadata = models.Metadata(
-                asset_id=new_asset.asset_id,
-                filesize=file_size,
-                resolution=resolution,
-                encoding_format=file.content_type.split("/")[-1] if file.content_type else "bin"
-            )
-            db.add(new_metadata)
-
-            new_asset.latest_version_id = new_version.version_id
-            
-            # 7. 寫入日誌
-            new_log = models.AuditLog(
-                user_id=current_user.user_id,
-                asset_id=new_asset.asset_id,
-                action_type="BATCH_UPLOAD"
-            )
-            db.add(new_log)
-            
-            db.commit()
-            db.refresh(new_asset)
-            
             # 觸發 AI 分析 (如果是圖片)
-            if new_asset.file_type and new_asset.file_type.startswith("image/"):
-                background_tasks.add_task(generate_ai_tags, new_asset.asset_id, object_name)
-            
-            # 8. 補上連結屬性 (使用正確的 APP_BASE_URL)
-            new_asset.download_url = f"{APP_BASE_URL}/assets/{new_asset.asset_id}/download"
-            new_asset.thumbnail_url = f"{APP_BASE_URL}/assets/{new_asset.asset_id}/thumbnail"
-            
-            success_assets.append(new_asset)
+            if asset.file_type and asset.file_type.startswith("image/"):
+                background_tasks.add_task(generate_ai_tags, asset_id, staged[i]["storage_path"])
 
-        except Exception as e:
-            # 批次上傳中，如果單一檔案失敗，我們先印出錯誤，讓其他檔案繼續傳
-            logger.error(f"File {file.filename} failed: {e}", exc_info=True)
-            db.rollback()
-            continue
-        
-        finally:
-            # 9. 清理暫存檔
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-            if has_thumbnail and os.path.exists(thumb_location):
-                os.remove(thumb_location)
-                
-    return success_assets
+    return results
 
 # [新增] API: 建立新分類 (FR-3.2)
 @app.post("/categories/", response_model=schemas.CategoryOut)
@@ -1831,6 +3864,7 @@ def add_asset_to_category(
         link = models.AssetCategory(asset_id=asset_id, category_id=category_id)
         db.add(link)
         db.commit()
+        asset_facets_cache.clear()
     
     return category
 
@@ -1958,7 +3992,7 @@ def process_image_asset(
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
     new_filename = f"{timestamp}_{request.operation}_{asset.filename}"
     # MinIO 的物件名稱 (不是本機路徑)
-    new_object_name = f"{timestamp}_{request.operation}_{asset.filename}"
+    new_object_name = f"{timestamp}_{secrets.token_hex(4)}_{request.operation}_{asset.filename}"
     
     # 本機暫存的處理後檔案
     temp_processed_path = f"{upload_dir}/{new_filename}"
@@ -1986,27 +4020,13 @@ def process_image_asset(
             new_filesize = os.path.getsize(temp_processed_path)
 
         # 5. [關鍵修正] 上傳處理後的檔案到 MinIO
-        minio_client.fput_object(
+        put_result = minio_client.fput_object(
             MINIO_BUCKET_NAME,
             new_object_name,
             temp_processed_path,
             content_type="image/jpeg"
         )
         
-        # 也要順便做縮圖 (為了列表顯示)
-        thumb_object_name = f"{os.path.splitext(new_object_name)[0]}_thumb.jpg"
-        with Image.open(temp_processed_path) as img:
-            img.thumbnail((300, 300))
-            thumb_io = io.BytesIO()
-            img.save(thumb_io, "JPEG")
-            thumb_io.seek(0)
-            minio_client.put_object(
-                MINIO_BUCKET_NAME,
-                thumb_object_name,
-                thumb_io,
-                thumb_io.getbuffer().nbytes,
-                content_type="image/jpeg"
-            )
 
     except Exception as e:
         logger.error(f"影像處理失敗: {e}", exc_info=True)
@@ -2026,12 +4046,17 @@ def process_image_asset(
         new_version = models.Version(
             asset_id=asset.asset_id,
             version_number=new_version_num,
-            storage_path=new_object_name # 存 MinIO 的 Key
+            storage_path=new_object_name, # 存 MinIO 的 Key
+            filesize=new_filesize,
+            etag=_write_etag(put_result),
+            content_type="image/jpeg"
         )
         db.add(new_version)
         db.flush()
 
         asset.latest_version_id = new_version.version_id
+        # 各規格縮圖 (為了列表顯示) 交給衍生檔 worker 產生
+        derivatives.enqueue(db, asset, new_version, "image/jpeg")
         
         if asset.metadata_info:
              asset.metadata_info.filesize = new_filesize
@@ -2046,6 +4071,7 @@ def process_image_asset(
 
         db.commit()
         db.refresh(asset)
+        derivative_dispatcher.wake()
         
         # 補上動態連結
         asset.download_url = f"{APP_BASE_URL}/assets/{asset.asset_id}/download"
@@ -2135,6 +4161,9 @@ def update_asset(
 
         db.commit()
         db.refresh(asset)
+        if 'tags' in updated_fields:
+            asset_tag_index.replace_tags(asset.asset_id, updated_fields['tags'])
+        asset_facets_cache.clear()
 
         # 回傳簡短結果給前端
         return {
@@ -0,0 +1,297 @@
+# media.py
+# 縮圖 / 影片截圖工具 (直接讀檔案物件，不另外寫暫存檔)
+import io
+import json
+import os
+import subprocess
+from typing import Dict, Optional, Tuple, Union
+
+from PIL import Image, ImageOps
+
+# 縮圖規格：最長邊 (px) × 格式，一次解碼全部產生
+RENDITION_SIZES = (64, 300, 1024)
+RENDITION_FORMATS = ("webp", "jpeg")
+DEFAULT_RENDITION_SIZE = 300
+MEDIA_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+_EXTENSIONS = {"webp": "webp", "jpeg": "jpg", "png": "png"}
+_PIL_FORMATS = {"webp": "WEBP", "jpeg": "JPEG", "png": "PNG"}
+
+# 影片截圖只餵給 ffmpeg 檔案開頭這麼多 bytes，避免為了一張截圖把整支影片再讀一次
+VIDEO_SAMPLE_BYTES = 32 * 1024 * 1024
+
+# /render 可用的參數值 (白名單，避免任意組合把 MinIO 上的衍生檔快取撐爆)
+RENDER_SIZES = (100, 200, 400, 800, 1200, 1600, 2400)
+RENDER_FITS = ("contain", "cover")    # contain: 等比縮到框內；cover: 等比縮放後置中裁切成剛好 w×h
+RENDER_FORMATS = ("webp", "jpeg", "png")
+RENDER_QUALITIES = (50, 65, 80, 90)
+DEFAULT_RENDER_QUALITY = 80
+
+# HLS 多位元率：(短邊 px, 視訊位元率 kbps)，只取不超過原片的檔位，最多 HLS_MAX_RENDITIONS 檔
+HLS_LADDER = ((1080, 5000), (720, 2800), (480, 1400), (360, 800))
+HLS_MAX_RENDITIONS = 3
+HLS_SEGMENT_SECONDS = 6
+HLS_MEDIA_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".ts": "video/mp2t"}
+
+
+def rendition_key(storage_path: str, size: int, fmt: str) -> str:
+    """縮圖在 MinIO 的物件名稱。300px JPEG 沿用舊的 `_thumb.jpg`，舊資料不必重產。"""
+    base = os.path.splitext(storage_path)[0]
+    if size == DEFAULT_RENDITION_SIZE and fmt == "jpeg":
+        return f"{base}_thumb.jpg"
+    return f"{base}_thumb_{size}.{_EXTENSIONS[fmt]}"
+
+
+def rendition_keys(storage_path: str):
+    return [rendition_key(storage_path, size, fmt) for size in RENDITION_SIZES for fmt in RENDITION_FORMATS]
+
+
+def render_prefix(storage_path: str) -> str:
+    return f"{os.path.splitext(storage_path)[0]}_render"
+
+
+def render_key(storage_path: str, width: Optional[int], height: Optional[int], fit: str, fmt: str, quality: int) -> str:
+    """/render 結果在 MinIO 的物件名稱：由原檔 (版本) 與參數決定，同樣的請求永遠對到同一個物件。"""
+    return f"{render_prefix(storage_path)}/{width or 0}x{height or 0}_{fit}_q{quality}.{_EXTENSIONS[fmt]}"
+
+
+def normalize_render_params(width: Optional[int], height: Optional[int], fit: Optional[str],
+                            fmt: Optional[str], quality: Optional[int]) -> Tuple[Optional[int], Optional[int], str, str, int]:
+    """檢查 /render 參數是否在白名單內並補上預設值，不合法時丟 ValueError (訊息可直接回給客戶端)。"""
+    if width is None and height is None:
+        raise ValueError("w 與 h 至少要指定一個")
+    for name, value in (("w", width), ("h", height)):
+        if value is not None and value not in RENDER_SIZES:
+            raise ValueError(f"{name} 只能是 {', '.join(map(str, RENDER_SIZES))}")
+    fit = (fit or "contain").lower()
+    if fit not in RENDER_FITS:
+        raise ValueError(f"fit 只能是 {', '.join(RENDER_FITS)}")
+    if fit == "cover" and (width is None or height is None):
+        raise ValueError("fit=cover 需要同時指定 w 與 h")
+    fmt = (fmt or "webp").lower()
+    fmt = "jpeg" if fmt == "jpg" else fmt
+    if fmt not in RENDER_FORMATS:
+        raise ValueError(f"fmt 只能是 {', '.join(RENDER_FORMATS)}")
+    quality = DEFAULT_RENDER_QUALITY if quality is None else quality
+    if quality not in RENDER_QUALITIES:
+        raise ValueError(f"q 只能是 {', '.join(map(str, RENDER_QUALITIES))}")
+    return width, height, fit, fmt, quality
+
+
+def render_image(fp, width: Optional[int], height: Optional[int], fit: str, fmt: str, quality: int) -> bytes:
+    """依參數產生一張圖 (不放大原圖)；依 EXIF 轉正方向。"""
+    with Image.open(fp) as img:
+        box = (width or img.size[0], height or img.size[1])
+        # 用長邊 draft：EXIF 旋轉後寬高會對調
+        img.draft("RGB", (max(box), max(box)))
+        frame = ImageOps.exif_transpose(img)
+        if fit == "cover":
+            # 裁成 w×h 的比例；原圖不夠大時不放大，改裁出同比例中最大的一塊
+            ratio = min(1.0, frame.size[0] / box[0], frame.size[1] / box[1])
+            frame = ImageOps.fit(frame, (max(1, round(box[0] * ratio)), max(1, round(box[1] * ratio))))
+        else:
+            frame.thumbnail(box)
+        # JPEG 不支援透明；PNG / WebP 保留
+        if fmt == "jpeg" and frame.mode not in ("RGB", "L"):
+            frame = frame.convert("RGB")
+        elif frame.mode not in ("RGB", "RGBA", "L", "LA"):
+            frame = frame.convert("RGBA" if "transparency" in frame.info else "RGB")
+        buf = io.BytesIO()
+        if fmt == "png":
+            frame.save(buf, "PNG", optimize=True)
+        else:
+            frame.save(buf, _PIL_FORMATS[fmt], quality=quality)
+        return buf.getvalue()
+
+
+def hls_prefix(storage_path: str) -> str:
+    """HLS 檔案在 MinIO 的目錄：{prefix}/master.m3u8、{prefix}/v0/index.m3u8、{prefix}/v0/seg_00000.ts ..."""
+    return f"{os.path.splitext(storage_path)[0]}_hls"
+
+
+def pick_rendition(size: Optional[int], fmt: Optional[str], accept: str = "") -> Tuple[int, str]:
+    """
+    依請求挑選縮圖規格：尺寸取「不小於要求」的最小一檔 (超過最大檔就給最大檔)；
+    格式有指定就照指定，否則看 Accept 是否支援 WebP。格式不認得時丟 ValueError。
+    """
+    if size is None:
+        chosen_size = DEFAULT_RENDITION_SIZE
+    else:
+        chosen_size = next((s for s in RENDITION_SIZES if s >= size), RENDITION_SIZES[-1])
+
+    if fmt:
+        fmt = fmt.lower()
+        fmt = "jpeg" if fmt == "jpg" else fmt
+        if fmt not in RENDITION_FORMATS:
+            raise ValueError(fmt)
+        return chosen_size, fmt
+    return chosen_size, "webp" if "image/webp" in (accept or "") else "jpeg"
+
+
+def image_renditions(fp) -> Tuple[Dict[Tuple[int, str], bytes], str]:
+    """
+    從圖片檔案物件產生全部縮圖規格，回傳 ({(尺寸, 格式): bytes}, 原始解析度)。
+    只解碼一次：JPEG 先以 draft 用 DCT 縮小比例解碼，之後由大到小逐級縮，
+    每一級都從上一級的結果再縮 (thumbnail 內部會先用 reduce 做整數倍縮小)。
+    """
+    renditions = {}
+    with Image.open(fp) as img:
+        resolution = f"{img.size[0]}x{img.size[1]}"
+        largest = max(RENDITION_SIZES)
+        img.draft("RGB", (largest, largest))
+        frame = img
+        for size in sorted(RENDITION_SIZES, reverse=True):
+            frame.thumbnail((size, size))
+            if frame.mode not in ("RGB", "L"):
+                frame = frame.convert("RGB")
+            for fmt in RENDITION_FORMATS:
+                buf = io.BytesIO()
+                frame.save(buf, _PIL_FORMATS[fmt], quality=80)
+                renditions[(size, fmt)] = buf.getvalue()
+    return renditions, resolution
+
+
+def _ffmpeg_input(source: Union[bytes, str]) -> Tuple[str, Optional[bytes]]:
+    # bytes 經 stdin 餵入；字串視為 URL / 路徑讓 ffmpeg 自己讀 (HTTP 來源會用 Range 只抓需要的部分)
+    if isinstance(source, bytes):
+        return "pipe:0", source
+    return source, None
+
+
+def video_frame(source: Union[bytes, str]) -> Optional[bytes]:
+    """擷取影片第一秒畫面為 JPEG (需安裝 ffmpeg)。source 為影片開頭樣本 bytes 或 URL。"""
+    input_arg, input_bytes = _ffmpeg_input(source)
+    largest = max(RENDITION_SIZES)
+    result = subprocess.run(
+        [
+            "ffmpeg", "-y",
+            "-i", input_arg,
+            "-ss", "00:00:01.000",
+            "-vframes", "1",
+            # 截成最大縮圖的寬度 (小影片不放大)，再交給 image_renditions 產生各規格
+            "-vf", f"scale='min({largest},iw)':-2",
+            "-f", "image2", "-c:v", "mjpeg",
+            "pipe:1",
+        ],
+        input=input_bytes,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    return result.stdout or None
+
+
+def _frame_rate(value: Optional[str]) -> Optional[float]:
+    # ffprobe 的影格率是分數字串，例如 "30000/1001"
+    if not value or value == "0/0":
+        return None
+    num, _, den = value.partition("/")
+    try:
+        return round(float(num) / float(den or 1), 3)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def _number(value, cast=float):
+    try:
+        return cast(value) if value not in (None, "N/A") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def probe_video(source: Union[bytes, str]) -> Optional[dict]:
+    """
+    用 ffprobe 讀影片資訊 (需安裝 ffmpeg)，回傳
+    {"duration", "resolution", "video_codec", "bitrate", "frame_rate"}；讀不到視訊串流時回傳 None。
+    """
+    input_arg, input_bytes = _ffmpeg_input(source)
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error",
+            "-print_format", "json",
+            "-show_format", "-show_streams",
+            "-select_streams", "v:0",
+            input_arg,
+        ],
+        input=input_bytes,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        info = json.loads(result.stdout or b"{}")
+    except ValueError:
+        return None
+    streams = info.get("streams") or []
+    if not streams:
+        return None
+    stream, fmt = streams[0], info.get("format") or {}
+
+    width, height = stream.get("width"), stream.get("height")
+    return {
+        "duration": _number(fmt.get("duration")) or _number(stream.get("duration")),
+        "resolution": f"{width}x{height}" if width and height else None,
+        "video_codec": stream.get("codec_name"),
+        "bitrate": _number(fmt.get("bit_rate"), int) or _number(stream.get("bit_rate"), int),
+        "frame_rate": _frame_rate(stream.get("avg_frame_rate")) or _frame_rate(stream.get("r_frame_rate")),
+    }
+
+
+def has_audio(source: str) -> bool:
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "a:0", "-show_entries", "stream=index", "-of", "csv=p=0", source],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    return bool(result.stdout.strip())
+
+
+def hls_ladder(width: int, height: int):
+    """依原片短邊挑 HLS 檔位；比最低檔還小的影片就用原尺寸出一檔。"""
+    short_side = min(width, height)
+    rungs = [rung for rung in HLS_LADDER if rung[0] <= short_side][:HLS_MAX_RENDITIONS]
+    return rungs or [(short_side - short_side % 2, HLS_LADDER[-1][1] // 2)]
+
+
+def package_hls(source: str, out_dir: str, width: int, height: int, audio: bool):
+    """
+    用一次 ffmpeg (一次解碼、split 後各自縮放編碼) 產生全部檔位的 HLS (需安裝 ffmpeg)。
+    輸出 out_dir/master.m3u8 與 out_dir/v{n}/index.m3u8、seg_*.ts；失敗丟 RuntimeError。
+    """
+    rungs = hls_ladder(width, height)
+    landscape = width >= height
+    split = f"[0:v]split={len(rungs)}" + "".join(f"[s{i}]" for i in range(len(rungs)))
+    scales = [
+        f"[s{i}]scale={'-2:' + str(side) if landscape else str(side) + ':-2'}[v{i}]"
+        for i, (side, _) in enumerate(rungs)
+    ]
+
+    cmd = ["ffmpeg", "-y", "-i", source, "-filter_complex", ";".join([split] + scales)]
+    for i, (_, kbps) in enumerate(rungs):
+        cmd += [
+            "-map", f"[v{i}]",
+            f"-c:v:{i}", "libx264",
+            f"-b:v:{i}", f"{kbps}k",
+            f"-maxrate:v:{i}", f"{int(kbps * 1.1)}k",
+            f"-bufsize:v:{i}", f"{kbps * 2}k",
+        ]
+        if audio:
+            cmd += ["-map", "0:a:0"]
+    if audio:
+        cmd += ["-c:a", "aac", "-b:a", "128k", "-ac", "2"]
+    cmd += [
+        "-preset", "veryfast",
+        "-pix_fmt", "yuv420p",
+        # 每個分段都從關鍵格開始，各檔位可以在分段邊界切換
+        "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+        "-sc_threshold", "0",
+        "-f", "hls",
+        "-hls_time", str(HLS_SEGMENT_SECONDS),
+        "-hls_playlist_type", "vod",
+        "-hls_flags", "independent_segments",
+        "-hls_segment_filename", os.path.join(out_dir, "v%v", "seg_%05d.ts"),
+        "-master_pl_name", "master.m3u8",
+        "-var_stream_map", " ".join(f"v:{i},a:{i}" if audio else f"v:{i}" for i in range(len(rungs))),
+        os.path.join(out_dir, "v%v", "index.m3u8"),
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"HLS 轉檔失敗: {result.stderr.decode('utf-8', 'replace')[-500:]}")
+    return rungs
@@ -1,5 +1,5 @@
 # models.py
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, BigInteger, TIMESTAMP, Text
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, BigInteger, TIMESTAMP, Text, Index, Float
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -59,9 +59,11 @@ class Asset(Base):
     # ... (欄位保持不變) ...
     asset_id = Column(BigInteger, primary_key=True, index=True)
     filename = Column(String(255), nullable=False)
-    file_type = Column(String(50))
+    file_type = Column(String(50), index=True)  # 列表依類型篩選 + 分頁用
     latest_version_id = Column(BigInteger, ForeignKey("version.version_id"), nullable=True)
     uploaded_by_user_id = Column(BigInteger, ForeignKey("user.user_id"), nullable=False)
+    # 縮圖 / 解析度等衍生檔的處理狀態: pending, processing, ready, failed (NULL 代表舊資料或不需處理)
+    derivative_status = Column(String(20), nullable=True)
 
     uploader = relationship("User", back_populates="assets_uploaded")
     
@@ -81,6 +83,11 @@ class Asset(Base):
     # [修正 5] 留言 (一對多): 加上 cascade
     comments = relationship("Comment", back_populates="asset", cascade="all, delete-orphan")
 
+    # [新增] 搜尋用索引：FULLTEXT (ngram，中文免斷詞) 給關鍵字搜尋
+    __table_args__ = (
+        Index("ft_asset_filename", "filename", mysql_prefix="FULLTEXT", mysql_with_parser="ngram"),
+    )
+
 # 6. 版本 (Version) [cite: 93]
 class Version(Base):
     __tablename__ = "version"
@@ -88,6 +95,13 @@ class Version(Base):
     asset_id = Column(BigInteger, ForeignKey("asset.asset_id", ondelete="CASCADE"), nullable=False)
     version_number = Column(Integer, nullable=False, default=1)
     storage_path = Column(String(1024), nullable=False) # 這裡存 NoSQL/S3 路徑
+    sha256 = Column(String(64), nullable=True, index=True) # 檔案內容雜湊 (去重用)，舊資料為 NULL
+    # 寫入時記錄的 MinIO 物件資訊，下載 / 縮圖不必再 stat_object (舊資料由 reconcile_versions.py 回填)
+    filesize = Column(BigInteger, nullable=True)
+    etag = Column(String(100), nullable=True)          # MinIO etag (不含引號)
+    content_type = Column(String(100), nullable=True)
+    has_thumbnail = Column(Boolean, nullable=False, default=False, server_default="0") # 各規格縮圖都已產生
+    has_hls = Column(Boolean, nullable=False, default=False, server_default="0") # 影片已轉成 HLS (多種位元率)
     created_at = Column(TIMESTAMP, server_default=func.now())
 
     asset = relationship("Asset", back_populates="versions", foreign_keys=[asset_id])
@@ -98,8 +112,12 @@ class Metadata(Base):
     asset_id = Column(BigInteger, ForeignKey("asset.asset_id", ondelete="CASCADE"), primary_key=True)
     filesize = Column(BigInteger)
     resolution = Column(String(50))
-    duration = Column(String(50)) # 若是影片才有
+    duration = Column(Float, index=True) # 若是影片才有 (秒)
     encoding_format = Column(String(50))
+    # 影片才有 (由 ffprobe 取得)
+    video_codec = Column(String(50))
+    bitrate = Column(BigInteger)   # bits/s
+    frame_rate = Column(Float)
 
     # 對應 Asset.metadata_info
     asset_info = relationship("Asset", back_populates="metadata_info")
@@ -162,6 +180,7 @@ class Category(Base):
     category_id = Column(Integer, primary_key=True, index=True)
     category_name = Column(String(100), nullable=False)
     parent_category_id = Column(Integer, ForeignKey("category.category_id"), nullable=True)
+    __table_args__ = (Index("ft_category_name", "category_name", mysql_prefix="FULLTEXT", mysql_with_parser="ngram"),)
 
     # 自我關聯 (父分類/子分類)
     children = relationship("Category", backref=backref('parent', remote_side=[category_id]))
@@ -177,6 +196,7 @@ class Tag(Base):
     tag_id = Column(Integer, primary_key=True, index=True)
     tag_name = Column(String(50), unique=True, nullable=False)
     is_ai_suggested = Column(Boolean, default=False)
+    __table_args__ = (Index("ft_tag_name", "tag_name", mysql_prefix="FULLTEXT", mysql_with_parser="ngram"),)
 
 # 16. 資產標籤關聯表 (Asset_Tag) [cite: 147]
 class AssetTag(Base):
@@ -206,3 +226,54 @@ class PasswordResetToken(Base):
     expires_at = Column(TIMESTAMP, nullable=False)
 
     user = relationship("User")
+
+# 19. 分段上傳工作階段 (Upload Session)，對應 MinIO 的 multipart upload
+class UploadSession(Base):
+    __tablename__ = "upload_session"
+    session_id = Column(String(64), primary_key=True, index=True)
+    user_id = Column(BigInteger, ForeignKey("user.user_id"), nullable=False)
+    asset_id = Column(BigInteger, ForeignKey("asset.asset_id", ondelete="CASCADE"), nullable=True) # 有值代表上傳完成後成為該資產的新版本
+    filename = Column(String(255), nullable=False)
+    content_type = Column(String(100), nullable=True)
+    total_size = Column(BigInteger, nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    total_chunks = Column(Integer, nullable=False)
+    object_name = Column(String(1024), nullable=False) # 完成後的 MinIO Key
+    upload_id = Column(String(255), nullable=True)     # MinIO multipart uploadId (direct 模式為 NULL)
+    mode = Column(String(20), nullable=False, default="multipart", server_default="multipart") # multipart: 分段經 API; direct: 瀏覽器以 presigned URL 直傳 MinIO
+    status = Column(String(50), nullable=False, default="uploading") # uploading, completing, completed, aborted, expired
+    completing_at = Column(TIMESTAMP, nullable=True) # UTC，開始合併的時間 (用來接手中斷的 completing)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    expires_at = Column(TIMESTAMP, nullable=False)
+
+    user = relationship("User")
+
+    # 定期清理過期工作階段時用
+    __table_args__ = (Index("ix_upload_session_status_expires", "status", "expires_at"),)
+
+# 20. 實體物件 (Stored Object)：相同內容 (SHA-256) 只在 MinIO 存一份，記錄被幾個版本引用
+class StoredObject(Base):
+    __tablename__ = "stored_object"
+    sha256 = Column(String(64), primary_key=True)
+    storage_path = Column(String(1024), nullable=False) # MinIO Key
+    filesize = Column(BigInteger)
+    ref_count = Column(Integer, nullable=False, default=1) # 歸零時才真正刪除 MinIO 物件
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+# 21. 衍生檔工作佇列 (Derivative Job)：縮圖 / 解析度等背景處理，存在 DB 以便重啟後繼續
+class DerivativeJob(Base):
+    __tablename__ = "derivative_job"
+    job_id = Column(BigInteger, primary_key=True, index=True)
+    asset_id = Column(BigInteger, ForeignKey("asset.asset_id", ondelete="CASCADE"), nullable=False)
+    version_id = Column(BigInteger, ForeignKey("version.version_id", ondelete="CASCADE"), nullable=False)
+    storage_path = Column(String(1024), nullable=False) # 原檔的 MinIO Key
+    content_type = Column(String(100), nullable=True)
+    kind = Column(String(20), nullable=False, default="thumbnail", server_default="thumbnail") # thumbnail (縮圖 / metadata), hls (影片轉檔)
+    status = Column(String(50), nullable=False, default="pending") # pending, processing, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    next_run_at = Column(TIMESTAMP, nullable=False)  # UTC，重試時往後延
+    claimed_at = Column(TIMESTAMP, nullable=True)    # UTC，worker 取走的時間 (用來回收卡住的工作)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+    __table_args__ = (Index("ix_derivative_job_status_next_run", "kind", "status", "next_run_at"),)
@@ -0,0 +1,71 @@
+# presign.py
+# MinIO presigned GET 網址快取：下載 / 縮圖 / 分享連結改用 302 轉址時，
+# 同一物件 (含相同的 response-content-* 覆寫) 在到期前重複使用同一個網址，
+# 省下每次簽章的成本，也讓瀏覽器對同一網址的快取能命中
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Optional
+from urllib.parse import quote
+
+
+def content_disposition(disposition: str, filename: Optional[str] = None) -> str:
+    """組 Content-Disposition；非 ASCII 檔名另外帶 RFC 5987 的 filename*。"""
+    if not filename:
+        return disposition
+    fallback = filename.encode("ascii", "ignore").decode().replace('"', "").strip() or "download"
+    return f"{disposition}; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+
+class PresignedUrlCache:
+    """
+    以 (bucket, 物件, 覆寫的回應標頭) 為 key 快取 presigned GET 網址。
+    - ttl_seconds：簽出網址的效期
+    - refresh_margin：剩餘效期少於這個秒數就重簽，避免客戶端拿到馬上過期的網址
+    - max_entries：超過時淘汰最久沒用的 (LRU)
+    sync 路由會在多個執行緒同時呼叫，內部以 lock 保護。
+    """
+
+    def __init__(self, ttl_seconds: int = 900, refresh_margin: int = 60, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin = min(refresh_margin, ttl_seconds // 2)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        client,
+        bucket: str,
+        object_name: str,
+        content_type: Optional[str] = None,
+        disposition: Optional[str] = None,
+    ) -> str:
+        response_headers = {}
+        if content_type:
+            response_headers["response-content-type"] = content_type
+        if disposition:
+            response_headers["response-content-disposition"] = disposition
+        key = (bucket, object_name, content_type, disposition)
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] - now > self.refresh_margin:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        # 簽章在 lock 外進行 (第一次會向 MinIO 查 bucket region)
+        url = client.presigned_get_object(
+            bucket,
+            object_name,
+            expires=timedelta(seconds=self.ttl_seconds),
+            response_headers=response_headers or None,
+        )
+        with self._lock:
+            self._entries[key] = (url, now + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return url
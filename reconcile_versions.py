@@ -0,0 +1,129 @@
+# reconcile_versions.py
+# Version 上記錄的 MinIO 物件資訊 (大小 / etag / 內容類型 / 是否有縮圖) 的回填與核對
+# 用法:
+#   python reconcile_versions.py                # 回填尚未記錄的舊資料
+#   python reconcile_versions.py --check        # 核對所有版本與 MinIO 是否一致，只回報
+#   python reconcile_versions.py --check --fix  # 核對並以 MinIO 的實際值修正
+import argparse
+import os
+import sys
+
+from minio import Minio
+from minio.error import S3Error
+
+from database import SessionLocal
+import derivatives
+import media
+import models
+
+MINIO_BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME")
+minio_client = Minio(
+    os.getenv("MINIO_ENDPOINT"),
+    access_key=os.getenv("MINIO_ACCESS_KEY"),
+    secret_key=os.getenv("MINIO_SECRET_KEY"),
+    secure=False
+)
+
+
+def _stat(key: str):
+    try:
+        return minio_client.stat_object(MINIO_BUCKET_NAME, key)
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject"):
+            return None
+        raise
+
+
+def _all_renditions_exist(storage_path: str) -> bool:
+    return all(_stat(key) is not None for key in media.rendition_keys(storage_path))
+
+
+def backfill():
+    db = SessionLocal()
+    filled = missing = requeued = 0
+    try:
+        versions = db.query(models.Version).filter(models.Version.filesize.is_(None)).order_by(models.Version.version_id).all()
+        print(f"🔄 共 {len(versions)} 個版本需要回填")
+        for version in versions:
+            stat = _stat(version.storage_path)
+            if stat is None:
+                missing += 1
+                print(f"   ❌ version {version.version_id}: MinIO 找不到 {version.storage_path}")
+                continue
+
+            asset = version.asset
+            version.filesize = stat.size
+            version.etag = stat.etag.strip('"') if stat.etag else None
+            version.content_type = (asset.file_type if asset else None) or stat.content_type
+            version.has_thumbnail = _all_renditions_exist(version.storage_path)
+
+            # 多規格縮圖之前產生的舊資產：最新版補排一次衍生檔工作
+            if (not version.has_thumbnail and asset and asset.latest_version_id == version.version_id
+                    and derivatives.needs_derivatives(version.content_type)):
+                derivatives.enqueue(db, asset, version, version.content_type)
+                requeued += 1
+
+            # 一筆一 commit，中途中斷時已處理的不會白做
+            db.commit()
+            filled += 1
+
+        print(f"🎉 回填完成：{filled} 筆，MinIO 缺檔 {missing} 筆，重新排入縮圖工作 {requeued} 筆")
+    except Exception as e:
+        print(f"❌ 回填失敗: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def check(fix: bool = False) -> int:
+    """回傳不一致的筆數。"""
+    db = SessionLocal()
+    drifted = 0
+    try:
+        versions = db.query(models.Version).filter(models.Version.filesize.isnot(None)).order_by(models.Version.version_id).all()
+        print(f"🔍 核對 {len(versions)} 個版本")
+        for version in versions:
+            stat = _stat(version.storage_path)
+            if stat is None:
+                drifted += 1
+                print(f"   ❌ version {version.version_id}: MinIO 找不到 {version.storage_path}")
+                continue
+
+            actual_etag = stat.etag.strip('"') if stat.etag else None
+            problems = []
+            if version.filesize != stat.size:
+                problems.append(f"filesize {version.filesize} != {stat.size}")
+            if version.etag and version.etag != actual_etag:
+                problems.append(f"etag {version.etag} != {actual_etag}")
+            if version.has_thumbnail and not _all_renditions_exist(version.storage_path):
+                problems.append("has_thumbnail 為 true 但縮圖不完整")
+            if not problems:
+                continue
+
+            drifted += 1
+            print(f"   ⚠️ version {version.version_id} ({version.storage_path}): {'; '.join(problems)}")
+            if fix:
+                version.filesize = stat.size
+                version.etag = actual_etag
+                version.has_thumbnail = _all_renditions_exist(version.storage_path)
+                db.commit()
+
+        print(f"{'🎉' if not drifted else '⚠️'} 核對完成：不一致 {drifted} 筆{'（已修正）' if fix and drifted else ''}")
+    except Exception as e:
+        print(f"❌ 核對失敗: {e}")
+        db.rollback()
+        drifted = drifted or 1
+    finally:
+        db.close()
+    return drifted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="回填 / 核對 Version 上記錄的 MinIO 物件資訊")
+    parser.add_argument("--check", action="store_true", help="核對已記錄的資料是否與 MinIO 一致")
+    parser.add_argument("--fix", action="store_true", help="搭配 --check：以 MinIO 的實際值修正")
+    args = parser.parse_args()
+    if args.check:
+        # 有不一致時以非 0 結束，方便排程 / 監控判斷
+        sys.exit(1 if check(fix=args.fix) else 0)
+    backfill()
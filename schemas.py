@@ -28,8 +28,11 @@ class UserOut(BaseModel):
 class MetadataOut(BaseModel):
     filesize: Optional[int] = None
     resolution: Optional[str] = None
-    duration: Optional[str] = None
+    duration: Optional[float] = None    # 秒
     encoding_format: Optional[str] = None
+    video_codec: Optional[str] = None
+    bitrate: Optional[int] = None       # bits/s
+    frame_rate: Optional[float] = None
     class Config:
         from_attributes = True
 
@@ -39,10 +42,12 @@ class AssetOut(BaseModel):
     filename: str
     file_type: Optional[str] = None
     latest_version_id: Optional[int] = None
+    derivative_status: Optional[str] = None  # 縮圖等衍生檔處理狀態 (pending / processing / ready / failed)
 
     download_url: Optional[str] = None
     thumbnail_url: Optional[str] = None
     presigned_url: Optional[str] = None
+    hls_url: Optional[str] = None           # 影片轉成 HLS 後才有 (master.m3u8)
 
     latest_version: Optional[VersionOut] = None
     uploader: Optional[UserOut] = None
@@ -84,6 +89,12 @@ class ShareLinkCreate(BaseModel):
     expires_in_minutes: int = 60       # 預設 60 分鐘後過期
     permission_type: str = "readonly"  # readonly 或 downloadable
 
+# [新增] 一個連結分享多個資產
+class MultiShareLinkCreate(BaseModel):
+    asset_ids: List[int]
+    expires_in_minutes: int = 60
+    permission_type: str = "readonly"
+
 # [新增] 回傳給前端的連結資訊
 class ShareLinkOut(BaseModel):
     token: str
@@ -162,4 +173,59 @@ class PasswordResetRequest(BaseModel):
 # [新增] 執行重設密碼 (輸入 Token + 新密碼)
 class PasswordResetConfirm(BaseModel):
     token: str
-    new_password: str
\ No newline at end of file
+    new_password: str
+# [新增] 建立分段上傳工作階段
+class UploadSessionCreate(BaseModel):
+    filename: str
+    total_size: int                     # 檔案總大小 (bytes)
+    content_type: Optional[str] = None
+    chunk_size: Optional[int] = None    # 不填則使用伺服器預設
+    asset_id: Optional[int] = None      # 有填代表上傳成為該資產的新版本
+
+# [新增] 分段上傳工作階段狀態
+class UploadSessionOut(BaseModel):
+    session_id: str
+    filename: str
+    status: str
+    total_size: int
+    chunk_size: int
+    total_chunks: int
+    uploaded_chunks: List[int] = []     # 伺服器已收到的分段編號 (從 1 開始)
+    expires_at: datetime
+    asset_id: Optional[int] = None
+
+# [新增] 批次上傳：每個檔案各自的結果 (成功帶資產資料，失敗帶錯誤原因)
+class BatchUploadResult(BaseModel):
+    filename: str
+    success: bool
+    asset: Optional[AssetOut] = None
+    error: Optional[str] = None
+
+# [新增] Presigned 直傳：瀏覽器拿 upload_url 直接 PUT 到 MinIO，再呼叫 finalize
+class DirectUploadOut(BaseModel):
+    session_id: str
+    filename: str
+    upload_url: str
+    method: str = "PUT"
+    headers: dict = {}                  # PUT 時需要帶上的 header
+    expires_at: datetime                # upload_url 的有效期限 (UTC)
+    asset_id: Optional[int] = None
+
+# [新增] 批次取得縮圖 (資產網格一次載入整頁)
+class ThumbnailBatchRequest(BaseModel):
+    asset_ids: List[int]
+    size: Optional[int] = None          # 同單張縮圖的 ?size=
+    format: Optional[str] = None        # 同單張縮圖的 ?format=，不填依 Accept 協商
+
+# [新增] 資產瀏覽的 facets (目前篩選條件下，各類型 / 標籤 / 分類 / 上傳者的資產數)
+class FacetCount(BaseModel):
+    value: Optional[str] = None         # 篩選用的值 (file_type / 標籤名稱 / category_id / user_id)
+    label: Optional[str] = None         # 顯示名稱
+    count: int
+
+class AssetFacetsOut(BaseModel):
+    total: int
+    file_types: List[FacetCount] = []
+    tags: List[FacetCount] = []
+    categories: List[FacetCount] = []
+    uploaders: List[FacetCount] = []
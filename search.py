@@ -0,0 +1,114 @@
+# search.py
+# 資產全文搜尋：MySQL FULLTEXT 索引 (ngram parser，中文不需要斷詞) 取代 LIKE '%關鍵字%' 的全表掃描。
+# 檔名、標籤、分類名稱各有一個 FULLTEXT 索引，各自查出命中的資產與分數後加總排序。
+# 注意：ngram_token_size 預設為 2，少於 2 個字的關鍵字無法用 FULLTEXT 查，改用 LIKE '%關鍵字%' (全表掃描，但只有 1 個字時才會走到)。
+# FULLTEXT 索引建立時已關閉 InnoDB 的預設停用字 (見 migration f1c7e9a3b524)，"in" / "to" 這類詞與含 a / i 的 ngram 才查得到。
+import re
+from typing import List, Optional
+
+from sqlalchemy import Float, Integer, and_, cast, func, literal, select, type_coerce, union_all
+from sqlalchemy.dialects.mysql import match
+
+import models
+
+NGRAM_TOKEN_SIZE = 2
+MAX_QUERY_LENGTH = 100
+
+# 各來源的權重：檔名命中最重要，其次是標籤、分類
+FILENAME_WEIGHT = 3
+TAG_WEIGHT = 2
+CATEGORY_WEIGHT = 1
+# LIKE 命中 (短關鍵字) 沒有 FULLTEXT 分數，給固定分數
+LIKE_SCORE = 1
+
+# BOOLEAN MODE 的運算子，關鍵字裡出現就當成分隔
+_BOOLEAN_OPERATORS = re.compile(r'[+\-<>()~*"@]+')
+
+
+def terms(q: Optional[str]) -> List[str]:
+    """切出關鍵字 (以空白 / 運算子分隔)，去掉重複。"""
+    if not q:
+        return []
+    q = _BOOLEAN_OPERATORS.sub(" ", q[:MAX_QUERY_LENGTH])
+    return list(dict.fromkeys(t for t in q.split() if t))
+
+
+def boolean_query(words: List[str]) -> str:
+    """
+    每個關鍵字都要出現 (+)，以片語 ("...") 比對：ngram 下等於「包含這段連續文字」，
+    輸入到一半的字 (as-you-type) 也能命中。
+    """
+    return " ".join(f'+"{w}"' for w in words)
+
+
+def is_fulltext(words: List[str]) -> bool:
+    return bool(words) and all(len(w) >= NGRAM_TOKEN_SIZE for w in words)
+
+
+def _like_contains(value: str) -> str:
+    return "%" + value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _contains_all(column, words: List[str]):
+    # 每個關鍵字都要出現 (與 FULLTEXT 的 +"..." 相同語意)
+    return and_(*(column.like(_like_contains(w)) for w in words))
+
+
+def filename_clause(q: str):
+    """?filename= 的條件；回傳 None 代表沒有有效關鍵字。"""
+    words = terms(q)
+    if not words:
+        return None
+    if is_fulltext(words):
+        return match(models.Asset.filename, against=boolean_query(words)).in_boolean_mode()
+    # 太短：包含比對 (不只比對開頭，和 FULLTEXT 一樣任何位置命中都算)
+    return _contains_all(models.Asset.filename, words)
+
+
+def hits_subquery(q: str):
+    """
+    ?q= 的命中清單：(asset_id, rank) 的子查詢，rank 越大越相關。
+    三個來源各自走自己的索引再 UNION ALL，依資產加總；rank 轉成整數，分頁的 cursor 才能精確比較。
+    回傳 None 代表沒有有效關鍵字。
+    """
+    words = terms(q)
+    if not words:
+        return None
+
+    Asset, Tag, AssetTag = models.Asset, models.Tag, models.AssetTag
+    Category, AssetCategory = models.Category, models.AssetCategory
+
+    if is_fulltext(words):
+        against = boolean_query(words)
+        # MATCH 同時當條件 (走索引) 與分數；型別標為 Float 才能乘上權重
+        filename_score = match(Asset.filename, against=against).in_boolean_mode()
+        tag_score = match(Tag.tag_name, against=against).in_boolean_mode()
+        category_score = match(Category.category_name, against=against).in_boolean_mode()
+        sources = [
+            select(Asset.asset_id.label("asset_id"), (type_coerce(filename_score, Float) * FILENAME_WEIGHT).label("score"))
+            .where(filename_score),
+            select(AssetTag.asset_id.label("asset_id"), (type_coerce(tag_score, Float) * TAG_WEIGHT).label("score"))
+            .join(Tag, Tag.tag_id == AssetTag.tag_id)
+            .where(tag_score),
+            select(AssetCategory.asset_id.label("asset_id"), (type_coerce(category_score, Float) * CATEGORY_WEIGHT).label("score"))
+            .join(Category, Category.category_id == AssetCategory.category_id)
+            .where(category_score),
+        ]
+    else:
+        sources = [
+            select(Asset.asset_id.label("asset_id"), literal(LIKE_SCORE * FILENAME_WEIGHT).label("score"))
+            .where(_contains_all(Asset.filename, words)),
+            select(AssetTag.asset_id.label("asset_id"), literal(LIKE_SCORE * TAG_WEIGHT).label("score"))
+            .join(Tag, Tag.tag_id == AssetTag.tag_id)
+            .where(_contains_all(Tag.tag_name, words)),
+        ]
+
+    scored = union_all(*sources).subquery("search_scores")
+    return (
+        select(
+            scored.c.asset_id,
+            cast(func.round(func.sum(scored.c.score) * 1000), Integer).label("rank"),
+        )
+        .group_by(scored.c.asset_id)
+        .subquery("search_hits")
+    )
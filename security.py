@@ -3,6 +3,11 @@ from typing import Optional
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 import os
+import base64
+import hashlib
+import hmac
+import json
+import time
 
 # 1. 設定參數 (實務上這些應該放在環境變數，作業先寫死)
 SECRET_KEY = os.getenv("SECRET_KEY") # 請隨意修改亂碼
@@ -43,3 +48,33 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+
+# 功能 D: 簽章網址 (下載 / 縮圖)
+# payload (含到期時間) 以 HMAC-SHA256 簽名；驗證只在記憶體中計算，不必查資料庫
+# 金鑰由 SECRET_KEY 衍生，與 JWT 用途分開
+_SIGNING_KEY = hashlib.sha256(f"signed-url:{SECRET_KEY}".encode()).digest()
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def create_signed_token(purpose: str, payload: dict, expires_at: int) -> str:
+    body = _b64encode(json.dumps({**payload, "p": purpose, "e": expires_at}, separators=(",", ":")).encode())
+    sig = _b64encode(hmac.new(_SIGNING_KEY, body.encode(), hashlib.sha256).digest())
+    return f"{body}.{sig}"
+
+def verify_signed_token(token: str, purpose: str) -> Optional[dict]:
+    # 簽章不符、用途不符或已過期都回傳 None
+    try:
+        body, sig = token.split(".")
+        expected = _b64encode(hmac.new(_SIGNING_KEY, body.encode(), hashlib.sha256).digest())
+        if not hmac.compare_digest(sig, expected):
+            return None
+        payload = json.loads(_b64decode(body))
+    except (ValueError, TypeError):
+        return None
+    if payload.get("p") != purpose or payload.get("e", 0) < time.time():
+        return None
+    return payload
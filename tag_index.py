@@ -0,0 +1,319 @@
+# tag_index.py
+# 標籤的記憶體索引：每個標籤 / 檔案類型 / 上傳者各一份排序好的 asset_id 清單 (array，稀疏的標籤只佔它實際的筆數)，
+# 多標籤的 AND / OR / NOT 在記憶體算完，用來估總數、替 SQL 的分頁掃描縮小範圍。
+# 本行程的寫入 (上傳、加標籤、改標籤、刪除) 即時更新；其他 worker 行程的寫入靠定期重建 (refresh_interval) 追上，
+# 所以索引只能當提示：篩選條件一律由 SQL (sql_clause) 判斷，不能只查索引算出的 asset_id。
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_
+
+import models
+from database import SessionLocal
+
+logger = logging.getLogger("RedAnt")
+
+MAX_GROUPS = 20
+MAX_NAMES_PER_GROUP = 20
+
+# 解析後的查詢：[(是否為 NOT, (標籤名稱, ...)), ...]，群組之間 AND，群組內 OR
+TagGroups = List[Tuple[bool, Tuple[str, ...]]]
+
+
+def parse_expression(expression: str) -> TagGroups:
+    """
+    ?tags= 的語法：逗號 = AND，| = OR，開頭的 - = NOT
+    例：貓咪,風景|海邊,-室內  →  貓咪 AND (風景 OR 海邊) AND NOT 室內
+    格式錯誤時丟 ValueError。
+    """
+    groups = []
+    for part in expression.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        negated = part.startswith("-")
+        if negated:
+            part = part[1:]
+        names = tuple(dict.fromkeys(n.strip().lstrip("#").strip() for n in part.split("|")))
+        if not all(names):
+            raise ValueError("標籤條件有空白的標籤名稱")
+        if len(names) > MAX_NAMES_PER_GROUP:
+            raise ValueError(f"每組 OR 最多 {MAX_NAMES_PER_GROUP} 個標籤")
+        groups.append((negated, names))
+    if not groups:
+        raise ValueError("標籤條件是空的")
+    if len(groups) > MAX_GROUPS:
+        raise ValueError(f"標籤條件最多 {MAX_GROUPS} 組")
+    return groups
+
+
+def sql_clause(groups: TagGroups):
+    """同樣條件的 SQL 版本 (每組一個 EXISTS)，索引還沒載入完成等情況使用。"""
+    clauses = []
+    for negated, names in groups:
+        clause = models.Asset.tags.any(models.Tag.tag_name.in_(names))
+        clauses.append(~clause if negated else clause)
+    return and_(*clauses)
+
+
+# asset_id 是 BIGINT，用 8 bytes 的無號整數存
+TYPECODE = "Q"
+
+IdList = array
+
+
+def count(ids: IdList) -> int:
+    return len(ids)
+
+
+def ids_desc(ids: IdList, below: Optional[int] = None, limit: Optional[int] = None) -> List[int]:
+    """由大到小列出清單裡的 asset_id (只取 < below 的，最多 limit 個)。"""
+    end = len(ids) if below is None else bisect_left(ids, below)
+    start = 0 if limit is None else max(end - limit, 0)
+    return ids[start:end].tolist()[::-1]
+
+
+def _contains(ids: IdList, asset_id: int) -> bool:
+    i = bisect_left(ids, asset_id)
+    return i < len(ids) and ids[i] == asset_id
+
+
+def _intersect(a: IdList, b: IdList) -> IdList:
+    # 走較短的一份，在較長的一份上二分搜尋 (只往後找)
+    if len(a) > len(b):
+        a, b = b, a
+    out, lo, n = array(TYPECODE), 0, len(b)
+    for asset_id in a:
+        lo = bisect_left(b, asset_id, lo)
+        if lo == n:
+            break
+        if b[lo] == asset_id:
+            out.append(asset_id)
+    return out
+
+
+def _difference(a: IdList, b: IdList) -> IdList:
+    if not b:
+        return a
+    return array(TYPECODE, (asset_id for asset_id in a if not _contains(b, asset_id)))
+
+
+def _union(lists: List[IdList]) -> IdList:
+    lists = [ids for ids in lists if ids]
+    if len(lists) == 1:
+        return lists[0]
+    merged = set()
+    for ids in lists:
+        merged.update(ids)
+    return array(TYPECODE, sorted(merged))
+
+
+def _from_ids(ids: List[int]) -> IdList:
+    return array(TYPECODE, sorted(set(ids)))
+
+
+def _insert(ids: IdList, asset_id: int):
+    # 新資產的 id 通常最大，直接接在後面
+    if not ids or ids[-1] < asset_id:
+        ids.append(asset_id)
+        return
+    i = bisect_left(ids, asset_id)
+    if i == len(ids) or ids[i] != asset_id:
+        ids.insert(i, asset_id)
+
+
+def _discard(ids: IdList, asset_id: int):
+    i = bisect_left(ids, asset_id)
+    if i < len(ids) and ids[i] == asset_id:
+        del ids[i]
+
+
+class TagIndex:
+    def __init__(self, refresh_interval: float = 300):
+        self.refresh_interval = refresh_interval
+        self.ready = False
+        self.stats = {"rebuilds": 0, "rebuild_seconds": None, "last_rebuild": None, "updates": 0}
+        self._all = array(TYPECODE)
+        self._tags: Dict[str, IdList] = {}
+        self._file_types: Dict[str, IdList] = {}
+        self._owners: Dict[int, IdList] = {}
+        # 反向索引：刪除 / 改標籤時只動這個資產用到的清單，不必掃過全部標籤
+        self._asset_keys: Dict[int, Tuple[Optional[str], int]] = {}   # asset_id -> (file_type, owner_id)
+        self._asset_tags: Dict[int, set] = {}                           # asset_id -> {標籤名稱}
+        self._journal: Optional[list] = None  # 重建期間的寫入，重建完成後重播
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---------- 重建 ----------
+    def rebuild(self):
+        started = time.monotonic()
+        with self._lock:
+            self._journal = []
+        try:
+            db = SessionLocal()
+            try:
+                assets = db.query(
+                    models.Asset.asset_id, models.Asset.file_type, models.Asset.uploaded_by_user_id
+                ).all()
+                links = db.query(models.AssetTag.asset_id, models.Tag.tag_name).join(
+                    models.Tag, models.Tag.tag_id == models.AssetTag.tag_id
+                ).all()
+            finally:
+                db.close()
+
+            all_ids, by_type, by_owner, by_tag = [], {}, {}, {}
+            new_asset_keys, new_asset_tags = {}, {}
+            for asset_id, file_type, owner_id in assets:
+                all_ids.append(asset_id)
+                by_type.setdefault(file_type, []).append(asset_id)
+                by_owner.setdefault(owner_id, []).append(asset_id)
+                new_asset_keys[asset_id] = (file_type, owner_id)
+            for asset_id, tag_name in links:
+                by_tag.setdefault(tag_name, []).append(asset_id)
+                new_asset_tags.setdefault(asset_id, set()).add(tag_name)
+
+            new_all = _from_ids(all_ids)
+            new_types = {k: _from_ids(v) for k, v in by_type.items()}
+            new_owners = {k: _from_ids(v) for k, v in by_owner.items()}
+            new_tags = {k: _from_ids(v) for k, v in by_tag.items()}
+        except Exception:
+            with self._lock:
+                self._journal = None
+            raise
+
+        with self._lock:
+            journal, self._journal = self._journal, None
+            self._all, self._file_types, self._owners, self._tags = new_all, new_types, new_owners, new_tags
+            self._asset_keys, self._asset_tags = new_asset_keys, new_asset_tags
+            # 讀取資料庫之後才發生的寫入不在這次的結果裡，重播一次 (操作都是冪等的)
+            for op, args in journal:
+                op(*args)
+            self.ready = True
+            self.stats["rebuilds"] += 1
+            self.stats["rebuild_seconds"] = round(time.monotonic() - started, 3)
+            self.stats["last_rebuild"] = time.time()
+        logger.info(f"標籤索引已重建：{len(all_ids)} 個資產、{len(new_tags)} 個標籤 ({self.stats['rebuild_seconds']}s)")
+
+    def start(self):
+        if self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="tag-index-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.rebuild()
+            except Exception as e:
+                logger.warning(f"標籤索引重建失敗: {e}")
+            self._stop.wait(self.refresh_interval)
+
+    # ---------- 增量更新 (呼叫端不用持有鎖) ----------
+    def _apply(self, op, *args):
+        with self._lock:
+            op(*args)
+            if self._journal is not None:
+                self._journal.append((op, args))
+            self.stats["updates"] += 1
+
+    @staticmethod
+    def _set(index: dict, key, asset_id: int):
+        ids = index.get(key)
+        if ids is None:
+            index[key] = array(TYPECODE, (asset_id,))
+        else:
+            _insert(ids, asset_id)
+
+    @staticmethod
+    def _clear(index: dict, key, asset_id: int):
+        ids = index.get(key)
+        if ids is None:
+            return
+        _discard(ids, asset_id)
+        if not ids:
+            del index[key]
+
+    def _add_asset(self, asset_id: int, file_type: Optional[str], owner_id: int):
+        _insert(self._all, asset_id)
+        self._set(self._file_types, file_type, asset_id)
+        self._set(self._owners, owner_id, asset_id)
+        self._asset_keys[asset_id] = (file_type, owner_id)
+
+    def _remove_asset(self, asset_id: int):
+        _discard(self._all, asset_id)
+        keys = self._asset_keys.pop(asset_id, None)
+        if keys is not None:
+            self._clear(self._file_types, keys[0], asset_id)
+            self._clear(self._owners, keys[1], asset_id)
+        for name in self._asset_tags.pop(asset_id, ()):
+            self._clear(self._tags, name, asset_id)
+
+    def _add_tags(self, asset_id: int, tag_names: Tuple[str, ...]):
+        current = self._asset_tags.setdefault(asset_id, set())
+        for name in tag_names:
+            if name not in current:
+                self._set(self._tags, name, asset_id)
+                current.add(name)
+
+    def _replace_tags(self, asset_id: int, tag_names: Tuple[str, ...]):
+        current = self._asset_tags.get(asset_id, set())
+        for name in current - set(tag_names):
+            self._clear(self._tags, name, asset_id)
+        self._asset_tags[asset_id] = set(current) & set(tag_names)
+        self._add_tags(asset_id, tag_names)
+
+    def add_asset(self, asset_id: int, file_type: Optional[str], owner_id: int):
+        self._apply(self._add_asset, asset_id, file_type, owner_id)
+
+    def remove_asset(self, asset_id: int):
+        self._apply(self._remove_asset, asset_id)
+
+    def add_tags(self, asset_id: int, tag_names: Iterable[str]):
+        self._apply(self._add_tags, asset_id, tuple(tag_names))
+
+    def replace_tags(self, asset_id: int, tag_names: Iterable[str]):
+        self._apply(self._replace_tags, asset_id, tuple(tag_names))
+
+    # ---------- 查詢 ----------
+    def resolve(self, groups: TagGroups, file_type: Optional[str] = None, owner_id: Optional[int] = None) -> Optional[IdList]:
+        """
+        回傳本行程索引中符合條件的 asset_id (由小到大的新 array)；索引尚未載入時回傳 None。
+        其他行程剛做的異動可能還不在結果裡 (或結果裡有已不符合的)，呼叫端只能當提示用。
+        """
+        empty = array(TYPECODE)
+        with self._lock:
+            if not self.ready:
+                return None
+            result = self._all
+            if owner_id is not None:
+                result = _intersect(result, self._owners.get(owner_id, empty))
+            if file_type is not None:
+                result = _intersect(result, self._file_types.get(file_type, empty))
+            for negated, names in groups:
+                union = _union([self._tags.get(name, empty) for name in names])
+                result = _difference(result, union) if negated else _intersect(result, union)
+                if not result:
+                    break
+            # 不要把索引內部的清單交出去 (之後的增量更新會直接改它)
+            return result[:]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lists = [self._all, *self._tags.values(), *self._file_types.values(), *self._owners.values()]
+            return {
+                "ready": self.ready,
+                "assets": count(self._all),
+                "tags": len(self._tags),
+                "bytes": sum(ids.itemsize * len(ids) for ids in lists),
+                "refresh_interval": self.refresh_interval,
+                **self.stats,
+            }
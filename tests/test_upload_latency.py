@@ -0,0 +1,130 @@
+# tests/test_upload_latency.py
+# 大檔上傳進行中，同一個 worker 的其他請求 (GET /) 仍要即時回應：
+# 上傳的雜湊 / MinIO / DB 都必須在 upload_executor 執行，不能卡住 event loop。
+# MinIO 以假物件代替 (每讀一段就 sleep，模擬慢速網路)，資料庫與權限檢查以 dependency_overrides 換掉。
+# 執行：pip install pytest httpx && python -m pytest -q tests
+import asyncio
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+pytest.importorskip("fastapi")
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("transformers")
+
+UPLOAD_SIZE = 48 * 1024 * 1024
+READ_CHUNK = 1024 * 1024
+READ_DELAY = 0.05          # 每讀 1 MB 停 0.05 秒：整個上傳約 2.4 秒
+MAX_ROOT_LATENCY = 0.5     # 上傳期間 GET / 最慢可接受的回應時間 (秒)
+MIN_SAMPLES = 5
+
+
+@pytest.fixture(scope="module")
+def main_module():
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    for name, value in [
+        ("MINIO_ENDPOINT", "127.0.0.1:9000"),
+        ("MINIO_ACCESS_KEY", "test"),
+        ("MINIO_SECRET_KEY", "test-secret"),
+        ("MINIO_BUCKET_NAME", "test-bucket"),
+        # security.py 匯入時就會檢查
+        ("SECRET_KEY", "test-secret-key"),
+        ("ALGORITHM", "HS256"),
+    ]:
+        os.environ.setdefault(name, value)
+    # 不下載 AI 標籤模型
+    with mock.patch("transformers.pipeline"):
+        import main
+    return main
+
+
+class SlowMinio:
+    """只實作上傳會用到的 put_object：分段讀完整個串流，每段都 sleep。"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.uploaded = 0
+
+    def put_object(self, bucket_name, object_name, data, length=-1, part_size=0, content_type=None, **kwargs):
+        self.started.set()
+        while True:
+            chunk = data.read(READ_CHUNK)
+            if not chunk:
+                break
+            self.uploaded += len(chunk)
+            time.sleep(READ_DELAY)
+        return SimpleNamespace(etag='"test-etag"', object_name=object_name)
+
+
+@pytest.fixture
+def app(main_module, monkeypatch):
+    main = main_module
+    minio = SlowMinio()
+    user = SimpleNamespace(user_id=1, role_id=1, email="tester@example.com")
+
+    monkeypatch.setattr(main, "minio_client", minio)
+    monkeypatch.setattr(main, "_acquire_stored_object", lambda db, sha256: None)
+    monkeypatch.setattr(main, "_register_stored_object", lambda db, sha256, object_name, file_size: object_name)
+    monkeypatch.setattr(
+        main, "_create_asset_records",
+        lambda db, user, filename, content_type, object_name, file_size, **kwargs: SimpleNamespace(
+            asset_id=1, filename=filename, file_type=content_type, latest_version_id=1, derivative_status="pending"
+        ),
+    )
+
+    def fake_db():
+        yield mock.MagicMock()
+
+    main.app.dependency_overrides[main.get_db] = fake_db
+    # POST /assets/ 的權限檢查是 require_permission() 產生的閉包，從路由上找出來換掉
+    for route in main.app.routes:
+        if getattr(route, "path", None) == "/assets/" and "POST" in getattr(route, "methods", ()):
+            for dependency in route.dependant.dependencies:
+                if dependency.name == "current_user":
+                    main.app.dependency_overrides[dependency.call] = lambda: user
+    yield main.app, minio
+    main.app.dependency_overrides.clear()
+
+
+def test_root_stays_responsive_during_large_upload(app):
+    asgi_app, minio = app
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            upload = asyncio.create_task(client.post(
+                "/assets/",
+                files={"file": ("big.bin", b"\0" * UPLOAD_SIZE, "application/octet-stream")},
+            ))
+
+            # 等到真的開始寫 MinIO (multipart 解析完成) 才開始量
+            deadline = time.monotonic() + 30
+            while not minio.started.is_set():
+                assert not upload.done(), (await upload).text
+                assert time.monotonic() < deadline, "上傳沒有開始寫入 MinIO"
+                await asyncio.sleep(0.01)
+
+            latencies = []
+            while not upload.done():
+                started = time.perf_counter()
+                response = await client.get("/")
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200
+                await asyncio.sleep(0.05)
+
+            return await upload, latencies
+
+    response, latencies = asyncio.run(scenario())
+
+    assert response.status_code == 200, response.text
+    assert response.json()["filename"] == "big.bin"
+    assert minio.uploaded == UPLOAD_SIZE
+    # event loop 被卡住時，上傳期間根本量不到幾次，或單次就要等到上傳結束
+    assert len(latencies) >= MIN_SAMPLES, latencies
+    assert max(latencies) < MAX_ROOT_LATENCY, latencies
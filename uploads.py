@@ -0,0 +1,116 @@
+# uploads.py
+# 上傳串流工具：邊讀邊算大小 / SHA-256，並用檔頭偵測內容類型
+import hashlib
+from typing import Optional
+
+# 每次從上傳串流讀取的大小
+CHUNK_SIZE = 1024 * 1024
+# MinIO multipart 每個 part 的大小 (MinIO 最小 5MB)，也是單一上傳在記憶體中最多佔用的量
+MINIO_PART_SIZE = 10 * 1024 * 1024
+# 內容偵測需要的檔頭長度
+SNIFF_BYTES = 512
+
+# 常見格式的檔頭 (magic number)
+_MAGIC_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"%PDF-", "application/pdf"),
+    (b"\x1a\x45\xdf\xa3", "video/webm"),
+    (b"PK\x03\x04", "application/zip"),
+]
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """依檔頭判斷內容類型，認不出來回傳 None。"""
+    if not head:
+        return None
+    for magic, mime in _MAGIC_SIGNATURES:
+        if head.startswith(magic):
+            return mime
+    # RIFF 容器 (WebP / AVI / WAV)
+    if head[:4] == b"RIFF" and len(head) >= 12:
+        return {b"WEBP": "image/webp", b"AVI ": "video/x-msvideo", b"WAVE": "audio/wav"}.get(head[8:12])
+    # ISO BMFF (MP4 / MOV / HEIC)，第 4~8 bytes 為 "ftyp"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand == b"qt  ":
+            return "video/quicktime"
+        if brand in (b"heic", b"heix", b"mif1"):
+            return "image/heic"
+        return "video/mp4"
+    return None
+
+
+def resolve_content_type(declared: Optional[str], head: bytes) -> str:
+    """前端宣告的類型優先；沒給或只是 octet-stream 時改用偵測結果。"""
+    if declared and declared != "application/octet-stream":
+        return declared
+    return sniff_content_type(head) or declared or "application/octet-stream"
+
+
+class HashingStream:
+    """包裝上傳串流：被讀取時同步累計大小與 SHA-256。
+
+    交給 minio_client.put_object(length=-1) 使用時，MinIO 會以 part_size 為單位分段讀取，
+    因此整個檔案不會一次載入記憶體。
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        # 先讀出檔頭供內容偵測，之後 read() 時再吐回去
+        self._head = raw.read(SNIFF_BYTES) or b""
+        self._pending = self._head
+
+    def peek(self) -> bytes:
+        return self._head
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            data = self._pending + self.raw.read()
+            self._pending = b""
+        else:
+            data = self._pending[:size]
+            self._pending = self._pending[size:]
+            if len(data) < size:
+                data += self.raw.read(size - len(data)) or b""
+        if data:
+            self.size += len(data)
+            self._sha256.update(data)
+        return data
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+
+def hash_stream(raw):
+    """完整讀過一次串流，回傳 (大小, SHA-256, 檔頭)。"""
+    stream = HashingStream(raw)
+    while stream.read(CHUNK_SIZE):
+        pass
+    return stream.size, stream.sha256, stream.peek()
+
+
+# --- 分段上傳 (Upload Session) 參數 ---
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+# MinIO multipart 規定：除了最後一段，每段至少 5MB；最多 10000 段
+MIN_CHUNK_SIZE = 5 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+MAX_CHUNKS = 10000
+SESSION_TTL_HOURS = 24
+# 直傳 (presigned PUT) 是單一請求上傳，S3 單次 PUT / CopyObject 上限 5 GiB；更大的檔案請用分段上傳
+MAX_SINGLE_PUT_SIZE = 5 * 1024 ** 3
+
+
+def expected_chunk_length(total_size: int, chunk_size: int, total_chunks: int, chunk_number: int) -> int:
+    """第 chunk_number 段 (從 1 開始) 應有的大小：最後一段是剩下的部分。"""
+    if chunk_number < total_chunks:
+        return chunk_size
+    return total_size - chunk_size * (total_chunks - 1)